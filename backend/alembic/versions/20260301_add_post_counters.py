@@ -0,0 +1,40 @@
+"""add like_count / comment_count to posts
+
+Revision ID: post_counters_001
+Revises: add_carats_001
+Create Date: 2026-03-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'post_counters_001'
+down_revision = 'add_carats_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the source tables
+    op.execute("""
+        UPDATE posts SET
+            like_count = (
+                SELECT COUNT(*) FROM reactions
+                WHERE reactions.target_type = 'post'
+                  AND reactions.reaction_type = 'like'
+                  AND reactions.target_id = posts.id
+            ),
+            comment_count = (
+                SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id
+            )
+    """)
+
+
+def downgrade():
+    op.drop_column('posts', 'comment_count')
+    op.drop_column('posts', 'like_count')
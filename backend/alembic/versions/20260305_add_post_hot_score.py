@@ -0,0 +1,65 @@
+"""add hot_score and ranking indexes to posts
+
+Revision ID: post_hot_score_001
+Revises: post_counters_001
+Create Date: 2026-03-05
+
+"""
+from datetime import datetime, timezone
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'post_hot_score_001'
+down_revision = 'post_counters_001'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.counters.hot_score at the time of this migration
+HOT_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HOT_DECAY_SECONDS = 45000
+COMMENT_WEIGHT = 2
+
+
+def _hot_score(likes, comments, created_at):
+    if created_at is None:
+        created_at = datetime.now(timezone.utc)
+    elif created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    points = (likes or 0) + COMMENT_WEIGHT * (comments or 0)
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return round(math.log10(max(points, 1)) + age / HOT_DECAY_SECONDS, 7)
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('hot_score', sa.Float(), nullable=False, server_default='0'))
+
+    posts = sa.table(
+        'posts',
+        sa.column('id', sa.Integer),
+        sa.column('like_count', sa.Integer),
+        sa.column('comment_count', sa.Integer),
+        sa.column('hot_score', sa.Float),
+        sa.column('created_at', sa.DateTime(timezone=True)),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(posts.c.id, posts.c.like_count, posts.c.comment_count, posts.c.created_at)).fetchall()
+    if rows:
+        bind.execute(
+            posts.update().where(posts.c.id == sa.bindparam('post_id')).values(hot_score=sa.bindparam('score')),
+            [{"post_id": r[0], "score": _hot_score(r[1], r[2], r[3])} for r in rows],
+        )
+
+    op.create_index('idx_posts_visibility_hot', 'posts', ['visibility', 'hot_score', 'id'], unique=False, if_not_exists=True)
+    op.create_index('idx_posts_visibility_likes', 'posts', ['visibility', 'like_count', 'created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('idx_posts_visibility_comments', 'posts', ['visibility', 'comment_count', 'created_at', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_posts_visibility_comments', table_name='posts', if_exists=True)
+    op.drop_index('idx_posts_visibility_likes', table_name='posts', if_exists=True)
+    op.drop_index('idx_posts_visibility_hot', table_name='posts', if_exists=True)
+    op.drop_column('posts', 'hot_score')
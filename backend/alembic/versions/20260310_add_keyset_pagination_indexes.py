@@ -0,0 +1,30 @@
+"""add composite indexes for keyset pagination
+
+Revision ID: keyset_indexes_001
+Revises: post_hot_score_001
+Create Date: 2026-03-10
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'keyset_indexes_001'
+down_revision = 'post_hot_score_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_posts_visibility_created', 'posts', ['visibility', 'created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('idx_comments_post_created_id', 'comments', ['post_id', 'created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('idx_notifications_user_created', 'notifications', ['user_id', 'created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('idx_messages_chat_created', 'messages', ['chat_id', 'created_at', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_messages_chat_created', table_name='messages', if_exists=True)
+    op.drop_index('idx_notifications_user_created', table_name='notifications', if_exists=True)
+    op.drop_index('idx_comments_post_created_id', table_name='comments', if_exists=True)
+    op.drop_index('idx_posts_visibility_created', table_name='posts', if_exists=True)
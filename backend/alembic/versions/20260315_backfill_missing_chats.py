@@ -0,0 +1,32 @@
+"""backfill chats for matches that never got one
+
+GET /api/matching/chats used to create missing chat rows lazily; it is now
+read-only, so make sure every match has its chat.
+
+Revision ID: backfill_chats_001
+Revises: keyset_indexes_001
+Create Date: 2026-03-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'backfill_chats_001'
+down_revision = 'keyset_indexes_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        INSERT INTO chats (match_id)
+        SELECT m.id FROM matches m
+        WHERE NOT EXISTS (SELECT 1 FROM chats c WHERE c.match_id = m.id)
+    """)
+
+
+def downgrade():
+    # Data-only migration; nothing to undo
+    pass
@@ -0,0 +1,26 @@
+"""add sha256 to media_assets
+
+Revision ID: media_sha256_001
+Revises: backfill_chats_001
+Create Date: 2026-03-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'media_sha256_001'
+down_revision = 'backfill_chats_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('media_assets', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.create_index('ix_media_assets_sha256', 'media_assets', ['sha256'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_media_assets_sha256', table_name='media_assets', if_exists=True)
+    op.drop_column('media_assets', 'sha256')
@@ -0,0 +1,39 @@
+"""add media_derivatives table
+
+Revision ID: media_derivatives_001
+Revises: media_sha256_001
+Create Date: 2026-03-25
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'media_derivatives_001'
+down_revision = 'media_sha256_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'media_derivatives',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('media_asset_id', sa.Integer(), sa.ForeignKey('media_assets.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('mime_type', sa.String(length=100), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('media_asset_id', 'size', name='uq_media_derivatives_asset_size'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_media_derivatives_id', 'media_derivatives', ['id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_media_derivatives_id', table_name='media_derivatives', if_exists=True)
+    op.drop_table('media_derivatives')
@@ -0,0 +1,43 @@
+"""add background_jobs table
+
+Revision ID: background_jobs_001
+Revises: media_derivatives_001
+Create Date: 2026-04-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'background_jobs_001'
+down_revision = 'media_derivatives_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'background_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('kind', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.CheckConstraint("status IN ('pending','running','done','failed')", name='check_background_job_status'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_background_jobs_id', 'background_jobs', ['id'], unique=False, if_not_exists=True)
+    op.create_index('idx_background_jobs_status_run_after', 'background_jobs', ['status', 'run_after'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_background_jobs_status_run_after', table_name='background_jobs', if_exists=True)
+    op.drop_index('ix_background_jobs_id', table_name='background_jobs', if_exists=True)
+    op.drop_table('background_jobs')
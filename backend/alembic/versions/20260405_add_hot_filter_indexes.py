@@ -0,0 +1,64 @@
+"""add indexes for the filters used by the routers
+
+Revision ID: hot_filter_indexes_001
+Revises: background_jobs_001
+Create Date: 2026-04-05
+
+On PostgreSQL the indexes are built with CREATE INDEX CONCURRENTLY (outside
+the migration transaction) so writes to the large tables are not blocked.
+If a concurrent build fails it leaves an INVALID index behind; drop it and
+re-run (scripts/verify_schema.py reports invalid indexes).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'hot_filter_indexes_001'
+down_revision = 'background_jobs_001'
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns, partial WHERE clause)
+INDEXES = [
+    ('idx_users_phone_number', 'users', ['phone_number'], 'phone_number IS NOT NULL'),
+    ('idx_media_assets_user', 'media_assets', ['user_id'], None),
+    ('idx_media_assets_url', 'media_assets', ['url'], None),
+    ('idx_posts_visibility_category_created', 'posts', ['visibility', 'category', 'created_at', 'id'], None),
+    ('idx_posts_type_status', 'posts', ['post_type', 'status'], None),
+    ('idx_posts_user_created', 'posts', ['user_id', 'created_at', 'id'], None),
+    ('idx_posts_media_id', 'posts', ['media_id'], 'media_id IS NOT NULL'),
+    ('idx_post_media_asset', 'post_media', ['media_asset_id'], None),
+    ('idx_follows_followee_status', 'follows', ['followee_user_id', 'status'], None),
+    ('idx_reactions_target', 'reactions', ['target_type', 'target_id', 'reaction_type'], None),
+    ('idx_point_events_ref', 'point_events', ['ref_type', 'ref_id'], None),
+    ('idx_point_events_user', 'point_events', ['user_id'], None),
+    ('idx_matching_profiles_search', 'matching_profiles', ['display_flag', 'prefecture', 'age_band'], None),
+    ('idx_matching_profile_hobbies_hobby', 'matching_profile_hobbies', ['hobby_id'], None),
+    ('idx_likes_from_status', 'likes', ['from_user_id', 'status'], None),
+    ('idx_matches_user_b', 'matches', ['user_b_id'], None),
+    ('idx_chats_match', 'chats', ['match_id'], None),
+    ('idx_messages_chat_unread', 'messages', ['chat_id', 'sender_id'], 'read_at IS NULL'),
+    ('idx_chat_requests_to_status', 'chat_requests', ['to_user_id', 'status'], None),
+    ('idx_chat_request_messages_request', 'chat_request_messages', ['chat_request_id', 'created_at'], None),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            partial = {} if where is None else {
+                'postgresql_where': sa.text(where),
+                'sqlite_where': sa.text(where),
+            }
+            op.create_index(
+                name, table, columns, unique=False, if_not_exists=True,
+                postgresql_concurrently=True, **partial,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,42 @@
+"""add fan-out-on-write timeline tables
+
+Revision ID: timeline_entries_001
+Revises: hot_filter_indexes_001
+Create Date: 2026-04-10
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'timeline_entries_001'
+down_revision = 'hot_filter_indexes_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'timeline_entries',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('posts.id'), primary_key=True),
+        sa.Column('author_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index('idx_timeline_entries_user_created', 'timeline_entries', ['user_id', 'created_at', 'post_id'], unique=False, if_not_exists=True)
+    op.create_index('idx_timeline_entries_post', 'timeline_entries', ['post_id'], unique=False, if_not_exists=True)
+    op.create_table(
+        'materialized_timelines',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('built_at', sa.DateTime(), nullable=False),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('materialized_timelines')
+    op.drop_index('idx_timeline_entries_post', table_name='timeline_entries', if_exists=True)
+    op.drop_index('idx_timeline_entries_user_created', table_name='timeline_entries', if_exists=True)
+    op.drop_table('timeline_entries')
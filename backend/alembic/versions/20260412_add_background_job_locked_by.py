@@ -0,0 +1,24 @@
+"""add locked_by to background_jobs
+
+Revision ID: background_jobs_locked_by_001
+Revises: timeline_entries_001
+Create Date: 2026-04-12
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'background_jobs_locked_by_001'
+down_revision = 'timeline_entries_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('background_jobs', sa.Column('locked_by', sa.String(length=100), nullable=True))
+
+
+def downgrade():
+    op.drop_column('background_jobs', 'locked_by')
@@ -1,13 +1,21 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.database import get_async_db, get_db
 from app.models import User
 from app.schemas import TokenData
+from app.metrics import metrics
+from app.cache import TTLCache
 import os
 from dotenv import load_dotenv
 
@@ -19,16 +27,150 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
+# bcrypt はリクエストごとに数百msのCPUを使うため、専用の小さなスレッドプールで実行する
+# （bcrypt はハッシュ計算中に GIL を解放する）。待ちが上限を超えたら 503 で断る
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_password_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+def _timed_password_op(op: str, func, *args):
+    with metrics.timer("password_hash_seconds", op=op):
+        return func(*args)
+
+
+def _submit_password_op(op: str, func, *args):
+    if not _password_slots.acquire(blocking=False):
+        metrics.inc("password_hash_rejected_total", op=op)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    metrics.add_gauge("password_hash_pending", 1)
+    submitted = time.perf_counter()
+
+    def run():
+        metrics.observe("password_hash_queue_seconds", time.perf_counter() - submitted, op=op)
+        return _timed_password_op(op, func, *args)
+
+    def release(_future):
+        metrics.add_gauge("password_hash_pending", -1)
+        _password_slots.release()
+
+    future = _password_executor.submit(run)
+    future.add_done_callback(release)
+    return future
+
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return _submit_password_op("verify", pwd_context.verify, plain_password, hashed_password).result()
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _submit_password_op("hash", pwd_context.hash, password).result()
+
+async def verify_password_async(plain_password, hashed_password):
+    """``verify_password`` for async handlers; the event loop is never blocked."""
+    return await asyncio.wrap_future(_submit_password_op("verify", pwd_context.verify, plain_password, hashed_password))
+
+async def get_password_hash_async(password):
+    return await asyncio.wrap_future(_submit_password_op("hash", pwd_context.hash, password))
 
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
+
+# ===== 認証ユーザーのキャッシュ =====
+# get_current_user は全リクエストで呼ばれるため、users の行を短時間プロセス内に保持する。
+# 更新・削除はこのプロセスでは即座に無効化され、他プロセスでも USER_CACHE_TTL 秒以内に反映される
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_USER_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
+
+
+def _user_cache_key(user_id: Optional[int], email: Optional[str]):
+    return ("id", user_id) if user_id is not None else ("email", email)
+
+
+def _cache_user(user: User) -> None:
+    snapshot = {key: getattr(user, key) for key in _USER_COLUMNS}
+    _user_cache.set(("id", user.id), snapshot)
+    _user_cache.set(("email", user.email), snapshot)
+
+
+def invalidate_user_cache(user_id: Optional[int] = None, email: Optional[str] = None) -> None:
+    if user_id is not None:
+        _user_cache.pop(("id", user_id))
+    if email is not None:
+        _user_cache.pop(("email", email))
+
+
+def invalidate_user_cache_on_commit(session: Session, user_id: int, email: Optional[str] = None) -> None:
+    """For bulk ``UPDATE users`` statements, which the ORM events below do not see."""
+    keys = {("id", user_id)}
+    if email is not None:
+        keys.add(("email", email))
+    for key in keys:
+        _user_cache.pop(key)
+    session.info.setdefault("invalidate_users", set()).update(keys)
+
+
+def clear_user_cache() -> None:
+    """For bulk updates/deletes that bypass the ORM events below."""
+    _user_cache.clear()
+
+
+def get_cached_user(db: Session, user_id: Optional[int] = None, email: Optional[str] = None) -> Optional[User]:
+    """Load the user by id (token ``uid``) or email, serving repeats from the cache.
+
+    A cache hit is attached to ``db`` with ``merge(load=False)`` so it behaves
+    like a loaded row (lazy relationships, updates) without a SELECT.
+    """
+    snapshot = _user_cache.get(_user_cache_key(user_id, email))
+    if snapshot is not None and (email is None or snapshot["email"] == email):
+        metrics.inc("user_cache_total", result="hit")
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+    metrics.inc("user_cache_total", result="miss")
+    query = db.query(User)
+    user = query.filter(User.id == user_id).first() if user_id is not None else query.filter(User.email == email).first()
+    if user is not None and (email is None or user.email == email):
+        _cache_user(user)
+        return user
+    return None
+
+
+def _pending_user_invalidations(target: User) -> set:
+    keys = {("id", target.id), ("email", target.email)}
+    for old_email in inspect(target).attrs.email.history.deleted or ():
+        keys.add(("email", old_email))
+    return keys
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_write(mapper, connection, target):
+    keys = _pending_user_invalidations(target)
+    for key in keys:
+        _user_cache.pop(key)
+    # コミット前に他のリクエストが古い行を再キャッシュする可能性があるため、コミット後にも消す
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault("invalidate_users", set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for key in session.info.pop("invalidate_users", ()):
+        _user_cache.pop(key)
+
 def authenticate_user(db: Session, email: str, password: str):
     user = get_user_by_email(db, email)
     if not user:
@@ -37,6 +179,18 @@ def authenticate_user(db: Session, email: str, password: str):
         return False
     return user
 
+async def authenticate_user_async(db: AsyncSession, email: str, password: str):
+    user = await db.scalar(select(User).where(User.email == email))
+    if not user:
+        return False
+    if not await verify_password_async(password, user.password_hash):
+        return False
+    return user
+
+def user_token_claims(user: User) -> dict:
+    """JWT claims for ``user``: ``sub`` (email) plus ``uid``."""
+    return {"sub": user.email, "uid": user.id}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -47,23 +201,36 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_error() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _token_identity(token: str):
+    """``(uid or None, email)`` of a valid access token; 401 otherwise."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            raise _credentials_error()
         token_data = TokenData(email=email)
+        user_id = payload.get("uid")
     except JWTError:
-        raise credentials_exception
-    user = get_user_by_email(db, email=token_data.email)
+        raise _credentials_error()
+    return (user_id if isinstance(user_id, int) else None), token_data.email
+
+
+# 同期 def: キャッシュミス時の users 参照はスレッドプールで実行され、イベントループを塞がない
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user_id, email = _token_identity(token)
+    # 権限判定はトークンではなく（無効化される）ユーザー行で行う。
+    # トークンは最長 ACCESS_TOKEN_EXPIRE_MINUTES 有効なため、降格や退会を反映できないため
+    user = get_cached_user(db, user_id=user_id, email=email)
     if user is None:
-        raise credentials_exception
+        raise _credentials_error()
     return user
 
 
@@ -72,6 +239,16 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)) -> Optional[User]:
+    """The active user for a valid token, or None for anonymous requests (public endpoints)."""
+    if not token:
+        return None
+    try:
+        user = get_current_user(token, db)
+    except HTTPException:
+        return None
+    return user if user.is_active else None
+
 async def get_current_premium_user(current_user: User = Depends(get_current_active_user)):
     if current_user.membership_type != "premium":
         raise HTTPException(status_code=403, detail="Premium membership required")
@@ -81,3 +258,42 @@ async def get_current_admin_user(current_user: User = Depends(get_current_active
     if current_user.membership_type != "admin":
         raise HTTPException(status_code=403, detail="Admin privileges required")
     return current_user
+
+
+# ===== 非同期ルート用 =====
+# ハンドラと同じ get_async_db のセッションでユーザーを引く。同期版に依存すると
+# 1 リクエストで同期・非同期の両プールから接続を取ってしまう
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    user_id, email = _token_identity(token)
+    user = await db.run_sync(get_cached_user, user_id=user_id, email=email)
+    if user is None:
+        raise _credentials_error()
+    return user
+
+async def get_current_active_user_async(current_user: User = Depends(get_current_user_async)):
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+async def get_optional_user_async(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> Optional[User]:
+    """``get_optional_user`` for async routes."""
+    if not token:
+        return None
+    try:
+        user = await get_current_user_async(token, db)
+    except HTTPException:
+        return None
+    return user if user.is_active else None
+
+async def get_current_premium_user_async(current_user: User = Depends(get_current_active_user_async)):
+    if current_user.membership_type != "premium":
+        raise HTTPException(status_code=403, detail="Premium membership required")
+    return current_user
+
+async def get_current_admin_user_async(current_user: User = Depends(get_current_active_user_async)):
+    if current_user.membership_type != "admin":
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return current_user
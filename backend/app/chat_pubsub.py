@@ -0,0 +1,311 @@
+"""Pub/sub fan-out for matching chat messages.
+
+Each process keeps its own WebSocket subscribers; the broker carries every
+published message to all processes so participants connected to different
+uvicorn workers / Fly machines still see each other's messages.
+
+Each WebSocket is subscribed through a ``QueuedSender`` so one slow client
+cannot hold up delivery to the rest of its room.
+
+Backends (``CHAT_BROKER`` env var):
+
+* ``memory`` (default) - in-process only, for a single worker and local dev.
+* ``postgres`` - ``LISTEN`` / ``NOTIFY`` on the application database, no
+  extra infrastructure or sticky sessions needed.
+"""
+import abc
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import anyio.from_thread
+
+from app.database import DATABASE_URL, SessionLocal
+from app.models import Message
+
+logger = logging.getLogger("app.chat_pubsub")
+
+Subscriber = Callable[[dict], Awaitable[None]]
+MessageLoader = Callable[[int], Optional[dict]]
+
+# 接続ごとの送信キュー。溢れた／送信が詰まった接続は切断する
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+NOTIFY_CHANNEL = "matching_chat"
+# NOTIFY のペイロード上限は 8000 バイト。超える場合は ID だけ送り受信側で DB から読む
+MAX_NOTIFY_PAYLOAD = 7500
+
+
+class ChatBroker(abc.ABC):
+    """Base broker: local subscriber registry plus a transport in ``publish``."""
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def subscribe(self, chat_id: int, callback: Subscriber) -> None:
+        self._subscribers.setdefault(chat_id, set()).add(callback)
+
+    def unsubscribe(self, chat_id: int, callback: Subscriber) -> None:
+        subscribers = self._subscribers.get(chat_id)
+        if subscribers is None:
+            return
+        subscribers.discard(callback)
+        if not subscribers:
+            self._subscribers.pop(chat_id, None)
+
+    @abc.abstractmethod
+    async def publish(self, chat_id: int, message: dict) -> None:
+        """Send ``message`` to every process's subscribers of ``chat_id``."""
+
+    async def _dispatch(self, chat_id: int, message: dict) -> None:
+        """Deliver ``message`` to this process's subscribers of ``chat_id``."""
+        for callback in list(self._subscribers.get(chat_id, ())):
+            try:
+                await callback(message)
+            except Exception:
+                # 送信に失敗した接続は購読解除する
+                self.unsubscribe(chat_id, callback)
+
+
+class SubscriberOverflow(Exception):
+    pass
+
+
+class QueuedSender:
+    """Per-connection bounded outbox used as a broker subscriber.
+
+    ``__call__`` only enqueues, so a broadcast never waits on any socket; a
+    dedicated task drains the queue into ``send``.  A consumer whose queue
+    fills up, or whose send takes longer than ``send_timeout``, is dropped
+    via ``on_drop`` instead of stalling the room.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[dict], Awaitable[None]],
+        on_drop: Optional[Callable[[], Awaitable[None]]] = None,
+        maxsize: int = WS_SEND_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT,
+    ) -> None:
+        self.send = send
+        self.on_drop = on_drop
+        self.send_timeout = send_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def __call__(self, message: dict) -> None:
+        if self.closed:
+            raise SubscriberOverflow()
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Dropping slow chat consumer (queue full)")
+            self._drop()
+            raise SubscriberOverflow()
+
+    def _drop(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self.on_drop is not None:
+            asyncio.create_task(self.on_drop())
+
+    async def _run(self) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.send(message), self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Dropping chat consumer (send failed or timed out)")
+                self._drop()
+                return
+
+    async def close(self) -> None:
+        self.closed = True
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+
+class InMemoryChatBroker(ChatBroker):
+    async def publish(self, chat_id: int, message: dict) -> None:
+        await self._dispatch(chat_id, message)
+
+
+def _psycopg_conninfo(database_url: str) -> str:
+    from sqlalchemy.engine import make_url
+
+    return make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class PostgresChatBroker(ChatBroker):
+    """Fan-out through Postgres ``LISTEN`` / ``NOTIFY``.
+
+    ``connect`` returns an autocommit async connection exposing ``execute``,
+    ``notifies`` and ``close`` (psycopg's ``AsyncConnection`` by default); it
+    can be replaced with a fake in tests.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        load_message: Optional[MessageLoader] = None,
+        connect: Optional[Callable[[], Awaitable[Any]]] = None,
+        channel: str = NOTIFY_CHANNEL,
+        reconnect_delay: float = 1.0,
+    ) -> None:
+        super().__init__()
+        self.channel = channel
+        self.load_message = load_message
+        self.reconnect_delay = reconnect_delay
+        self._connect = connect or self._default_connect(database_url)
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _default_connect(database_url: str) -> Callable[[], Awaitable[Any]]:
+        conninfo = _psycopg_conninfo(database_url)
+
+        async def connect():
+            import psycopg
+
+            return await psycopg.AsyncConnection.connect(conninfo, autocommit=True)
+
+        return connect
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._publish_conn is not None:
+            await self._publish_conn.close()
+            self._publish_conn = None
+
+    def encode(self, chat_id: int, message: dict) -> str:
+        payload = json.dumps({"chat_id": chat_id, "message": message}, separators=(",", ":"), default=str)
+        if len(payload.encode()) > MAX_NOTIFY_PAYLOAD:
+            payload = json.dumps({"chat_id": chat_id, "message_id": message["id"]}, separators=(",", ":"))
+        return payload
+
+    async def publish(self, chat_id: int, message: dict) -> None:
+        payload = self.encode(chat_id, message)
+        async with self._publish_lock:
+            try:
+                if self._publish_conn is None:
+                    self._publish_conn = await self._connect()
+                await self._publish_conn.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            except Exception:
+                # 接続を捨てて次回再接続。自プロセスの購読者には直接届ける
+                logger.exception("Failed to NOTIFY chat %s", chat_id)
+                self._publish_conn = None
+                await self._dispatch(chat_id, message)
+
+    async def handle_notification(self, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+            chat_id = int(data["chat_id"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed chat notification: %.200s", payload)
+            return
+        if chat_id not in self._subscribers:
+            return
+        message = data.get("message")
+        if message is None and self.load_message is not None:
+            message = await asyncio.to_thread(self.load_message, int(data["message_id"]))
+        if message is not None:
+            await self._dispatch(chat_id, message)
+
+    async def _listen_forever(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await self._connect()
+                await conn.execute(f"LISTEN {self.channel}")
+                async for notify in conn.notifies():
+                    await self.handle_notification(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Chat LISTEN connection lost; reconnecting")
+            finally:
+                if conn is not None:
+                    try:
+                        await conn.close()
+                    except Exception:
+                        pass
+            await asyncio.sleep(self.reconnect_delay)
+
+
+def create_chat_broker(load_message: Optional[MessageLoader] = None) -> ChatBroker:
+    backend = os.getenv("CHAT_BROKER", "memory").lower()
+    if backend == "postgres":
+        return PostgresChatBroker(DATABASE_URL, load_message=load_message)
+    if backend != "memory":
+        raise RuntimeError(f"Unknown CHAT_BROKER: {backend}")
+    return InMemoryChatBroker()
+
+
+def message_payload(msg) -> dict:
+    """WebSocket representation of a ``Message`` row."""
+    return {
+        "id": msg.id,
+        "chat_id": msg.chat_id,
+        "sender_id": msg.sender_id,
+        "body": msg.body,
+        "created_at": msg.created_at.isoformat() if hasattr(msg.created_at, 'isoformat') else str(msg.created_at),
+    }
+
+
+def load_message_payload(message_id: int) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        msg = db.query(Message).filter(Message.id == message_id).first()
+        return message_payload(msg) if msg else None
+    finally:
+        db.close()
+
+
+_broker: Optional[ChatBroker] = None
+
+
+def get_chat_broker() -> ChatBroker:
+    global _broker
+    if _broker is None:
+        _broker = create_chat_broker(load_message=load_message_payload)
+    return _broker
+
+
+def publish_from_thread(chat_id: int, message: dict) -> None:
+    """Publish from a sync endpoint running in the worker threadpool."""
+    try:
+        anyio.from_thread.run(get_chat_broker().publish, chat_id, message)
+    except Exception:
+        logger.exception("Failed to publish chat %s message", chat_id)
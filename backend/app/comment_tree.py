@@ -0,0 +1,129 @@
+"""Threaded comment trees.
+
+``comment_threads`` returns top-level comments (or one chosen comment) with
+their whole reply trees in two queries: the roots with their authors, then
+every descendant of those roots through a recursive CTE.  A window function
+numbers the replies of each thread so a thread is cut at ``replies_limit``
+in SQL; the rest of it is fetched with the thread's ``replies_cursor``.  The
+trees are assembled in a single pass over the flat rows.
+"""
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import Comment, User
+from app.pagination import encode_cursor, keyset_filter
+
+THREAD_CURSOR_KIND = "comment-threads"
+REPLY_CURSOR_KIND = "comment-replies"
+
+
+def _columns():
+    return (
+        Comment.id.label("id"),
+        Comment.parent_id.label("parent_id"),
+        Comment.body.label("body"),
+        Comment.created_at.label("created_at"),
+        Comment.updated_at.label("updated_at"),
+        User.id.label("author_id"),
+        User.display_name.label("author_name"),
+    )
+
+
+def _node(row) -> dict:
+    return {
+        "id": row.id,
+        "parent_id": row.parent_id,
+        "body": row.body,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "user": {"id": row.author_id, "display_name": row.author_name} if row.author_id is not None else None,
+        "replies": [],
+    }
+
+
+def comment_threads(
+    db: Session,
+    post_id: int,
+    limit: int = 20,
+    after: Optional[Sequence[Any]] = None,
+    thread_id: Optional[int] = None,
+    replies_limit: int = 50,
+    replies_after: Optional[Sequence[Any]] = None,
+) -> List[dict]:
+    """Threads of ``post_id`` in ``(created_at, id)`` order.
+
+    Without ``thread_id`` these are the top-level comments after the
+    ``after`` key; with it, just that comment (at any depth) and its
+    replies after ``replies_after``.  Each thread carries ``reply_count``
+    (replies after the cursor, all depths) and ``replies_cursor`` when more
+    than ``replies_limit`` of them remain.
+    """
+    dialect_name = db.get_bind().dialect.name
+    order = (Comment.created_at, Comment.id)
+
+    roots_query = (
+        select(*_columns())
+        .outerjoin(User, User.id == Comment.user_id)
+        .where(Comment.post_id == post_id)
+    )
+    if thread_id is not None:
+        roots_query = roots_query.where(Comment.id == thread_id)
+    else:
+        roots_query = roots_query.where(Comment.parent_id.is_(None))
+        if after is not None:
+            roots_query = roots_query.where(keyset_filter(order, after, descending=False, dialect_name=dialect_name))
+        roots_query = roots_query.order_by(*order).limit(limit)
+    threads = {row.id: _node(row) for row in db.execute(roots_query)}
+    if not threads:
+        return []
+
+    tree = (
+        select(Comment.id.label("id"), Comment.parent_id.label("root_id"))
+        .where(Comment.parent_id.in_(list(threads)))
+        .cte("comment_tree", recursive=True)
+    )
+    tree = tree.union_all(select(Comment.id, tree.c.root_id).join(tree, Comment.parent_id == tree.c.id))
+    ranked = (
+        select(
+            *_columns(),
+            tree.c.root_id,
+            func.row_number().over(partition_by=tree.c.root_id, order_by=order).label("position"),
+            func.count().over(partition_by=tree.c.root_id).label("total"),
+        )
+        .join(tree, tree.c.id == Comment.id)
+        .outerjoin(User, User.id == Comment.user_id)
+    )
+    if replies_after is not None:
+        ranked = ranked.where(keyset_filter(order, replies_after, descending=False, dialect_name=dialect_name))
+    ranked = ranked.subquery()
+    # replies_limit=0 でも件数を返すため、各スレッドの先頭 1 行は必ず読む
+    rows = db.execute(
+        select(ranked)
+        .where(ranked.c.position <= max(replies_limit, 1))
+        .order_by(ranked.c.root_id, ranked.c.position)
+    )
+
+    nodes = dict(threads)
+    totals, last = {}, {}
+    for row in rows:
+        totals[row.root_id] = row.total
+        if row.position > replies_limit:
+            continue
+        node = _node(row)
+        nodes[row.id] = node
+        # 親が返信の上限で切れていればスレッド直下に付ける
+        (nodes.get(row.parent_id) or threads[row.root_id])["replies"].append(node)
+        last[row.root_id] = row
+    for root_id, thread in threads.items():
+        total = totals.get(root_id, 0)
+        thread["reply_count"] = total
+        tail = last.get(root_id)
+        if tail is not None:
+            shown, key = tail.position, [tail.created_at, tail.id]
+        else:
+            # 1 件も返していなければスレッドの先頭（返信は親より後）から続ける
+            shown, key = 0, [thread["created_at"], thread["id"]]
+        thread["replies_cursor"] = encode_cursor(REPLY_CURSOR_KIND, [root_id, *key]) if shown < total else None
+    return list(threads.values())
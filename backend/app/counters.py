@@ -0,0 +1,129 @@
+"""Denormalized post counters.
+
+``posts.like_count`` and ``posts.comment_count`` are maintained in the same
+transaction as the reaction/comment write using relative ``UPDATE``s, so
+concurrent writers never overwrite each other.  ``reconcile_post_counters``
+rebuilds them from ``reactions`` / ``comments`` when they drift.
+
+``posts.hot_score`` backs the "popular" sort.  It combines engagement with
+the post's age in a way that never needs a periodic re-scoring pass: the
+time term grows for newer posts instead of older scores decaying, so the
+score only changes when the post's own counters change.  New rows get their
+score from the column default (``app.models._initial_hot_score``), so
+every insert path ranks correctly from the start.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Post, Reaction, Comment
+
+HOT_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+# 12.5時間新しい投稿に並ぶには10倍の反応が必要
+HOT_DECAY_SECONDS = 45000
+COMMENT_WEIGHT = 2
+
+
+def hot_score(like_count: int, comment_count: int, created_at: Optional[datetime]) -> float:
+    if created_at is None:
+        created_at = datetime.now(timezone.utc)
+    elif created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    points = (like_count or 0) + COMMENT_WEIGHT * (comment_count or 0)
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return round(math.log10(max(points, 1)) + age / HOT_DECAY_SECONDS, 7)
+
+
+def _write_hot_scores(db: Session, rows: Iterable[tuple]) -> None:
+    """One executemany ``UPDATE`` of ``hot_score`` from ``(id, like_count, comment_count, created_at)`` rows."""
+    params = [
+        {"post_id": post_id, "score": hot_score(likes, comments, created_at)}
+        for post_id, likes, comments, created_at in rows
+    ]
+    if not params:
+        return
+    posts_table = Post.__table__
+    db.execute(
+        posts_table.update()
+        .where(posts_table.c.id == bindparam("post_id"))
+        # 集計の更新で updated_at（編集日時）を進めない
+        .values(hot_score=bindparam("score"), updated_at=posts_table.c.updated_at),
+        params,
+    )
+
+
+def refresh_hot_scores(db: Session, post_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute ``hot_score`` from the stored counters (no commit)."""
+    query = select(Post.id, Post.like_count, Post.comment_count, Post.created_at)
+    if post_ids is not None:
+        query = query.where(Post.id.in_(list(post_ids)))
+    _write_hot_scores(db, db.execute(query).all())
+
+
+def _shifted(column, delta: int):
+    if delta >= 0:
+        return column + delta
+    # 0未満にはしない
+    return case((column + delta < 0, 0), else_=column + delta)
+
+
+def adjust_post_counters(db: Session, post_id: int, likes: int = 0, comments: int = 0) -> None:
+    """Apply relative changes to a post's counters (``SET n = n + :delta``)."""
+    values = {}
+    if likes:
+        values[Post.like_count] = _shifted(Post.like_count, likes)
+    if comments:
+        values[Post.comment_count] = _shifted(Post.comment_count, comments)
+    if not values:
+        return
+    # 集計の更新で updated_at（編集日時）を進めない
+    values[Post.updated_at] = Post.updated_at
+    # 新しい集計値を RETURNING で受け取り、スコアの更新は 1 文で済ませる
+    rows = db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(values)
+        .returning(Post.id, Post.like_count, Post.comment_count, Post.created_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+    _write_hot_scores(db, rows)
+
+
+def like_count_subquery():
+    return (
+        select(func.count(Reaction.id))
+        .where(
+            Reaction.target_type == "post",
+            Reaction.reaction_type == "like",
+            Reaction.target_id == Post.id,
+        )
+        .scalar_subquery()
+    )
+
+
+def comment_count_subquery():
+    return select(func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()
+
+
+def reconcile_post_counters(db: Session, post_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute counters from the source tables. Returns the number of rows touched."""
+    query = db.query(Post)
+    if post_ids is not None:
+        post_ids = list(post_ids)
+        if not post_ids:
+            return 0
+        query = query.filter(Post.id.in_(post_ids))
+    updated = query.update(
+        {
+            Post.like_count: like_count_subquery(),
+            Post.comment_count: comment_count_subquery(),
+            Post.updated_at: Post.updated_at,
+        },
+        synchronize_session=False,
+    )
+    refresh_hot_scores(db, post_ids)
+    db.commit()
+    return updated
@@ -1,8 +1,16 @@
+import time
+from typing import AsyncIterator, Optional
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+from app.metrics import metrics
 
 # .env は補完用途として読み込み、既存の環境変数は上書きしない
 load_dotenv(override=False)
@@ -23,11 +31,76 @@ if not DATABASE_URL:
 print("🔄 Using database URL:")
 print(DATABASE_URL, flush=True)
 
+# コネクションプール設定（デプロイごとに RDS の接続上限に合わせて調整）
+# インスタンスあたりの最大接続数 = DB_POOL_SIZE + DB_MAX_OVERFLOW
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# pre-ping（チェックアウト毎の往復）の代わりに、一定時間で接続を作り直して
+# RDS / NAT のアイドル切断より前に入れ替える
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+
+
+class _CheckoutTimingMixin:
+    metrics_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.inc("db_pool_checkout_timeouts_total", pool=self.metrics_label)
+            raise
+        finally:
+            metrics.observe("db_pool_checkout_wait_seconds", time.perf_counter() - started, pool=self.metrics_label)
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
 # ✅ SQLAlchemyにはURL文字列そのものを渡す（装飾文字列を含めない）
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 else:
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    engine = create_engine(
+        DATABASE_URL,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+def _pool_stats(pool, label: str) -> dict:
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+        metrics.set_gauge("db_pool_checked_out", stats["checked_out"], pool=label)
+        metrics.set_gauge("db_pool_overflow", stats["overflow"], pool=label)
+        metrics.set_gauge("db_pool_size", stats["size"], pool=label)
+    return stats
+
+
+def pool_stats() -> dict:
+    """Current pool occupancy (also published as gauges)."""
+    stats = _pool_stats(engine.pool, "sync")
+    if async_engine is not None:
+        stats["async"] = _pool_stats(async_engine.sync_engine.pool, "async")
+    return stats
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -40,3 +113,113 @@ def get_db():
     finally:
         db.close()
 
+
+# ===== 非同期セッション（async def のルート用） =====
+# PostgreSQL は psycopg (v3) の async ドライバ、SQLite は aiosqlite があれば使う。
+# 非同期エンジンは同期エンジンとは別のプールを持つ（接続数の見積もりは両方の合計）
+
+def _async_database_url(url: str) -> Optional[str]:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        return parsed.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+    if parsed.get_backend_name() == "sqlite":
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            return None
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    return None
+
+
+ASYNC_DATABASE_URL = _async_database_url(DATABASE_URL)
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DATABASE_URL and ASYNC_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+elif ASYNC_DATABASE_URL:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+if async_engine is not None:
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# 非同期ドライバが無い環境（aiosqlite 未導入の SQLite など）向け
+_ThreadedSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+
+class ThreadedAsyncSession:
+    """``AsyncSession``-compatible facade over a sync ``Session``.
+
+    Each call runs in the threadpool, so the event loop is never blocked even
+    without an async driver.  Only the subset of the API used by the routers
+    is provided; results are fully buffered before returning to the loop.
+    """
+
+    def __init__(self, session) -> None:
+        self.sync_session = session
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    def get_bind(self):
+        return self.sync_session.get_bind()
+
+    async def execute(self, statement, params=None, **kw):
+        def run():
+            result = self.sync_session.execute(statement, params, **kw)
+            # 行を返す文は結果をバッファしてからループに戻す（UPDATE/DELETE は rowcount のみ）
+            return result.freeze()() if getattr(result, "returns_rows", True) else result
+        return await run_in_threadpool(run)
+
+    async def scalar(self, statement, params=None, **kw):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kw)
+
+    async def scalars(self, statement, params=None, **kw):
+        return (await self.execute(statement, params, **kw)).scalars()
+
+    async def get(self, entity, ident, **kw):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kw)
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kw):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kw)
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Async counterpart of ``get_db``: one ``AsyncSession`` per request."""
+    if AsyncSessionLocal is None:
+        db = ThreadedAsyncSession(_ThreadedSessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
+
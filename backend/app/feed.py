@@ -0,0 +1,128 @@
+"""Feed hydration helpers.
+
+Builds the response dicts for a page of posts using a fixed number of
+queries (one per related table) instead of several queries per post.
+Like and comment counts come from the denormalized columns on ``posts``
+(see ``app.counters``); the viewer's like state from ``app.likes``;
+thumbnail URLs come from ``media_derivatives`` (see ``app.images``).
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.images import thumbnail_urls
+from app.likes import liked_post_ids
+from app.models import Post, MediaAsset, PostMedia, PostTourism
+
+logger = logging.getLogger("app.feed")
+
+
+def _media_urls(db: Session, media_ids: List[int]) -> Dict[int, str]:
+    if not media_ids:
+        return {}
+    rows = db.query(MediaAsset.id, MediaAsset.url).filter(MediaAsset.id.in_(media_ids)).all()
+    return {media_id: url for media_id, url in rows}
+
+
+def _gallery(db: Session, post_ids: List[int]) -> Dict[int, List[tuple]]:
+    """``{post_id: [(media_asset_id, url), ...]}`` in display order."""
+    rows = (
+        db.query(PostMedia.post_id, MediaAsset.id, MediaAsset.url)
+        .join(MediaAsset, MediaAsset.id == PostMedia.media_asset_id)
+        .filter(PostMedia.post_id.in_(post_ids))
+        .order_by(PostMedia.post_id, PostMedia.order_index)
+        .all()
+    )
+    gallery: Dict[int, List[tuple]] = defaultdict(list)
+    for post_id, media_id, url in rows:
+        gallery[post_id].append((media_id, url))
+    return gallery
+
+
+def _tourism_details(db: Session, post_ids: List[int]) -> Dict[int, dict]:
+    if not post_ids:
+        return {}
+    rows = db.query(PostTourism).filter(PostTourism.post_id.in_(post_ids)).all()
+    return {
+        tourism.post_id: {
+            "prefecture": tourism.prefecture,
+            "event_datetime": tourism.event_datetime,
+            "meet_place": tourism.meet_place,
+            "meet_address": tourism.meet_address,
+            "tour_content": tourism.tour_content,
+            "fee": tourism.fee,
+            "contact_phone": tourism.contact_phone,
+            "contact_email": tourism.contact_email,
+            "deadline": tourism.deadline,
+            "attachment_pdf_url": tourism.attachment_pdf_url,
+        }
+        for tourism in rows
+    }
+
+
+def _safe(loader, default, label: str):
+    # 集計に失敗してもフィード全体は返す（従来の挙動を維持）
+    try:
+        return loader()
+    except Exception:
+        logger.exception("Failed to load %s for feed page", label)
+        return default
+
+
+def hydrate_posts(db: Session, posts: Iterable[Post], current_user_id: Optional[int] = None) -> List[dict]:
+    """Return the API representation of ``posts`` in their original order.
+
+    Cover media, gallery media and tourism details and their thumbnails are
+    each fetched with a single ``IN (...)`` query for the whole page; the
+    viewer's like state takes at most one more (``app.likes.liked_post_ids``).
+    """
+    posts = list(posts)
+    if not posts:
+        return []
+
+    post_ids = [post.id for post in posts]
+    media_ids = list({post.media_id for post in posts if post.media_id})
+    tourism_ids = [post.id for post in posts if post.post_type == "tourism"]
+
+    liked_ids = set()
+    if current_user_id:
+        liked_ids = _safe(lambda: liked_post_ids(db, current_user_id, post_ids), set(), "like state")
+    media_urls = _media_urls(db, media_ids)
+    gallery = _gallery(db, post_ids)
+    tourism = _tourism_details(db, tourism_ids)
+    gallery_ids = [media_id for items in gallery.values() for media_id, _ in items]
+    thumbs = _safe(lambda: thumbnail_urls(db, media_ids + gallery_ids), {}, "thumbnails")
+
+    result = []
+    for post in posts:
+        user = getattr(post, "user", None)
+        result.append({
+            "id": post.id,
+            "user_id": post.user_id,
+            "user_display_name": user.display_name if user else None,
+            "title": post.title,
+            "body": post.body,
+            "visibility": post.visibility,
+            "youtube_url": post.youtube_url,
+            "media_id": post.media_id,
+            "media_url": media_urls.get(post.media_id) if post.media_id else None,
+            "media_urls": [url for _, url in gallery.get(post.id, [])],
+            "media_thumbnail_url": (thumbs.get(post.media_id) or media_urls.get(post.media_id)) if post.media_id else None,
+            "media_thumbnail_urls": [thumbs.get(media_id) or url for media_id, url in gallery.get(post.id, [])],
+            "category": post.category,
+            "subcategory": post.subcategory,
+            "post_type": post.post_type,
+            "slug": post.slug,
+            "status": post.status,
+            "og_image_url": post.og_image_url,
+            "excerpt": post.excerpt,
+            "tourism_details": tourism.get(post.id),
+            "created_at": post.created_at,
+            "updated_at": post.updated_at,
+            "like_count": post.like_count or 0,
+            "is_liked": post.id in liked_ids,
+            "comment_count": post.comment_count or 0,
+        })
+    return result
@@ -0,0 +1,126 @@
+"""Image derivatives (resized WebP thumbnails) for media assets.
+
+Derivatives are stored next to the original under
+``media/derivatives/<asset id>/<size>.webp`` and recorded in
+``media_derivatives``.  They are generated by the ``media.generate_derivatives``
+background job queued on upload, and lazily by ``GET /api/media/{id}/thumbnail``
+for assets uploaded before this existed.
+
+Pillow is a runtime dependency and is imported unconditionally, so an image
+built without it fails at startup instead of serving originals as
+thumbnails.
+"""
+import io
+import logging
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+from PIL import Image, ImageOps
+from sqlalchemy.orm import Session
+
+from app.models import MediaAsset, MediaDerivative
+from app.storage import open_url, put_fileobj
+
+logger = logging.getLogger("app.images")
+
+DERIVATIVE_SIZES = (160, 480, 1080)
+THUMBNAIL_SIZE = 480  # フィード
+AVATAR_SIZE = 160  # 検索結果・チャット一覧
+WEBP_QUALITY = 80
+
+
+def derivative_key(asset_id: int, size: int) -> str:
+    return f"media/derivatives/{asset_id}/{size}.webp"
+
+
+def generate_derivatives(db: Session, asset: MediaAsset, source: Optional[BinaryIO] = None) -> List[MediaDerivative]:
+    """Create the missing WebP derivatives of ``asset`` and record its dimensions.
+
+    ``source`` is the original's bytes (rewound); when omitted it is read back
+    from storage.  Commits.  Returns the derivatives created.
+    """
+    if not (asset.mime_type or "").startswith("image/"):
+        return []
+    existing = {
+        size for (size,) in db.query(MediaDerivative.size).filter(MediaDerivative.media_asset_id == asset.id)
+    }
+    missing = [size for size in DERIVATIVE_SIZES if size not in existing]
+    if not missing and asset.width:
+        return []
+
+    owned = source is None
+    if owned:
+        source = open_url(asset.url)
+        if source is None:
+            logger.warning("Original for media %s not found: %s", asset.id, asset.url)
+            return []
+    try:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except Exception:
+        logger.exception("Cannot decode media %s", asset.id)
+        return []
+    finally:
+        if owned:
+            source.close()
+
+    asset.width, asset.height = image.size
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    created = []
+    for size in missing:
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+        byte_count = buffer.tell()
+        buffer.seek(0)
+        url = put_fileobj(buffer, derivative_key(asset.id, size), "image/webp")
+        derivative = MediaDerivative(
+            media_asset_id=asset.id,
+            size=size,
+            url=url,
+            mime_type="image/webp",
+            width=resized.width,
+            height=resized.height,
+            size_bytes=byte_count,
+        )
+        db.add(derivative)
+        created.append(derivative)
+    db.commit()
+    return created
+
+
+def thumbnail_urls(db: Session, media_ids: Iterable[int], size: int = THUMBNAIL_SIZE) -> Dict[int, str]:
+    """``{media_asset_id: derivative url}`` for the assets that have one."""
+    media_ids = list({mid for mid in media_ids if mid})
+    if not media_ids:
+        return {}
+    rows = (
+        db.query(MediaDerivative.media_asset_id, MediaDerivative.url)
+        .filter(MediaDerivative.media_asset_id.in_(media_ids), MediaDerivative.size == size)
+        .all()
+    )
+    return {media_id: url for media_id, url in rows}
+
+
+def thumbnail_urls_by_url(db: Session, urls: Iterable[str], size: int = AVATAR_SIZE) -> Dict[str, str]:
+    """``{original url: derivative url}`` for images referenced by URL (e.g. profile images)."""
+    urls = list({url for url in urls if url})
+    if not urls:
+        return {}
+    rows = (
+        db.query(MediaAsset.url, MediaDerivative.url)
+        .join(MediaDerivative, MediaDerivative.media_asset_id == MediaAsset.id)
+        .filter(MediaAsset.url.in_(urls), MediaDerivative.size == size)
+        .all()
+    )
+    return {original: derivative for original, derivative in rows}
+
+
+def nearest_size(size: int) -> int:
+    for candidate in DERIVATIVE_SIZES:
+        if size <= candidate:
+            return candidate
+    return DERIVATIVE_SIZES[-1]
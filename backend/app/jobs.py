@@ -0,0 +1,249 @@
+"""Lightweight durable background jobs.
+
+``enqueue`` adds a row to ``background_jobs`` in the caller's transaction, so
+a job exists exactly when the request's own writes commit.  Worker threads
+(``JOB_WORKERS`` per process, started with the app) claim due jobs with a
+conditional ``UPDATE`` that also sets ``locked_until`` and ``locked_by``; a
+job whose worker died becomes claimable again once that visibility timeout
+passes.  A worker only records the outcome while it still holds its claim,
+so a job that overran the timeout and was claimed again is left to the new
+owner.  Failures
+are retried with exponential backoff up to ``max_attempts``.
+
+Handlers must be idempotent: a job can run more than once if a worker stops
+after doing the work but before marking it done.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, event, or_
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.metrics import metrics
+from app.models import BackgroundJob
+
+logger = logging.getLogger("app.jobs")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_MAX_BACKOFF = 600
+JOB_RETENTION = timedelta(days=7)
+
+JobHandler = Callable[[Session, dict], None]
+_handlers: Dict[str, JobHandler] = {}
+_wakeup = threading.Event()
+
+
+def job(kind: str):
+    """Register ``func(db, payload)`` as the handler for ``kind``."""
+    def register(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue(db: Session, kind: str, payload: Optional[dict] = None, delay: float = 0, max_attempts: int = 5) -> BackgroundJob:
+    """Add a job to ``db``'s transaction; it becomes visible to workers on commit."""
+    row = BackgroundJob(
+        kind=kind,
+        payload=payload or {},
+        status="pending",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.add(row)
+    db.info["jobs_enqueued"] = True
+    return row
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_workers(session):
+    if session.info.pop("jobs_enqueued", False):
+        _wakeup.set()
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(BackgroundJob.status == "pending", BackgroundJob.run_after <= now),
+        and_(BackgroundJob.status == "running", BackgroundJob.locked_until < now),
+    )
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+
+def _claim(db: Session, worker: str) -> Optional[BackgroundJob]:
+    now = datetime.utcnow()
+    candidates = [
+        job_id for (job_id,) in (
+            db.query(BackgroundJob.id)
+            .filter(_claimable(now))
+            .order_by(BackgroundJob.run_after, BackgroundJob.id)
+            .limit(5)
+        )
+    ]
+    for job_id in candidates:
+        # 条件付き UPDATE で取得。他のワーカー／プロセスが先に取っていれば 0 行
+        claimed = (
+            db.query(BackgroundJob)
+            .filter(BackgroundJob.id == job_id, _claimable(now))
+            .update(
+                {
+                    BackgroundJob.status: "running",
+                    BackgroundJob.locked_until: now + timedelta(seconds=JOB_VISIBILITY_TIMEOUT),
+                    BackgroundJob.locked_by: worker,
+                    BackgroundJob.attempts: BackgroundJob.attempts + 1,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if claimed:
+            job_row = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+            if job_row is not None and job_row.locked_by == worker:
+                return job_row
+    return None
+
+
+def _finish(db: Session, job_row: BackgroundJob, error: Optional[str]) -> Optional[str]:
+    """Record the outcome if this claim still owns the job; returns the new status or None."""
+    now = datetime.utcnow()
+    # 取得時の値で照合する
+    job_id, worker, attempts, max_attempts = job_row.id, job_row.locked_by, job_row.attempts, job_row.max_attempts
+    values = {BackgroundJob.locked_until: None, BackgroundJob.locked_by: None, BackgroundJob.last_error: error}
+    if error is None:
+        status = "done"
+        values[BackgroundJob.finished_at] = now
+    elif attempts >= max_attempts:
+        status = "failed"
+        values[BackgroundJob.finished_at] = now
+    else:
+        status = "pending"
+        values[BackgroundJob.run_after] = now + timedelta(seconds=min(2 ** attempts, JOB_MAX_BACKOFF))
+    values[BackgroundJob.status] = status
+    updated = (
+        db.query(BackgroundJob)
+        .filter(
+            BackgroundJob.id == job_id,
+            BackgroundJob.status == "running",
+            BackgroundJob.locked_by == worker,
+            BackgroundJob.attempts == attempts,
+        )
+        .update(values, synchronize_session=False)
+    )
+    db.commit()
+    if not updated:
+        # 可視性タイムアウトを過ぎて別のワーカーが取り直した
+        logger.warning("Background job %s finished after its claim was lost", job_id)
+        return None
+    return status
+
+
+def run_one(db: Session, worker: Optional[str] = None) -> bool:
+    """Claim and run one due job. Returns False when nothing was due."""
+    job_row = _claim(db, worker or _worker_id())
+    if job_row is None:
+        return False
+    handler = _handlers.get(job_row.kind)
+    error = None
+    kind = job_row.kind
+    with metrics.timer("background_job_seconds", kind=kind):
+        try:
+            if handler is None:
+                raise LookupError(f"no handler registered for {job_row.kind}")
+            work = SessionLocal()
+            try:
+                handler(work, dict(job_row.payload or {}))
+            finally:
+                work.close()
+        except Exception:
+            error = traceback.format_exc(limit=5)
+            logger.exception("Background job %s (%s) failed", job_row.id, job_row.kind)
+    status = _finish(db, job_row, error)
+    result = "lost" if status is None else "ok" if error is None else status
+    metrics.inc("background_jobs_total", kind=kind, result=result)
+    return True
+
+
+def run_pending(limit: int = 1000) -> int:
+    """Drain due jobs in the calling thread (scripts / tests). Returns the number run."""
+    db = SessionLocal()
+    try:
+        count = 0
+        while count < limit and run_one(db):
+            count += 1
+        return count
+    finally:
+        db.close()
+
+
+def prune_finished(db: Session, older_than: timedelta = JOB_RETENTION) -> int:
+    cutoff = datetime.utcnow() - older_than
+    deleted = (
+        db.query(BackgroundJob)
+        .filter(BackgroundJob.status == "done", BackgroundJob.finished_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+class _Worker(threading.Thread):
+    def __init__(self, index: int, stop: threading.Event) -> None:
+        super().__init__(name=f"job-worker-{index}", daemon=True)
+        self.stop = stop
+
+    def run(self) -> None:
+        db = SessionLocal()
+        try:
+            while not self.stop.is_set():
+                try:
+                    ran = run_one(db)
+                except Exception:
+                    logger.exception("Job worker loop error")
+                    db.rollback()
+                    ran = False
+                if not ran:
+                    _wakeup.wait(JOB_POLL_INTERVAL)
+                    _wakeup.clear()
+        finally:
+            db.close()
+
+
+_stop = threading.Event()
+_workers: List[_Worker] = []
+
+
+def start_workers(count: int = JOB_WORKERS) -> None:
+    if _workers or count <= 0:
+        return
+    _stop.clear()
+    for i in range(count):
+        worker = _Worker(i, _stop)
+        worker.start()
+        _workers.append(worker)
+    try:
+        db = SessionLocal()
+        try:
+            prune_finished(db)
+        finally:
+            db.close()
+    except Exception:
+        logger.exception("Failed to prune finished jobs")
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    _stop.set()
+    _wakeup.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
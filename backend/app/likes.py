@@ -0,0 +1,402 @@
+"""Post likes as single conditional statements.
+
+``add_post_like`` / ``remove_post_like`` write the reaction row with
+``INSERT ... ON CONFLICT DO NOTHING RETURNING`` / ``DELETE ... RETURNING``.
+Only the request whose statement actually inserted or deleted the row
+applies the like-count and carat deltas, so repeated or concurrent requests
+for the same like change nothing and never hit ``unique_user_reaction``.
+
+The deltas are relative ``UPDATE``s in the caller's transaction, issued
+last (post, then author) so the hot rows stay locked only until the commit
+and always in the same order.
+
+With ``LIKE_WRITE_BEHIND=true`` the reaction row is still written in the
+request, but the post counter and the author's carats are not: committed
+likes are buffered per post in memory and a flusher thread applies the
+summed deltas as relative ``UPDATE``s every ``LIKE_FLUSH_INTERVAL_MS`` or
+after ``LIKE_FLUSH_MAX_EVENTS`` likes.  ``like_count`` therefore only ever
+holds flushed likes, and each process adds just its own unflushed ones.
+A buffer lost with its process is repaired by ``settle_post_likes``, which
+recounts ``reactions`` and moves the difference onto ``like_count`` and the
+authors' carats: the first like on a post in each ``LIKE_SETTLE_DELAY``
+window enqueues a delayed ``likes.settle`` job in the request's transaction.
+A recount that sees likes another process has not flushed yet is corrected
+by the job those later likes scheduled.
+
+``liked_post_ids`` answers "which of these posts has the user liked".  The
+full set of a user's liked posts is kept in a small per-process LRU (users
+with more than ``LIKED_CACHE_MAX_LIKES`` likes are always queried), so
+repeat lookups, negatives included, need no query.  Likes made through this
+module drop the user's entry on commit; other processes see them within
+``LIKED_CACHE_TTL`` seconds.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, case, delete, event, func, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.auth import invalidate_user_cache_on_commit
+from app.cache import TTLCache
+from app.counters import adjust_post_counters, refresh_hot_scores
+from app.database import SessionLocal
+from app.jobs import enqueue
+from app.metrics import metrics
+from app.models import Post, Reaction, User
+
+logger = logging.getLogger("app.likes")
+
+LIKE_WRITE_BEHIND = os.getenv("LIKE_WRITE_BEHIND", "false").lower() == "true"
+LIKE_FLUSH_INTERVAL_MS = int(os.getenv("LIKE_FLUSH_INTERVAL_MS", "200"))
+LIKE_FLUSH_MAX_EVENTS = int(os.getenv("LIKE_FLUSH_MAX_EVENTS", "500"))
+LIKE_SETTLE_DELAY = float(os.getenv("LIKE_SETTLE_DELAY", "60"))
+LIKED_CACHE_TTL = float(os.getenv("LIKED_CACHE_TTL", "30"))
+LIKED_CACHE_SIZE = int(os.getenv("LIKED_CACHE_SIZE", "10000"))
+LIKED_CACHE_MAX_LIKES = int(os.getenv("LIKED_CACHE_MAX_LIKES", "2000"))
+
+_LIKE_KEY = ["user_id", "target_type", "target_id", "reaction_type"]
+
+
+def _insert_for(db: Session):
+    return postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+def adjust_carats(db: Session, user_id: int, delta: int) -> None:
+    """``SET carats = carats + :delta``; decrements stop at zero."""
+    if not delta:
+        return
+    carats = User.carats + delta
+    if delta < 0:
+        # まとめて適用した減算が残高を超えても 0 で止める
+        carats = case((User.carats + delta < 0, 0), else_=User.carats + delta)
+    # 集計の更新で updated_at を進めない
+    stmt = update(User).where(User.id == user_id).values(carats=carats, updated_at=User.updated_at).returning(User.email)
+    email = db.execute(stmt.execution_options(synchronize_session=False)).scalar()
+    if email is not None:
+        invalidate_user_cache_on_commit(db, user_id, email)
+
+
+def _apply_like(db: Session, post_id: int, author_id: Optional[int], delta: int) -> None:
+    if like_buffer.enabled:
+        like_buffer.record(db, post_id, delta)
+        return
+    adjust_post_counters(db, post_id, likes=delta)
+    if author_id is not None:
+        adjust_carats(db, author_id, delta)
+
+
+def add_post_like(db: Session, post_id: int, user_id: int, author_id: Optional[int]) -> bool:
+    """Like ``post_id`` as ``user_id``. Returns False if it was already liked."""
+    insert = _insert_for(db)
+    stmt = (
+        insert(Reaction)
+        .values(user_id=user_id, target_type="post", target_id=post_id, reaction_type="like")
+        .on_conflict_do_nothing(index_elements=_LIKE_KEY)
+        .returning(Reaction.id)
+    )
+    if db.execute(stmt).scalar() is None:
+        return False
+    invalidate_liked_cache_on_commit(db, user_id)
+    _apply_like(db, post_id, author_id, 1)
+    return True
+
+
+def remove_post_like(db: Session, post_id: int, user_id: int, author_id: Optional[int]) -> bool:
+    """Unlike ``post_id`` as ``user_id``. Returns False if it was not liked."""
+    stmt = (
+        delete(Reaction)
+        .where(
+            Reaction.user_id == user_id,
+            Reaction.target_type == "post",
+            Reaction.target_id == post_id,
+            Reaction.reaction_type == "like",
+        )
+        .returning(Reaction.id)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(stmt).scalar() is None:
+        return False
+    invalidate_liked_cache_on_commit(db, user_id)
+    _apply_like(db, post_id, author_id, -1)
+    return True
+
+
+def current_like_count(post: Post) -> int:
+    """``post.like_count`` plus likes still waiting in this process's buffer."""
+    return max((post.like_count or 0) + like_buffer.pending(post.id), 0)
+
+
+# ===== 「自分がいいねしたか」の判定 =====
+_liked_cache = TTLCache(maxsize=LIKED_CACHE_SIZE, ttl=LIKED_CACHE_TTL)
+_TOO_MANY = "too_many"
+
+
+def _post_likes_by(user_id: int):
+    return (
+        Reaction.user_id == user_id,
+        Reaction.target_type == "post",
+        Reaction.reaction_type == "like",
+    )
+
+
+def invalidate_liked_cache_on_commit(db: Session, user_id: int) -> None:
+    """Drop ``user_id``'s cached liked set now and again when ``db`` commits."""
+    _liked_cache.pop(user_id)
+    db.info.setdefault("liked_cache_users", set()).add(user_id)
+
+
+def _liked_set(db: Session, user_id: int) -> Optional[frozenset]:
+    """Every post ``user_id`` has liked, or None for users with too many likes to cache."""
+    cached = _liked_cache.get(user_id)
+    if cached is not None:
+        metrics.inc("liked_cache_total", result="hit")
+        return None if cached is _TOO_MANY else cached
+    metrics.inc("liked_cache_total", result="miss")
+    # unique_user_reaction (user_id, target_type, target_id, ...) だけで読める
+    rows = db.scalars(
+        select(Reaction.target_id).where(*_post_likes_by(user_id)).limit(LIKED_CACHE_MAX_LIKES + 1)
+    ).all()
+    if len(rows) > LIKED_CACHE_MAX_LIKES:
+        _liked_cache.set(user_id, _TOO_MANY)
+        return None
+    liked = frozenset(rows)
+    _liked_cache.set(user_id, liked)
+    return liked
+
+
+def liked_post_ids(db: Session, user_id: int, post_ids: Iterable[int]) -> set:
+    """The subset of ``post_ids`` that ``user_id`` has liked."""
+    post_ids = set(post_ids)
+    if not post_ids:
+        return set()
+    liked = _liked_set(db, user_id)
+    if liked is not None:
+        return post_ids & liked
+    return set(db.scalars(
+        select(Reaction.target_id).where(*_post_likes_by(user_id), Reaction.target_id.in_(post_ids))
+    ))
+
+
+def like_states(db: Session, user_id: int, post_ids: List[int]) -> List[dict]:
+    """``[{"post_id", "liked", "like_count"}]`` for the posts in ``post_ids`` that exist, in order."""
+    if not post_ids:
+        return []
+    liked = _liked_set(db, user_id)
+    if liked is None:
+        # いいね状態も同じクエリで取る（reactions は一意制約のインデックスで引く）
+        reaction = (
+            select(Reaction.id)
+            .where(*_post_likes_by(user_id), Reaction.target_id == Post.id)
+            .exists()
+        )
+        rows = db.execute(select(Post.id, Post.like_count, reaction).where(Post.id.in_(post_ids))).all()
+    else:
+        rows = [
+            (post_id, like_count, post_id in liked)
+            for post_id, like_count in db.execute(select(Post.id, Post.like_count).where(Post.id.in_(post_ids)))
+        ]
+    by_id = {post_id: (like_count, bool(is_liked)) for post_id, like_count, is_liked in rows}
+    return [
+        {
+            "post_id": post_id,
+            "liked": by_id[post_id][1],
+            "like_count": max((by_id[post_id][0] or 0) + like_buffer.pending(post_id), 0),
+        }
+        for post_id in post_ids
+        if post_id in by_id
+    ]
+
+
+def settle_post_likes(db: Session, post_ids: Iterable[int]) -> int:
+    """Recount likes for ``post_ids`` and apply the differences. Commits.
+
+    ``like_count`` is set to the number of like reactions and each author's
+    carats move by the same difference, so settling is idempotent and also
+    repairs deltas that were buffered and lost.  The posts are locked (on
+    PostgreSQL) while they are recounted, so concurrent settles of the same
+    post apply each difference once.  Returns the number of posts changed.
+    """
+    post_ids = sorted(set(post_ids))
+    if not post_ids:
+        return 0
+    posts = db.execute(
+        select(Post.id, Post.user_id, Post.like_count)
+        .where(Post.id.in_(post_ids))
+        .order_by(Post.id)
+        .with_for_update()
+    ).all()
+    counts = dict(db.execute(
+        select(Reaction.target_id, func.count(Reaction.id))
+        .where(
+            Reaction.target_type == "post",
+            Reaction.reaction_type == "like",
+            Reaction.target_id.in_(post_ids),
+        )
+        .group_by(Reaction.target_id)
+    ).all())
+    changed: List[dict] = []
+    carats: Dict[int, int] = defaultdict(int)
+    for post_id, author_id, like_count in posts:
+        actual = counts.get(post_id, 0)
+        if actual != (like_count or 0):
+            changed.append({"post_id": post_id, "like_count": actual})
+            if author_id is not None:
+                carats[author_id] += actual - (like_count or 0)
+    if changed:
+        posts_table = Post.__table__
+        db.execute(
+            posts_table.update()
+            .where(posts_table.c.id == bindparam("post_id"))
+            # 集計の更新で updated_at（編集日時）を進めない
+            .values(like_count=bindparam("like_count"), updated_at=posts_table.c.updated_at),
+            changed,
+        )
+        refresh_hot_scores(db, [row["post_id"] for row in changed])
+        for author_id, delta in sorted(carats.items()):
+            adjust_carats(db, author_id, delta)
+    db.commit()
+    return len(changed)
+
+
+def _apply_like_deltas(db: Session, deltas: Dict[int, int]) -> None:
+    """Add summed like deltas to the posts and their authors' carats. Commits."""
+    authors = dict(db.execute(select(Post.id, Post.user_id).where(Post.id.in_(list(deltas)))).all())
+    carats: Dict[int, int] = defaultdict(int)
+    # 投稿→作者の順に、それぞれ id 順で更新してロック順を揃える
+    for post_id in sorted(deltas):
+        if post_id not in authors:
+            continue
+        adjust_post_counters(db, post_id, likes=deltas[post_id])
+        if authors[post_id] is not None:
+            carats[authors[post_id]] += deltas[post_id]
+    for author_id, delta in sorted(carats.items()):
+        adjust_carats(db, author_id, delta)
+    db.commit()
+
+
+class LikeBuffer:
+    """Per-process buffer of committed like deltas, applied by a flusher thread."""
+
+    def __init__(self, enabled: bool = LIKE_WRITE_BEHIND, interval_ms: int = LIKE_FLUSH_INTERVAL_MS,
+                 max_events: int = LIKE_FLUSH_MAX_EVENTS, settle_delay: float = LIKE_SETTLE_DELAY) -> None:
+        self.enabled = enabled
+        self.interval = interval_ms / 1000
+        self.max_events = max_events
+        self.settle_delay = settle_delay
+        self._pending: Dict[int, int] = defaultdict(int)
+        # 適用中（未コミット）の分。コミットまでは pending に含める
+        self._flushing: Dict[int, int] = {}
+        self._events = 0
+        # post_id -> この時刻までの「いいね」は登録済みの likes.settle ジョブが拾う
+        self._settle_scheduled: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, db: Session, post_id: int, delta: int) -> None:
+        """Buffer ``delta`` for ``post_id`` once ``db`` commits."""
+        now = time.monotonic()
+        covered_until = None
+        if self._settle_scheduled.get(post_id, 0) <= now:
+            # プロセスが落ちてもこのジョブが集計を直す。ジョブ実行より十分前に締め切る
+            enqueue(db, "likes.settle", {"post_ids": [post_id]}, delay=self.settle_delay)
+            covered_until = now + self.settle_delay / 2
+        db.info.setdefault("like_deltas", []).append((post_id, delta, covered_until))
+
+    def _committed(self, deltas: List[tuple]) -> None:
+        with self._lock:
+            for post_id, delta, covered_until in deltas:
+                self._pending[post_id] += delta
+                if covered_until is not None:
+                    self._settle_scheduled[post_id] = max(self._settle_scheduled.get(post_id, 0), covered_until)
+            self._events += len(deltas)
+            full = self._events >= self.max_events
+        metrics.inc("like_buffer_events_total", len(deltas))
+        if full:
+            self._wakeup.set()
+
+    def pending(self, post_id: int) -> int:
+        return self._pending.get(post_id, 0) + self._flushing.get(post_id, 0)
+
+    def flush(self, db: Session) -> int:
+        """Apply every buffered delta now. Returns the number of posts changed."""
+        with self._lock:
+            batch = {post_id: delta for post_id, delta in self._pending.items() if delta}
+            self._pending.clear()
+            self._flushing = batch
+            self._events = 0
+            now = time.monotonic()
+            for post_id in [p for p, until in self._settle_scheduled.items() if until <= now]:
+                del self._settle_scheduled[post_id]
+        if not batch:
+            return 0
+        with metrics.timer("like_buffer_flush_seconds"):
+            try:
+                _apply_like_deltas(db, batch)
+            except Exception:
+                db.rollback()
+                with self._lock:
+                    # 次の flush で再適用する
+                    for post_id, delta in batch.items():
+                        self._pending[post_id] += delta
+                    self._flushing = {}
+                raise
+        with self._lock:
+            self._flushing = {}
+        metrics.inc("like_buffer_flushes_total")
+        return len(batch)
+
+    def _run(self) -> None:
+        db = SessionLocal()
+        try:
+            while not self._stop.is_set():
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+                try:
+                    self.flush(db)
+                except Exception:
+                    logger.exception("Like buffer flush failed")
+            self.flush(db)
+        finally:
+            db.close()
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="like-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the flusher after a final flush."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+
+like_buffer = LikeBuffer()
+
+
+@event.listens_for(Session, "after_commit")
+def _buffer_committed_likes(session):
+    deltas = session.info.pop("like_deltas", None)
+    if deltas:
+        like_buffer._committed(deltas)
+    for user_id in session.info.pop("liked_cache_users", ()):
+        _liked_cache.pop(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_likes(session):
+    session.info.pop("like_deltas", None)
+    session.info.pop("liked_cache_users", None)
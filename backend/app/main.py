@@ -1,6 +1,6 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse
 from sqlalchemy import text
 from .database import get_db
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,7 +8,14 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from app.routers import auth, users, profiles, posts, comments, reactions, follows, notifications, media, billing, matching, categories, ops, account
-from app.database import Base, engine, get_db
+from app.database import Base, engine, get_db, pool_stats
+from app.metrics import metrics
+from app.request_metrics import RequestMetricsMiddleware
+from app.pagination import NEXT_CURSOR_HEADER
+from app.chat_pubsub import get_chat_broker
+from app.jobs import start_workers as start_job_workers, stop_workers as stop_job_workers
+import app.tasks  # noqa: F401  ジョブハンドラの登録
+from app.likes import like_buffer
 import os
 from pathlib import Path
 import os
@@ -85,7 +92,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
+# 最外側に置き、CORS のプリフライトも含めて計測する
+app.add_middleware(RequestMetricsMiddleware)
 
 # Ensure 307 redirect between with/without trailing slash
 app.router.redirect_slashes = True
@@ -116,6 +126,30 @@ def on_startup():
         print(f"⚠️ Database initialization failed: {e}")
         print("⚠️ Application will continue without database initialization")
 
+@app.on_event("startup")
+async def start_chat_broker():
+    await get_chat_broker().start()
+
+@app.on_event("shutdown")
+async def stop_chat_broker():
+    await get_chat_broker().stop()
+
+@app.on_event("startup")
+def start_background_jobs():
+    start_job_workers()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    stop_job_workers()
+
+@app.on_event("startup")
+def start_like_buffer():
+    like_buffer.start()
+
+@app.on_event("shutdown")
+def stop_like_buffer():
+    like_buffer.stop()
+
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
@@ -124,6 +158,15 @@ async def healthz():
 async def healthz_head():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(authorization: str | None = Header(default=None)):
+    """Prometheus scrape endpoint. Requires ``Bearer $METRICS_TOKEN`` when that is set."""
+    token = os.getenv("METRICS_TOKEN")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="unauthorized")
+    pool_stats()  # プールのゲージを更新
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "LGBTQ Community API", "version": "1.0.0"}
@@ -0,0 +1,332 @@
+"""In-process faceted index over visible matching profiles.
+
+``/api/matching/search`` answers its filters from here instead of from SQL:
+every facet value maps to a bitset of the user ids that have it (a Python
+``int`` with bit ``user_id`` set), so a search is a handful of ANDs, the
+total is a popcount and a page is the n-th..m-th set bits.  The database is
+only queried to hydrate the profiles on the returned page.
+
+The index is per process.  Writes through the ORM in this process are picked
+up on the next search (only the changed profiles are reloaded); writes made
+by other processes or with bulk ``UPDATE``/``DELETE`` statements show up when
+the index is rebuilt, at most ``MATCHING_INDEX_TTL`` seconds later.  Code
+doing bulk writes should call ``invalidate`` / ``clear`` itself.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.metrics import metrics
+from app.models import Hobby, MatchingProfile, MatchingProfileHobby
+
+logger = logging.getLogger("app.matching_index")
+
+FACETS = ("prefecture", "age_band", "occupation", "income_range", "meet_pref", "identity")
+HOBBIES = "hobbies"
+MATCHING_INDEX_TTL = float(os.getenv("MATCHING_INDEX_TTL", "60"))
+
+_BLOCK_BYTES = 1024
+
+
+def _bits_from_ids(ids: Iterable[int]) -> int:
+    ids = list(ids)
+    if not ids:
+        return 0
+    buf = bytearray(max(ids) // 8 + 1)
+    for user_id in ids:
+        buf[user_id >> 3] |= 1 << (user_id & 7)
+    return int.from_bytes(buf, "little")
+
+
+def select_bits(bits: int, offset: int, limit: int) -> List[int]:
+    """The positions of the ``offset``-th .. ``offset + limit - 1``-th set bits, ascending.
+
+    Whole blocks are skipped by popcount, so the cost is linear in the size
+    of the bitset rather than in ``offset``.
+    """
+    out: List[int] = []
+    if bits <= 0 or limit <= 0:
+        return out
+    buf = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for start in range(0, len(buf), _BLOCK_BYTES):
+        block = buf[start:start + _BLOCK_BYTES]
+        n = int.from_bytes(block, "little").bit_count()
+        if offset >= n:
+            offset -= n
+            continue
+        for word_start in range(0, len(block), 8):
+            word = int.from_bytes(block[word_start:word_start + 8], "little")
+            if not word:
+                continue
+            n = word.bit_count()
+            if offset >= n:
+                offset -= n
+                continue
+            base = (start + word_start) * 8
+            while word:
+                low = word & -word
+                word ^= low
+                if offset:
+                    offset -= 1
+                    continue
+                out.append(base + low.bit_length() - 1)
+                if len(out) == limit:
+                    return out
+    return out
+
+
+class FacetIndex:
+    """Bitsets of visible profiles: ``postings[facet][value]`` and ``visible``.
+
+    Not thread-safe on its own; ``MatchingIndex`` serialises access.
+    """
+
+    def __init__(self) -> None:
+        self.visible = 0
+        self.postings: Dict[str, Dict[str, int]] = {facet: {} for facet in FACETS + (HOBBIES,)}
+        # user_id -> {facet: value or set of hobby names}; needed to unset bits on update
+        self.docs: Dict[int, dict] = {}
+
+    @classmethod
+    def from_rows(cls, profiles: Iterable[tuple], hobbies: Iterable[tuple]) -> "FacetIndex":
+        """Bulk build from ``(user_id, *FACETS)`` and ``(user_id, hobby_name)`` rows."""
+        index = cls()
+        ids = defaultdict(list)
+        for user_id, *values in profiles:
+            doc = {HOBBIES: set()}
+            for facet, value in zip(FACETS, values):
+                if value:
+                    doc[facet] = value
+                    ids[(facet, value)].append(user_id)
+            index.docs[user_id] = doc
+        for user_id, name in hobbies:
+            doc = index.docs.get(user_id)
+            if doc is not None and name not in doc[HOBBIES]:
+                doc[HOBBIES].add(name)
+                ids[(HOBBIES, name)].append(user_id)
+        index.visible = _bits_from_ids(index.docs)
+        for (facet, value), user_ids in ids.items():
+            index.postings[facet][value] = _bits_from_ids(user_ids)
+        return index
+
+    def remove(self, user_id: int) -> None:
+        doc = self.docs.pop(user_id, None)
+        if doc is None:
+            return
+        bit = 1 << user_id
+        self.visible &= ~bit
+        for facet, value in doc.items():
+            for v in (value if facet == HOBBIES else (value,)):
+                postings = self.postings[facet]
+                remaining = postings.get(v, 0) & ~bit
+                if remaining:
+                    postings[v] = remaining
+                else:
+                    postings.pop(v, None)
+
+    def add(self, user_id: int, values: dict, hobbies: Iterable[str]) -> None:
+        self.remove(user_id)
+        bit = 1 << user_id
+        doc = {facet: value for facet, value in values.items() if value}
+        doc[HOBBIES] = set(hobbies)
+        self.docs[user_id] = doc
+        self.visible |= bit
+        for facet, value in doc.items():
+            for v in (value if facet == HOBBIES else (value,)):
+                self.postings[facet][v] = self.postings[facet].get(v, 0) | bit
+
+    def match(self, filters: dict, hobbies: Optional[List[str]] = None, exclude: Optional[int] = None) -> int:
+        """Bitset of profiles equal to every filter and having any of ``hobbies``."""
+        bits = self.visible
+        for facet, value in filters.items():
+            if value:
+                bits &= self.postings[facet].get(value, 0)
+        if hobbies:
+            any_hobby = 0
+            for name in hobbies:
+                any_hobby |= self.postings[HOBBIES].get(name, 0)
+            bits &= any_hobby
+        if exclude is not None and bits >> exclude & 1:
+            bits ^= 1 << exclude
+        return bits
+
+    def facet_counts(self, filters: dict, hobbies: Optional[List[str]] = None, exclude: Optional[int] = None) -> dict:
+        """``{facet: {value: count}}`` for every facet.
+
+        Each facet is counted with its own filter left out, so the counts say
+        how many results picking that value instead would give.
+        """
+        counts = {}
+        for facet in FACETS + (HOBBIES,):
+            if facet == HOBBIES:
+                base = self.match(filters, None, exclude)
+            else:
+                base = self.match({f: v for f, v in filters.items() if f != facet}, hobbies, exclude)
+            counts[facet] = {
+                value: n
+                for value, bits in self.postings[facet].items()
+                if (n := (base & bits).bit_count())
+            }
+        return counts
+
+
+class MatchingIndex:
+    """Owns the current ``FacetIndex`` and keeps it in step with the database."""
+
+    def __init__(self, ttl: float = MATCHING_INDEX_TTL) -> None:
+        self.ttl = ttl
+        self._index: Optional[FacetIndex] = None
+        self._built_at = 0.0
+        self._pending: set = set()
+        self._changed_during_rebuild: Optional[set] = None
+        self._rebuilding = False
+        self._lock = threading.Lock()
+
+    # ----- 変更の通知 -----
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        """Reload these profiles on the next search."""
+        user_ids = set(user_ids)
+        with self._lock:
+            self._pending.update(user_ids)
+            if self._changed_during_rebuild is not None:
+                self._changed_during_rebuild.update(user_ids)
+
+    def clear(self) -> None:
+        """Drop the index; the next search rebuilds it."""
+        with self._lock:
+            self._index = None
+            self._pending.clear()
+
+    # ----- 構築 -----
+    @staticmethod
+    def _load(db: Session, user_ids: Optional[Iterable[int]] = None) -> FacetIndex:
+        profiles = select(MatchingProfile.user_id, *(getattr(MatchingProfile, f) for f in FACETS)).where(
+            MatchingProfile.display_flag == True
+        )
+        hobbies = (
+            select(MatchingProfileHobby.profile_id, Hobby.name)
+            .join(Hobby, Hobby.id == MatchingProfileHobby.hobby_id)
+            .join(MatchingProfile, MatchingProfile.user_id == MatchingProfileHobby.profile_id)
+            .where(MatchingProfile.display_flag == True)
+        )
+        if user_ids is not None:
+            profiles = profiles.where(MatchingProfile.user_id.in_(user_ids))
+            hobbies = hobbies.where(MatchingProfileHobby.profile_id.in_(user_ids))
+        return FacetIndex.from_rows(db.execute(profiles), db.execute(hobbies))
+
+    def _rebuild(self, db: Session) -> FacetIndex:
+        with self._lock:
+            self._changed_during_rebuild = set()
+        started = time.perf_counter()
+        try:
+            index = self._load(db)
+        except Exception:
+            with self._lock:
+                self._changed_during_rebuild = None
+            raise
+        metrics.observe("matching_index_rebuild_seconds", time.perf_counter() - started)
+        metrics.set_gauge("matching_index_profiles", len(index.docs))
+        with self._lock:
+            self._index = index
+            self._built_at = time.monotonic()
+            # 構築中のコミットは読み込めていない可能性があるため再読込する
+            self._pending = self._changed_during_rebuild
+            self._changed_during_rebuild = None
+        return index
+
+    def _rebuild_in_background(self, bind) -> None:
+        def run():
+            db = Session(bind=bind)
+            try:
+                self._rebuild(db)
+            except Exception:
+                logger.exception("matching index rebuild failed")
+            finally:
+                db.close()
+                with self._lock:
+                    self._rebuilding = False
+
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=run, name="matching-index-rebuild", daemon=True).start()
+
+    def _sync(self, db: Session) -> None:
+        with self._lock:
+            user_ids, self._pending = self._pending, set()
+        if not user_ids:
+            return
+        try:
+            fresh = self._load(db, user_ids)
+        except Exception:
+            self.invalidate(user_ids)
+            raise
+        with self._lock:
+            if self._index is None:
+                return
+            for user_id in user_ids:
+                doc = fresh.docs.get(user_id)
+                if doc is None:
+                    self._index.remove(user_id)
+                else:
+                    hobbies = doc.pop(HOBBIES)
+                    self._index.add(user_id, doc, hobbies)
+
+    def _current(self, db: Session) -> FacetIndex:
+        index = self._index
+        if index is None:
+            index = self._rebuild(db)
+        elif time.monotonic() - self._built_at > self.ttl:
+            # 古いインデックスで応答しつつ別スレッドで作り直す
+            self._rebuild_in_background(db.get_bind())
+        self._sync(db)
+        return self._index or index
+
+    # ----- 検索 -----
+    def search(self, db: Session, filters: dict, hobbies: Optional[List[str]] = None, exclude: Optional[int] = None,
+               offset: int = 0, limit: int = 20, facets: bool = False) -> dict:
+        """``{"user_ids": [...page...], "total": n, "facets": {...} or None}``."""
+        index = self._current(db)
+        with self._lock:
+            bits = index.match(filters, hobbies, exclude)
+            facet_counts = index.facet_counts(filters, hobbies, exclude) if facets else None
+        return {
+            "user_ids": select_bits(bits, offset, limit),
+            "total": bits.bit_count(),
+            "facets": facet_counts,
+        }
+
+
+matching_index = MatchingIndex()
+
+
+# ORM 経由のプロフィール・趣味の変更をコミット時に通知する
+@event.listens_for(Session, "after_flush")
+def _collect_changed_profiles(session, flush_context):
+    changed = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, MatchingProfile):
+            changed.add(obj.user_id)
+        elif isinstance(obj, MatchingProfileHobby):
+            changed.add(obj.profile_id)
+    if changed:
+        session.info.setdefault("matching_index_changed", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    changed = session.info.pop("matching_index_changed", None)
+    if changed:
+        matching_index.invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("matching_index_changed", None)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey, CheckConstraint, UniqueConstraint, BigInteger, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey, CheckConstraint, UniqueConstraint, BigInteger, JSON, Float, Index, text
+from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -24,6 +25,7 @@ class User(Base):
     
     __table_args__ = (
         CheckConstraint("membership_type IN ('free', 'premium', 'admin')", name="check_membership_type"),
+        Index("idx_users_phone_number", "phone_number", postgresql_where=text("phone_number IS NOT NULL"), sqlite_where=text("phone_number IS NOT NULL")),
     )
     
     profile = relationship("Profile", back_populates="user", uselist=False)
@@ -101,10 +103,33 @@ class MediaAsset(Base):
     size_bytes = Column(BigInteger)
     width = Column(Integer)
     height = Column(Integer)
+    sha256 = Column(String(64), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        Index("idx_media_assets_user", "user_id"),
+        Index("idx_media_assets_url", "url"),
+    )
+    
     user = relationship("User", back_populates="media_assets")
 
+class MediaDerivative(Base):
+    """Resized WebP rendition of a MediaAsset (longest edge <= size)."""
+    __tablename__ = "media_derivatives"
+    __table_args__ = (
+        UniqueConstraint('media_asset_id', 'size', name='uq_media_derivatives_asset_size'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    media_asset_id = Column(Integer, ForeignKey("media_assets.id", ondelete="CASCADE"), nullable=False)
+    size = Column(Integer, nullable=False)
+    url = Column(String(500), nullable=False)
+    mime_type = Column(String(100), nullable=False, default="image/webp")
+    width = Column(Integer)
+    height = Column(Integer)
+    size_bytes = Column(BigInteger)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Category(Base):
     __tablename__ = "categories"
     
@@ -134,6 +159,14 @@ class Subcategory(Base):
     
     category = relationship("Category", back_populates="subcategories")
 
+def _initial_hot_score(context):
+    """``hot_score`` of a new row, for every insert path (ORM, bulk ``insert(Post)``)."""
+    # app.counters は models を import するので遅延 import
+    from app.counters import hot_score
+    params = context.get_current_parameters()
+    return hot_score(params.get("like_count"), params.get("comment_count"), params.get("created_at"))
+
+
 class Post(Base):
     __tablename__ = "posts"
     
@@ -152,6 +185,10 @@ class Post(Base):
     status = Column(String(20), server_default='published', nullable=False)
     og_image_url = Column(String(500))
     excerpt = Column(Text)
+    # 集計カラム（reactions / comments から app.counters で維持）
+    like_count = Column(Integer, default=0, server_default='0', nullable=False)
+    comment_count = Column(Integer, default=0, server_default='0', nullable=False)
+    hot_score = Column(Float, default=_initial_hot_score, server_default='0', nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -159,6 +196,15 @@ class Post(Base):
         CheckConstraint("visibility IN ('public', 'members', 'followers', 'private')", name="check_post_visibility"),
         CheckConstraint("post_type IN ('post', 'blog', 'tourism', 'news')", name="check_post_type"),
         CheckConstraint("status IN ('draft', 'published')", name="check_post_status"),
+        # フィードの並び替え（newest / popular / points / comments）とカーソルページング用
+        Index("idx_posts_visibility_created", "visibility", "created_at", "id"),
+        Index("idx_posts_visibility_hot", "visibility", "hot_score", "id"),
+        Index("idx_posts_visibility_likes", "visibility", "like_count", "created_at", "id"),
+        Index("idx_posts_visibility_comments", "visibility", "comment_count", "created_at", "id"),
+        Index("idx_posts_visibility_category_created", "visibility", "category", "created_at", "id"),
+        Index("idx_posts_type_status", "post_type", "status"),
+        Index("idx_posts_user_created", "user_id", "created_at", "id"),
+        Index("idx_posts_media_id", "media_id", postgresql_where=text("media_id IS NOT NULL"), sqlite_where=text("media_id IS NOT NULL")),
     )
     
     user = relationship("User", back_populates="posts")
@@ -179,6 +225,10 @@ class Comment(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        Index("idx_comments_post_created_id", "post_id", "created_at", "id"),
+    )
+    
     post = relationship("Post", back_populates="comments")
     user = relationship("User", back_populates="comments")
     parent = relationship("Comment", remote_side=[id])
@@ -205,6 +255,10 @@ class PostMedia(Base):
     media_asset_id = Column(Integer, ForeignKey("media_assets.id"), primary_key=True)
     order_index = Column(Integer, nullable=False, server_default='0')
 
+    __table_args__ = (
+        Index("idx_post_media_asset", "media_asset_id"),
+    )
+
 class PostTourism(Base):
     __tablename__ = "posts_tourism"
     
@@ -233,6 +287,7 @@ class Follow(Base):
     __table_args__ = (
         CheckConstraint("status IN ('pending', 'accepted', 'blocked')", name="check_follow_status"),
         CheckConstraint("follower_user_id != followee_user_id", name="check_no_self_follow"),
+        Index("idx_follows_followee_status", "followee_user_id", "status"),
     )
 
 class Reaction(Base):
@@ -249,6 +304,8 @@ class Reaction(Base):
         CheckConstraint("target_type IN ('post', 'comment', 'review')", name="check_reaction_target_type"),
         CheckConstraint("reaction_type IN ('like', 'love', 'support', 'respect')", name="check_reaction_type"),
         UniqueConstraint("user_id", "target_type", "target_id", "reaction_type", name="unique_user_reaction"),
+        # いいね数の集計・対象ごとの一覧（user_id 始まりの検索は unique_user_reaction で足りる）
+        Index("idx_reactions_target", "target_type", "target_id", "reaction_type"),
     )
     
     user = relationship("User", back_populates="reactions")
@@ -263,6 +320,10 @@ class Notification(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        Index("idx_notifications_user_created", "user_id", "created_at", "id"),
+    )
+    
     user = relationship("User", back_populates="notifications")
 
 class Report(Base):
@@ -342,6 +403,11 @@ class PointEvent(Base):
     ref_id = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        Index("idx_point_events_ref", "ref_type", "ref_id"),
+        Index("idx_point_events_user", "user_id"),
+    )
+    
     user = relationship("User", back_populates="point_events")
 
 class Award(Base):
@@ -375,7 +441,10 @@ class UserAward(Base):
 
 class MatchingProfile(Base):
     __tablename__ = "matching_profiles"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index("idx_matching_profiles_search", "display_flag", "prefecture", "age_band"),
+        {'extend_existing': True},
+    )
 
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     nickname = Column(String(100))
@@ -413,6 +482,10 @@ class MatchingProfileHobby(Base):
     profile_id = Column(Integer, ForeignKey("matching_profiles.user_id"), primary_key=True)
     hobby_id = Column(Integer, ForeignKey("hobbies.id"), primary_key=True)
 
+    __table_args__ = (
+        Index("idx_matching_profile_hobbies_hobby", "hobby_id"),
+    )
+
 
 class MatchingProfileImage(Base):
     __tablename__ = "matching_profile_images"
@@ -441,6 +514,7 @@ class Like(Base):
     __table_args__ = (
         UniqueConstraint("from_user_id", "to_user_id", name="uniq_like_from_to"),
         CheckConstraint("status IN ('active','withdrawn')", name="check_like_status"),
+        Index("idx_likes_from_status", "from_user_id", "status"),
     )
 
 
@@ -456,6 +530,8 @@ class Match(Base):
     __table_args__ = (
         UniqueConstraint("user_a_id", "user_b_id", name="uniq_match_pair"),
         CheckConstraint("user_a_id != user_b_id", name="check_match_distinct_users"),
+        # user_a_id 側は uniq_match_pair で引ける
+        Index("idx_matches_user_b", "user_b_id"),
     )
 
 
@@ -466,6 +542,10 @@ class Chat(Base):
     match_id = Column(Integer, ForeignKey("matches.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("idx_chats_match", "match_id"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -477,6 +557,12 @@ class Message(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     read_at = Column(DateTime(timezone=True))
 
+    __table_args__ = (
+        Index("idx_messages_chat_created", "chat_id", "created_at", "id"),
+        # 未読数（相手からの read_at IS NULL）
+        Index("idx_messages_chat_unread", "chat_id", "sender_id", postgresql_where=text("read_at IS NULL"), sqlite_where=text("read_at IS NULL")),
+    )
+
 
 class ChatRequest(Base):
     __tablename__ = "chat_requests"
@@ -493,6 +579,7 @@ class ChatRequest(Base):
         UniqueConstraint("from_user_id", "to_user_id", "status", name="uniq_chat_request_pending"),
         CheckConstraint("status IN ('pending','accepted','declined')", name="check_chat_request_status"),
         CheckConstraint("from_user_id != to_user_id", name="check_chat_request_distinct_users"),
+        Index("idx_chat_requests_to_status", "to_user_id", "status"),
     )
 
 
@@ -505,3 +592,54 @@ class ChatRequestMessage(Base):
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     migrated_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("idx_chat_request_messages_request", "chat_request_id", "created_at"),
+    )
+
+
+class BackgroundJob(Base):
+    """Durable queue for side effects run after the request (see app.jobs)."""
+    __tablename__ = "background_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String(20), nullable=False, default="pending", server_default="pending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    max_attempts = Column(Integer, nullable=False, default=5, server_default="5")
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime)
+    locked_by = Column(String(100))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("idx_background_jobs_status_run_after", "status", "run_after"),
+        CheckConstraint("status IN ('pending','running','done','failed')", name="check_background_job_status"),
+    )
+
+
+class TimelineEntry(Base):
+    """Fan-out-on-write home timeline row: ``post_id`` is in ``user_id``'s timeline (see app.timeline)."""
+    __tablename__ = "timeline_entries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), primary_key=True)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # 投稿の created_at の写し（カーソルは投稿と同じ (created_at, id)）
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("idx_timeline_entries_user_created", "user_id", "created_at", "post_id"),
+        Index("idx_timeline_entries_post", "post_id"),
+    )
+
+
+class MaterializedTimeline(Base):
+    """Users whose ``timeline_entries`` are built and kept up to date by fan-out."""
+    __tablename__ = "materialized_timelines"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    built_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,69 @@
+"""Opaque keyset (cursor) pagination helpers.
+
+A cursor encodes the sort-key values of the last row of a page, e.g.
+``(created_at, id)``.  The next page is fetched with a row-value comparison
+against those values, so it can use the matching composite index instead of
+scanning and discarding ``OFFSET`` rows.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import func, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(kind: str, values: Sequence[Any]) -> str:
+    payload = json.dumps({"k": kind, "v": [_encode_value(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str, size: int) -> List[Any]:
+    """Decode ``cursor``; raises 400 if it is malformed or belongs to another listing."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = [_decode_value(v) for v in payload["v"]]
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid_cursor")
+    if payload.get("k") != kind or len(values) != size:
+        raise HTTPException(status_code=400, detail="invalid_cursor")
+    return values
+
+
+def _comparable(column, value, dialect_name: str):
+    # SQLite は日時を文字列で保存し、CURRENT_TIMESTAMP（秒まで）と
+    # SQLAlchemy の書式（マイクロ秒付き）が混在するため julianday で比較する
+    if dialect_name == "sqlite" and isinstance(value, datetime):
+        return func.julianday(column), func.julianday(value)
+    return column, value
+
+
+def keyset_filter(columns: Sequence[Any], values: Sequence[Any], descending: bool = True, dialect_name: str = ""):
+    """Row-value predicate selecting rows strictly after ``values`` in the sort order."""
+    pairs = [_comparable(c, v, dialect_name) for c, v in zip(columns, values)]
+    left = tuple_(*[p[0] for p in pairs])
+    right = tuple_(*[p[1] for p in pairs])
+    return left < right if descending else left > right
+
+
+def next_cursor(rows: Sequence[Any], limit: int, kind: str, key: Callable[[Any], Sequence[Any]]) -> Optional[str]:
+    """Cursor for the page following ``rows``, or None when this was the last page."""
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(kind, key(rows[-1]))
@@ -0,0 +1,111 @@
+"""Per-request HTTP and database metrics.
+
+``RequestMetricsMiddleware`` records, for every HTTP request, its latency,
+status and the number / total time of SQL statements it executed, labelled
+by route template (``/api/posts/{post_id}``) rather than raw path.  Queries
+are attributed through a context variable that SQLAlchemy cursor events
+update; it is shared with the threadpool, so sync dependencies and
+``run_in_threadpool`` calls are counted too.  Queries outside a request
+(background jobs, startup) are not attributed.
+
+Requests whose query count reaches ``DB_QUERY_WARN_THRESHOLD`` are logged,
+which is the quickest way to spot a new N+1.
+"""
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics import metrics
+
+logger = logging.getLogger("app.request_metrics")
+
+DB_QUERY_WARN_THRESHOLD = int(os.getenv("DB_QUERY_WARN_THRESHOLD", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats of the request being handled, or None outside a request."""
+    return _query_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _query_stats.get()
+    if stats is None:
+        return
+    stats.count += 1
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        stats.seconds += time.perf_counter() - started
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    # 未マッチ（404）のパスをそのままラベルにすると系列数が際限なく増える
+    return path or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware (no ``BaseHTTPMiddleware`` task overhead)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.add_gauge("http_requests_in_flight", 1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.add_gauge("http_requests_in_flight", -1)
+            _query_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            method = scope["method"]
+            route = _route_label(scope)
+            metrics.inc("http_requests_total", method=method, route=route, status=status_code)
+            metrics.observe("http_request_duration_seconds", elapsed, LATENCY_BUCKETS, method=method, route=route)
+            metrics.observe("db_queries_per_request", stats.count, QUERY_COUNT_BUCKETS, method=method, route=route)
+            metrics.observe("db_query_seconds_per_request", stats.seconds, LATENCY_BUCKETS, method=method, route=route)
+            if stats.count >= DB_QUERY_WARN_THRESHOLD:
+                logger.warning(
+                    "%s %s ran %d queries (%.1f ms in SQL)", method, route, stats.count, stats.seconds * 1000
+                )
@@ -2,12 +2,13 @@ from datetime import timedelta, datetime
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.database import get_db
-from app.models import User, Profile, MatchingProfile
+from sqlalchemy import func, select, text
+from app.database import get_async_db, get_db
+from app.models import Post, User, Profile, MatchingProfile
 from app.schemas import UserCreate, User as UserSchema, Token, PhoneVerificationRequest, PhoneVerificationConfirm, UserRegistrationStep1
-from app.auth import authenticate_user, create_access_token, get_password_hash, get_current_active_user, get_current_admin_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.auth import authenticate_user_async, create_access_token, get_password_hash_async, get_current_active_user_async, get_current_admin_user_async, user_token_claims, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.sms_service import sms_service
 import random
 import os
@@ -23,7 +24,7 @@ async def auth_health():
     return {"status": "ok", "service": "authentication"}
 
 @router.post("/send-verification-code")
-async def send_verification_code(request: PhoneVerificationRequest, db: Session = Depends(get_db)):
+async def send_verification_code(request: PhoneVerificationRequest, db: AsyncSession = Depends(get_async_db)):
     """携帯番号にSMS認証コードを送信"""
     if not PHONE_AUTH_ENABLED:
         raise HTTPException(status_code=501, detail="Phone authentication is not enabled")
@@ -39,7 +40,7 @@ async def send_verification_code(request: PhoneVerificationRequest, db: Session
     formatted_phone = sms_service.format_phone_number(request.phone_number)
     
     # 既存ユーザーチェック
-    existing_user = db.query(User).filter(User.phone_number == formatted_phone).first()
+    existing_user = await db.scalar(select(User).where(User.phone_number == formatted_phone))
     if existing_user:
         raise HTTPException(
             status_code=400,
@@ -59,7 +60,7 @@ async def send_verification_code(request: PhoneVerificationRequest, db: Session
     
     # 一時的にセッションに保存（実際の実装では Redis や DB の一時テーブルを使用）
     # ここでは簡易的にユーザーレコードを作成して認証コードを保存
-    temp_user = db.query(User).filter(User.phone_number == formatted_phone).first()
+    temp_user = await db.scalar(select(User).where(User.phone_number == formatted_phone))
     if not temp_user:
         temp_user = User(
             phone_number=formatted_phone,
@@ -75,12 +76,12 @@ async def send_verification_code(request: PhoneVerificationRequest, db: Session
         temp_user.phone_verification_code = verification_code
         temp_user.phone_verification_expires = expires_at
     
-    db.commit()
+    await db.commit()
     
     return {"message": "認証コードを送信しました", "expires_in": 300}
 
 @router.post("/verify-phone")
-async def verify_phone(request: PhoneVerificationConfirm, db: Session = Depends(get_db)):
+async def verify_phone(request: PhoneVerificationConfirm, db: AsyncSession = Depends(get_async_db)):
     """携帯番号の認証コードを確認"""
     if not PHONE_AUTH_ENABLED:
         raise HTTPException(status_code=501, detail="Phone authentication is not enabled")
@@ -88,7 +89,7 @@ async def verify_phone(request: PhoneVerificationConfirm, db: Session = Depends(
     formatted_phone = sms_service.format_phone_number(request.phone_number)
     
     # ユーザー検索
-    user = db.query(User).filter(User.phone_number == formatted_phone).first()
+    user = await db.scalar(select(User).where(User.phone_number == formatted_phone))
     if not user:
         raise HTTPException(
             status_code=404,
@@ -113,12 +114,12 @@ async def verify_phone(request: PhoneVerificationConfirm, db: Session = Depends(
     user.phone_verified = True
     user.phone_verification_code = None
     user.phone_verification_expires = None
-    db.commit()
+    await db.commit()
     
     return {"message": "携帯番号の認証が完了しました"}
 
 @router.post("/register-with-phone", response_model=UserSchema)
-async def register_with_phone(user_data: UserRegistrationStep1, db: Session = Depends(get_db)):
+async def register_with_phone(user_data: UserRegistrationStep1, db: AsyncSession = Depends(get_async_db)):
     """携帯番号認証後のユーザー登録"""
     if not PHONE_AUTH_ENABLED:
         raise HTTPException(status_code=501, detail="Phone authentication is not enabled")
@@ -126,7 +127,7 @@ async def register_with_phone(user_data: UserRegistrationStep1, db: Session = De
     formatted_phone = sms_service.format_phone_number(user_data.phone_number)
     
     # メールアドレス重複チェック
-    existing_email = db.query(User).filter(User.email == user_data.email).first()
+    existing_email = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_email:
         raise HTTPException(
             status_code=400,
@@ -134,7 +135,7 @@ async def register_with_phone(user_data: UserRegistrationStep1, db: Session = De
         )
     
     # 認証済みユーザーを検索、なければ新規作成
-    user = db.query(User).filter(User.phone_number == formatted_phone).first()
+    user = await db.scalar(select(User).where(User.phone_number == formatted_phone))
     
     if user:
         # 既存ユーザーの場合は情報を更新
@@ -144,7 +145,7 @@ async def register_with_phone(user_data: UserRegistrationStep1, db: Session = De
                 detail="携帯番号の認証が完了していません"
             )
         user.email = user_data.email
-        user.password_hash = get_password_hash(user_data.password)
+        user.password_hash = await get_password_hash_async(user_data.password)
         user.display_name = user_data.display_name
         user.is_active = True
         user.membership_type = "premium"
@@ -153,30 +154,30 @@ async def register_with_phone(user_data: UserRegistrationStep1, db: Session = De
         user = User(
             phone_number=formatted_phone,
             email=user_data.email,
-            password_hash=get_password_hash(user_data.password),
+            password_hash=await get_password_hash_async(user_data.password),
             display_name=user_data.display_name,
             is_active=True,
             membership_type="premium",
             phone_verified=True  # 開発環境用
         )
         db.add(user)
-        db.flush()  # IDを取得するため
+        await db.flush()  # IDを取得するため
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     # プロフィール作成（既存チェック）
-    existing_profile = db.query(Profile).filter(Profile.user_id == user.id).first()
+    existing_profile = await db.scalar(select(Profile).where(Profile.user_id == user.id))
     if not existing_profile:
         db_profile = Profile(
             user_id=user.id,
             handle=f"user_{user.id}"
         )
         db.add(db_profile)
-        db.commit()
+        await db.commit()
     
     # マッチングプロフィール作成（ニックネームに表示名を設定）
-    existing_matching_profile = db.query(MatchingProfile).filter(MatchingProfile.user_id == user.id).first()
+    existing_matching_profile = await db.scalar(select(MatchingProfile).where(MatchingProfile.user_id == user.id))
     if not existing_matching_profile:
         matching_profile = MatchingProfile(
             user_id=user.id,
@@ -185,22 +186,22 @@ async def register_with_phone(user_data: UserRegistrationStep1, db: Session = De
             prefecture="未設定"
         )
         db.add(matching_profile)
-        db.commit()
+        await db.commit()
     
     return user
 
 @router.post("/register", response_model=UserSchema)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Email-based user registration"""
     # メールアドレスの重複チェック
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     
     db_user = User(
         email=user.email,
@@ -210,8 +211,8 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         membership_type="premium"
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     db_profile = Profile(
         user_id=db_user.id,
@@ -226,13 +227,13 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     )
     db.add(db_matching_profile)
     
-    db.commit()
+    await db.commit()
     
     return db_user
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -241,13 +242,13 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=user_token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -256,14 +257,13 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=user_token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserSchema)
 async def read_users_me(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async)
 ):
     user_dict = {
         "id": current_user.id,
@@ -279,28 +279,27 @@ async def read_users_me(
 
 @router.get("/admin/users", response_model=List[UserSchema])
 async def get_all_users(
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_admin_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    users = db.query(User).all()
+    users = (await db.scalars(select(User))).all()
     return users
 
 @router.get("/admin/posts")
 async def get_all_posts(
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_admin_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    from app.models import Post
-    posts = db.query(Post).all()
+    posts = (await db.scalars(select(Post))).all()
     return posts
 
 @router.get("/admin/stats")
 async def get_user_stats(
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_admin_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
+    total_users = await db.scalar(select(func.count(User.id)))
+    active_users = await db.scalar(select(func.count(User.id)).where(User.is_active == True))
     return {
         "total_users": total_users,
         "active_users": active_users
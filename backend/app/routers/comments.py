@@ -1,37 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
+from typing import List, Optional
+from app.database import get_async_db
 from app.models import User, Comment, PointEvent
 from app.schemas import Comment as CommentSchema, CommentCreate, CommentUpdate
-from app.auth import get_current_active_user
+from app.auth import get_current_active_user_async
+from app.counters import adjust_post_counters
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, keyset_filter, next_cursor
 
 router = APIRouter(prefix="/api/comments", tags=["comments"])
 
 @router.get("/", response_model=List[CommentSchema])
 async def read_comments(
     post_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    comments = db.query(Comment).filter(
-        Comment.post_id == post_id
-    ).order_by(Comment.created_at).offset(skip).limit(limit).all()
+    stmt = select(Comment).where(Comment.post_id == post_id)
+    if cursor:
+        values = decode_cursor(cursor, "comments", 2)
+        stmt = stmt.where(
+            keyset_filter([Comment.created_at, Comment.id], values, descending=False, dialect_name=db.get_bind().dialect.name)
+        )
+    stmt = stmt.order_by(Comment.created_at, Comment.id)
+    if not cursor:
+        stmt = stmt.offset(skip)
+    comments = (await db.scalars(stmt.limit(limit))).all()
+    following = next_cursor(comments, limit, "comments", lambda c: [c.created_at, c.id])
+    if following:
+        response.headers[NEXT_CURSOR_HEADER] = following
     return comments
 
 @router.post("/", response_model=CommentSchema)
 async def create_comment(
     comment: CommentCreate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     user_id = current_user.id
     db_comment = Comment(**comment.dict(), user_id=user_id)
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    await db.run_sync(adjust_post_counters, comment.post_id, comments=1)
+    await db.commit()
+    await db.refresh(db_comment)
     
     if current_user:
         point_event = PointEvent(
@@ -42,7 +57,7 @@ async def create_comment(
             ref_id=db_comment.id
         )
         db.add(point_event)
-        db.commit()
+        await db.commit()
     
     return db_comment
 
@@ -50,30 +65,31 @@ async def create_comment(
 async def update_comment(
     comment_id: int,
     comment_update: CommentUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+    comment = await db.scalar(select(Comment).where(Comment.id == comment_id))
     if comment is None:
         raise HTTPException(status_code=404, detail="Comment not found")
     
     for field, value in comment_update.dict(exclude_unset=True).items():
         setattr(comment, field, value)
     
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
     return comment
 
 @router.delete("/{comment_id}")
 async def delete_comment(
     comment_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+    comment = await db.scalar(select(Comment).where(Comment.id == comment_id))
     if comment is None:
         raise HTTPException(status_code=404, detail="Comment not found")
     
-    db.delete(comment)
-    db.commit()
+    await db.delete(comment)
+    await db.run_sync(adjust_post_counters, comment.post_id, comments=-1)
+    await db.commit()
     return {"message": "Comment deleted successfully"}
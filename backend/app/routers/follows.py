@@ -1,26 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.database import get_db
-from app.models import User, Follow
+from app.database import get_async_db
+from app.models import User, Follow, MaterializedTimeline
 from app.schemas import Follow as FollowSchema, FollowCreate
-from app.auth import get_current_active_user
+from app.auth import get_current_active_user_async
+from app.jobs import enqueue
+from app.timeline import remove_followee
 
 router = APIRouter(prefix="/api/follows", tags=["follows"])
 
 @router.post("/", response_model=FollowSchema)
 async def create_follow(
     follow: FollowCreate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if follow.followee_user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot follow yourself")
     
-    existing_follow = db.query(Follow).filter(
+    existing_follow = await db.scalar(select(Follow).where(
         Follow.follower_user_id == current_user.id,
         Follow.followee_user_id == follow.followee_user_id
-    ).first()
+    ))
     
     if existing_follow:
         raise HTTPException(status_code=400, detail="Already following this user")
@@ -31,47 +34,50 @@ async def create_follow(
         status="accepted"
     )
     db.add(db_follow)
-    db.commit()
-    db.refresh(db_follow)
+    if await db.scalar(select(MaterializedTimeline.user_id).where(MaterializedTimeline.user_id == current_user.id)):
+        enqueue(db.sync_session, "timeline.follow", {"user_id": current_user.id, "followee_id": follow.followee_user_id})
+    await db.commit()
+    await db.refresh(db_follow)
     
     return db_follow
 
 @router.delete("/{followee_user_id}")
 async def unfollow_user(
     followee_user_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    follow = db.query(Follow).filter(
+    follow = await db.scalar(select(Follow).where(
         Follow.follower_user_id == current_user.id,
         Follow.followee_user_id == followee_user_id
-    ).first()
+    ))
     
     if follow is None:
         raise HTTPException(status_code=404, detail="Follow relationship not found")
     
-    db.delete(follow)
-    db.commit()
+    await db.delete(follow)
+    await db.run_sync(remove_followee, current_user.id, followee_user_id)
+    await db.commit()
     return {"message": "Unfollowed successfully"}
 
 @router.get("/followers", response_model=List[FollowSchema])
 async def get_followers(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    followers = db.query(Follow).filter(
+    followers = (await db.scalars(select(Follow).where(
         Follow.followee_user_id == current_user.id,
         Follow.status == "accepted"
-    ).all()
+    ))).all()
     return followers
 
 @router.get("/following", response_model=List[FollowSchema])
 async def get_following(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    following = db.query(Follow).filter(
+    following = (await db.scalars(select(Follow).where(
         Follow.follower_user_id == current_user.id,
         Follow.status == "accepted"
-    ).all()
+    ))).all()
     return following
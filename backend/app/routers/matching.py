@@ -1,10 +1,15 @@
-from typing import List, Optional, Dict, Set
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
-from sqlalchemy import and_, or_, func, select
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User, MatchingProfile, Hobby, MatchingProfileHobby, MatchingProfileImage, Like, Match, Chat, Message, ChatRequest, ChatRequestMessage
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_, case, func, select
+from sqlalchemy.orm import Session, aliased
+from app.database import SessionLocal, get_db
+from app.models import User, MatchingProfile, Hobby, MatchingProfileHobby, MatchingProfileImage, Like, Match, Chat, Message, ChatRequest, ChatRequestMessage, MediaAsset, MediaDerivative
 from app.auth import get_current_active_user
+from app.pagination import decode_cursor, encode_cursor, keyset_filter
+from app.images import AVATAR_SIZE, thumbnail_urls_by_url
+from app.matching_index import matching_index
+from app.chat_pubsub import QueuedSender, get_chat_broker, message_payload, publish_from_thread
 from jose import jwt, JWTError
 import os
 from datetime import datetime
@@ -18,6 +23,18 @@ def require_premium(current_user: User = Depends(get_current_active_user)) -> Us
     return current_user
 
 
+def _first_image_url(profile_id, *correlate):
+    """Correlated subquery: URL of a profile's first image (lowest display_order)."""
+    return (
+        select(MatchingProfileImage.image_url)
+        .where(MatchingProfileImage.profile_id == profile_id)
+        .order_by(MatchingProfileImage.display_order)
+        .limit(1)
+        .correlate(*correlate)
+        .scalar_subquery()
+    )
+
+
 @router.get("/profiles/me")
 def get_my_profile(current_user: User = Depends(require_premium), db: Session = Depends(get_db)):
     prof = db.query(MatchingProfile).filter(MatchingProfile.user_id == current_user.id).first()
@@ -143,6 +160,8 @@ def update_my_profile(payload: dict, current_user: User = Depends(require_premiu
             for h in existing:
                 db.add(MatchingProfileHobby(profile_id=current_user.id, hobby_id=h.id))
     db.commit()
+    # 趣味の一括削除は ORM イベントに乗らないため明示的に通知する
+    matching_index.invalidate([current_user.id])
     return {"status": "ok"}
 
 
@@ -223,65 +242,37 @@ def search_profiles(
     identity: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=50),
+    facets: bool = Query(False, description="include per-facet value counts"),
     current_user: User = Depends(require_premium),
     db: Session = Depends(get_db),
 ):
-    q = db.query(MatchingProfile, User).join(User, User.id == MatchingProfile.user_id)
-    q = q.filter(MatchingProfile.display_flag == True)
-    q = q.filter(MatchingProfile.user_id != current_user.id)
-    if prefecture:
-        q = q.filter(MatchingProfile.prefecture == prefecture)
-    if age_band:
-        q = q.filter(MatchingProfile.age_band == age_band)
-    if occupation:
-        q = q.filter(MatchingProfile.occupation == occupation)
-    if income_range:
-        q = q.filter(MatchingProfile.income_range == income_range)
-    if meet_pref:
-        q = q.filter(MatchingProfile.meet_pref == meet_pref)
-    if identity:
-        q = q.filter(MatchingProfile.identity == identity)
-    if hobbies:
-        names = [s.strip() for s in hobbies.split(",") if s.strip()]
-        if names:
-            q = (
-                q.join(MatchingProfileHobby, MatchingProfileHobby.profile_id == MatchingProfile.user_id)
-                 .join(Hobby, Hobby.id == MatchingProfileHobby.hobby_id)
-                 .filter(Hobby.name.in_(names))
-            )
-    total = q.count()
-    rows = q.offset((page - 1) * size).limit(size).all()
-    
-    # Get main image for each profile (first image by display_order)
-    user_ids = [prof.user_id for prof, _ in rows]
-    main_images = {}
-    if user_ids:
-        try:
-            subq = (
-                db.query(
-                    MatchingProfileImage.profile_id,
-                    func.min(MatchingProfileImage.display_order).label('min_order')
-                )
-                .filter(MatchingProfileImage.profile_id.in_(user_ids))
-                .group_by(MatchingProfileImage.profile_id)
-                .subquery()
-            )
-            
-            images = (
-                db.query(MatchingProfileImage)
-                .join(
-                    subq,
-                    and_(
-                        MatchingProfileImage.profile_id == subq.c.profile_id,
-                        MatchingProfileImage.display_order == subq.c.min_order
-                    )
-                )
-                .all()
+    filters = {
+        "prefecture": prefecture,
+        "age_band": age_band,
+        "occupation": occupation,
+        "income_range": income_range,
+        "meet_pref": meet_pref,
+        "identity": identity,
+    }
+    names = [s.strip() for s in hobbies.split(",") if s.strip()] if hobbies else None
+    # 絞り込みと件数はインメモリのインデックスで求め、DB はこのページの行だけ読む
+    result = matching_index.search(
+        db, filters, names, exclude=current_user.id, offset=(page - 1) * size, limit=size, facets=facets,
+    )
+    total = result["total"]
+    found = {}
+    if result["user_ids"]:
+        found = {
+            prof.user_id: (prof, user, image_url)
+            for prof, user, image_url in db.execute(
+                select(MatchingProfile, User, _first_image_url(MatchingProfile.user_id, MatchingProfile))
+                .join(User, User.id == MatchingProfile.user_id)
+                .where(MatchingProfile.user_id.in_(result["user_ids"]), MatchingProfile.display_flag == True)
             )
-            
-            main_images = {img.profile_id: img.image_url for img in images}
-        except Exception:
-            pass
+        }
+    rows = [found[user_id][:2] for user_id in result["user_ids"] if user_id in found]
+    main_images = {user_id: image_url for user_id, (_, _, image_url) in found.items() if image_url}
+    avatar_thumbs = thumbnail_urls_by_url(db, main_images.values(), AVATAR_SIZE)
     
     items = [
         {
@@ -292,10 +283,14 @@ def search_profiles(
             "identity": prof.identity,
             "romance_targets": prof.romance_targets or [],
             "avatar_url": main_images.get(prof.user_id) or getattr(prof, 'avatar_url', None) or "",
+            "avatar_thumbnail_url": avatar_thumbs.get(main_images.get(prof.user_id)) or main_images.get(prof.user_id) or getattr(prof, 'avatar_url', None) or "",
         }
         for prof, user in rows
     ]
-    return {"items": items, "page": page, "size": size, "count": total}
+    response = {"items": items, "page": page, "size": size, "count": total}
+    if facets:
+        response["facets"] = result["facets"]
+    return response
 
 
 @router.post("/likes/{to_user_id}", status_code=201)
@@ -327,49 +322,35 @@ def list_likes(
     current_user: User = Depends(require_premium),
     db: Session = Depends(get_db),
 ):
-    """自分が送ったいいね一覧を取得"""
-    likes = (
-        db.query(Like)
+    """自分が送ったいいね一覧を取得（相手のユーザー・プロフィール・先頭画像も1クエリで）"""
+    rows = (
+        db.query(
+            Like.id,
+            Like.to_user_id,
+            User.display_name,
+            MatchingProfile.identity,
+            MatchingProfile.prefecture,
+            MatchingProfile.age_band,
+            _first_image_url(Like.to_user_id, Like).label("avatar_url"),
+        )
+        .select_from(Like)
+        .outerjoin(User, User.id == Like.to_user_id)
+        .outerjoin(MatchingProfile, MatchingProfile.user_id == Like.to_user_id)
         .filter(Like.from_user_id == current_user.id, Like.status == "active")
         .all()
     )
-    items = []
-    for like in likes:
-        other = db.query(User).filter(User.id == like.to_user_id).first()
-        prof = db.query(MatchingProfile).filter(MatchingProfile.user_id == like.to_user_id).first()
-        
-        # プロフィール画像を取得（最初の画像のみ）
-        profile_image = None
-        try:
-            first_image = (
-                db.query(MatchingProfileImage)
-                .filter(MatchingProfileImage.user_id == like.to_user_id)
-                .order_by(MatchingProfileImage.display_order)
-                .first()
-            )
-            if first_image:
-                profile_image = first_image.image_url
-        except Exception as e:
-            # テーブルが存在しない場合やエラーはスキップ
-            print(f"Error fetching profile image: {e}")
-            pass
-        
-        # プロフィール画像がない場合はavatar_urlを使用
-        avatar_url = profile_image or (getattr(prof, 'avatar_url', None) if prof else None)
-        
-        # display_nameを使用
-        display_name = other.display_name if other else f"User {like.to_user_id}"
-        
-        items.append({
-            "like_id": like.id,
-            "user_id": like.to_user_id,
-            "display_name": display_name,
-            "identity": prof.identity if prof else None,
-            "prefecture": prof.prefecture if prof else None,
-            "age_band": prof.age_band if prof else None,
-            "avatar_url": avatar_url,
-        })
-    return {"items": items}
+    return {"items": [
+        {
+            "like_id": row.id,
+            "user_id": row.to_user_id,
+            "display_name": row.display_name or f"User {row.to_user_id}",
+            "identity": row.identity,
+            "prefecture": row.prefecture,
+            "age_band": row.age_band,
+            "avatar_url": row.avatar_url,
+        }
+        for row in rows
+    ]}
 
 
 @router.get("/matches")
@@ -443,53 +424,68 @@ def list_chats(
     current_user: User = Depends(require_premium),
     db: Session = Depends(get_db),
 ):
-    ms = (
-        db.query(Match)
-        .filter(or_(Match.user_a_id == current_user.id, Match.user_b_id == current_user.id))
-        .all()
+    """チャット一覧（受信箱）を1クエリで取得
+
+    最終メッセージ・未読数・相手の先頭画像は相関サブクエリで取得し、
+    messages(chat_id, created_at, id) 等のインデックスで1件ずつ引く。
+    """
+    uid = current_user.id
+    other_id = case((Match.user_a_id == uid, Match.user_b_id), else_=Match.user_a_id)
+    last_message_id = (
+        select(Message.id)
+        .where(Message.chat_id == Chat.id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+        .correlate(Chat)
+        .scalar_subquery()
     )
-    chat_items = []
-    for m in ms:
-        ch = db.query(Chat).filter(Chat.match_id == m.id).first()
-        if not ch:
-            ch = Chat(match_id=m.id)
-            db.add(ch)
-            db.flush()
-        other_id = m.user_b_id if m.user_a_id == current_user.id else m.user_a_id
-        other = db.query(User).filter(User.id == other_id).first()
-        other_profile = db.query(MatchingProfile).filter(MatchingProfile.user_id == other_id).first()
-        last_msg = (
-            db.query(Message).filter(Message.chat_id == ch.id).order_by(Message.created_at.desc()).first()
-        )
-        
-        profile_images = (
-            db.query(MatchingProfileImage)
-            .filter(MatchingProfileImage.profile_id == other_id)
-            .order_by(MatchingProfileImage.display_order)
-            .all()
-        )
-        avatar_url = profile_images[0].image_url if profile_images else None
-        
-        # display_nameを使用
-        display_name = other.display_name if other else f"User {other_id}"
-        
-        # 未読メッセージ数を計算
-        unread_count = (
-            db.query(Message)
-            .filter(Message.chat_id == ch.id, Message.sender_id == other_id, Message.read_at == None)
-            .count()
+    unread_count = (
+        select(func.count(Message.id))
+        .where(Message.chat_id == Chat.id, Message.sender_id == other_id, Message.read_at.is_(None))
+        .correlate(Chat, Match)
+        .scalar_subquery()
+    )
+    avatar_url = _first_image_url(other_id, Match)
+    avatar_thumbnail_url = (
+        select(MediaDerivative.url)
+        .join(MediaAsset, MediaAsset.id == MediaDerivative.media_asset_id)
+        .where(MediaAsset.url == avatar_url, MediaDerivative.size == AVATAR_SIZE)
+        .limit(1)
+        .scalar_subquery()
+    )
+    last_msg = aliased(Message)
+    rows = (
+        db.query(
+            Chat.id.label("chat_id"),
+            other_id.label("other_id"),
+            User.display_name,
+            avatar_url.label("avatar_url"),
+            avatar_thumbnail_url.label("avatar_thumbnail_url"),
+            last_msg.body.label("last_body"),
+            last_msg.created_at.label("last_at"),
+            unread_count.label("unread_count"),
         )
-        
-        chat_items.append({
-            "chat_id": ch.id,
-            "with_user_id": other_id,
-            "with_display_name": display_name,
-            "with_avatar_url": avatar_url,
-            "last_message": last_msg.body if last_msg else None,
-            "last_message_at": last_msg.created_at.isoformat() if last_msg and last_msg.created_at else None,
-            "unread_count": unread_count,
-        })
-    return {"items": chat_items}
+        .select_from(Match)
+        .join(Chat, Chat.match_id == Match.id)
+        .outerjoin(User, User.id == other_id)
+        .outerjoin(last_msg, last_msg.id == last_message_id)
+        .filter(or_(Match.user_a_id == uid, Match.user_b_id == uid))
+        .order_by(func.coalesce(last_msg.created_at, Chat.created_at).desc(), Chat.id.desc())
+        .all()
+    )
+    return {"items": [
+        {
+            "chat_id": row.chat_id,
+            "with_user_id": row.other_id,
+            "with_display_name": row.display_name or f"User {row.other_id}",
+            "with_avatar_url": row.avatar_url,
+            "with_avatar_thumbnail_url": row.avatar_thumbnail_url or row.avatar_url,
+            "last_message": row.last_body,
+            "last_message_at": row.last_at.isoformat() if row.last_at else None,
+            "unread_count": row.unread_count or 0,
+        }
+        for row in rows
+    ]}
 
 
 def _ensure_chat_access(chat_id: int, user_id: int, db: Session) -> Chat:
@@ -502,24 +498,72 @@ def _ensure_chat_access(chat_id: int, user_id: int, db: Session) -> Chat:
     return ch
 
 
+MESSAGES_PAGE_SIZE = 50
+
+
+def _message_cursor(m: Message) -> str:
+    return encode_cursor("messages", [m.created_at, m.id])
+
+
 @router.get("/chats/{chat_id}/messages")
 def get_messages(
     chat_id: int,
+    before: Optional[str] = Query(None, description="cursor: older messages than this"),
+    after: Optional[str] = Query(None, description="cursor: newer messages than this"),
+    since_id: Optional[int] = Query(None, description="messages with id greater than this (reconnect delta)"),
+    cursor: Optional[str] = Query(None, description="alias of after"),
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=200),
     current_user: User = Depends(require_premium),
     db: Session = Depends(get_db),
 ):
+    """メッセージ履歴（古い順）。
+
+    指定なしでは最新 ``limit`` 件（末尾）を返す。``before`` で過去方向、
+    ``after`` / ``since_id`` で再接続時の差分を取得する。
+    """
     ch = _ensure_chat_access(chat_id, current_user.id, db)
-    msgs = db.query(Message).filter(Message.chat_id == ch.id).order_by(Message.created_at.asc()).all()
-    return {"items": [
-        {
-            "id": m.id,
-            "chat_id": m.chat_id,
-            "sender_id": m.sender_id,
-            "body": m.body,
-            "image_url": None,
-            "created_at": m.created_at.isoformat() if m.created_at else None
-        } for m in msgs
-    ]}
+    keys = [Message.created_at, Message.id]
+    dialect_name = db.get_bind().dialect.name
+    after = after or cursor
+    q = db.query(Message).filter(Message.chat_id == ch.id)
+
+    if after or since_id is not None:
+        # 新しい方向: 古い順に limit+1 件
+        if after:
+            q = q.filter(keyset_filter(keys, decode_cursor(after, "messages", 2), descending=False, dialect_name=dialect_name))
+        if since_id is not None:
+            q = q.filter(Message.id > since_id)
+        msgs = q.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit + 1).all()
+        has_newer = len(msgs) > limit
+        msgs = msgs[:limit]
+        has_older = None
+    else:
+        # 末尾 / 過去方向: 新しい順に limit+1 件取得して反転
+        if before:
+            q = q.filter(keyset_filter(keys, decode_cursor(before, "messages", 2), descending=True, dialect_name=dialect_name))
+        msgs = q.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+        has_older = len(msgs) > limit
+        msgs = list(reversed(msgs[:limit]))
+        has_newer = bool(before)
+
+    last_id = max([m.id for m in msgs], default=since_id)
+    return {
+        "items": [
+            {
+                "id": m.id,
+                "chat_id": m.chat_id,
+                "sender_id": m.sender_id,
+                "body": m.body,
+                "image_url": None,
+                "created_at": m.created_at.isoformat() if m.created_at else None
+            } for m in msgs
+        ],
+        # 過去を読む: ?before=prev_cursor / 続きを読む: ?after=next_cursor
+        "prev_cursor": _message_cursor(msgs[0]) if msgs and has_older is not False else None,
+        "next_cursor": _message_cursor(msgs[-1]) if msgs and has_newer else None,
+        "has_more": has_newer if has_older is None else has_older,
+        "last_id": last_id,
+    }
 
 
 @router.post("/chats/{chat_id}/messages", status_code=201)
@@ -541,6 +585,7 @@ def send_message(
     db.add(msg)
     db.commit()
     db.refresh(msg)
+    publish_from_thread(ch.id, message_payload(msg))
     return {
         "id": msg.id,
         "chat_id": msg.chat_id,
@@ -551,10 +596,9 @@ def send_message(
     }
 
 
-# ===== WebSocket (simple in-process pub/sub) =====
+# ===== WebSocket (fan-out via app.chat_pubsub) =====
 WS_SECRET = os.getenv("SECRET_KEY", "your-secret-key-here")
 WS_ALG = os.getenv("ALGORITHM", "HS256")
-chat_connections: Dict[int, Set[WebSocket]] = {}
 
 
 @router.websocket("/ws/matching/chat")
@@ -583,20 +627,25 @@ async def ws_chat(websocket: WebSocket):
         await websocket.close(code=1008)
         return
 
-    # Authz: user has access to chat
-    with next(get_db()) as db:
-        user: User = db.query(User).filter(User.email == email).first()
-        if not user:
-            await websocket.close(code=1008)
-            return
-        try:
-            _ensure_chat_access(chat_id, user.id, db)
-        except HTTPException:
-            await websocket.close(code=1008)
-            return
+    # Authz: user has access to chat（同期 DB アクセスはスレッドプールで実行）
+    user_id = await run_in_threadpool(_ws_authorize, email, chat_id)
+    if user_id is None:
+        await websocket.close(code=1008)
+        return
 
     await websocket.accept()
-    chat_connections.setdefault(chat_id, set()).add(websocket)
+    broker = get_chat_broker()
+
+    async def drop_slow_consumer() -> None:
+        # 1013: Try Again Later
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    outbox = QueuedSender(websocket.send_json, on_drop=drop_slow_consumer)
+    outbox.start()
+    broker.subscribe(chat_id, outbox)
 
     try:
         while True:
@@ -604,37 +653,42 @@ async def ws_chat(websocket: WebSocket):
             body = str(data.get("body", "")).strip()
             if not body:
                 continue
-            # Persist message
-            with next(get_db()) as db:
-                ch = _ensure_chat_access(chat_id, user.id, db)
-                msg = Message(chat_id=chat_id, sender_id=user.id, body=body)
-                db.add(msg)
-                db.commit()
-                db.refresh(msg)
-                payload = {
-                    "id": msg.id,
-                    "chat_id": msg.chat_id,
-                    "sender_id": msg.sender_id,
-                    "body": msg.body,
-                    "created_at": msg.created_at.isoformat() if hasattr(msg.created_at, 'isoformat') else str(msg.created_at),
-                }
-            # Broadcast to all connections in this chat
-            living: Set[WebSocket] = set()
-            for ws in chat_connections.get(chat_id, set()):
-                try:
-                    await ws.send_json(payload)
-                    living.add(ws)
-                except Exception:
-                    # drop dead connection
-                    pass
-            chat_connections[chat_id] = living
+            payload = await run_in_threadpool(_ws_persist_message, chat_id, user_id, body)
+            if payload is None:
+                await websocket.close(code=1008)
+                break
+            # Broadcast to all connections in this chat (all processes)
+            await broker.publish(chat_id, payload)
     except WebSocketDisconnect:
         pass
     finally:
+        broker.unsubscribe(chat_id, outbox)
+        await outbox.close()
+
+
+def _ws_authorize(email: str, chat_id: int) -> Optional[int]:
+    with SessionLocal() as db:
+        user = db.query(User.id).filter(User.email == email).first()
+        if not user:
+            return None
         try:
-            chat_connections.get(chat_id, set()).discard(websocket)
-        except Exception:
-            pass
+            _ensure_chat_access(chat_id, user.id, db)
+        except HTTPException:
+            return None
+        return user.id
+
+
+def _ws_persist_message(chat_id: int, user_id: int, body: str) -> Optional[dict]:
+    with SessionLocal() as db:
+        try:
+            _ensure_chat_access(chat_id, user_id, db)
+        except HTTPException:
+            return None
+        msg = Message(chat_id=chat_id, sender_id=user_id, body=body)
+        db.add(msg)
+        db.commit()
+        db.refresh(msg)
+        return message_payload(msg)
 
 
 # ===== プロフィール画像管理 =====
@@ -778,45 +832,47 @@ def send_chat_request(
     return {"request_id": request.id, "status": "pending", "message": "Chat request sent"}
 
 
+def _chat_request_rows(db: Session, other_user_id):
+    """ChatRequest rows joined with the other party's name, profile fields and first image."""
+    return (
+        db.query(
+            ChatRequest,
+            User.display_name,
+            MatchingProfile.nickname,
+            MatchingProfile.identity,
+            MatchingProfile.prefecture,
+            MatchingProfile.age_band,
+            _first_image_url(other_user_id, ChatRequest),
+        )
+        .outerjoin(User, User.id == other_user_id)
+        .outerjoin(MatchingProfile, MatchingProfile.user_id == other_user_id)
+    )
+
+
 @router.get("/chat_requests/incoming")
 def list_incoming_chat_requests(
     current_user: User = Depends(require_premium),
     db: Session = Depends(get_db),
 ):
     """受信したチャットリクエスト一覧"""
-    requests = (
-        db.query(ChatRequest)
-        .filter(ChatRequest.to_user_id == current_user.id, ChatRequest.status == "pending")
-        .all()
-    )
-    
-    items = []
-    for req in requests:
-        from_user = db.query(User).filter(User.id == req.from_user_id).first()
-        profile = db.query(MatchingProfile).filter(MatchingProfile.user_id == req.from_user_id).first()
-        
-        images = (
-            db.query(MatchingProfileImage)
-            .filter(MatchingProfileImage.profile_id == req.from_user_id)
-            .order_by(MatchingProfileImage.display_order)
-            .all()
-        )
-        avatar_url = images[0].image_url if images else None
-        
-        items.append({
+    rows = _chat_request_rows(db, ChatRequest.from_user_id).filter(
+        ChatRequest.to_user_id == current_user.id, ChatRequest.status == "pending"
+    ).all()
+    return {"items": [
+        {
             "request_id": req.id,
             "from_user_id": req.from_user_id,
-            "from_display_name": (profile.nickname if (profile and profile.nickname) else (from_user.display_name if from_user else f"User {req.from_user_id}")),
+            "from_display_name": nickname or display_name or f"User {req.from_user_id}",
 
             "from_avatar_url": avatar_url,
-            "identity": profile.identity if profile else None,
-            "prefecture": profile.prefecture if profile else None,
-            "age_band": profile.age_band if profile else None,
+            "identity": identity,
+            "prefecture": prefecture,
+            "age_band": age_band,
             "initial_message": req.initial_message,
             "created_at": req.created_at.isoformat() if req.created_at else None,
-        })
-    
-    return {"items": items}
+        }
+        for req, display_name, nickname, identity, prefecture, age_band, avatar_url in rows
+    ]}
 
 
 @router.get("/chat_requests/outgoing")
@@ -825,46 +881,30 @@ def list_outgoing_chat_requests(
     db: Session = Depends(get_db),
 ):
     """送信したチャットリクエスト一覧（pending のみ）"""
-    requests = (
-        db.query(ChatRequest)
-        .filter(
-            ChatRequest.from_user_id == current_user.id,
-            ChatRequest.status == "pending"
-        )
+    rows = (
+        _chat_request_rows(db, ChatRequest.to_user_id)
+        .filter(ChatRequest.from_user_id == current_user.id, ChatRequest.status == "pending")
         .order_by(ChatRequest.created_at.desc())
         .all()
     )
-    
-    items = []
-    for req in requests:
-        to_user = db.query(User).filter(User.id == req.to_user_id).first()
-        profile = db.query(MatchingProfile).filter(MatchingProfile.user_id == req.to_user_id).first()
-        
-        images = (
-            db.query(MatchingProfileImage)
-            .filter(MatchingProfileImage.profile_id == req.to_user_id)
-            .order_by(MatchingProfileImage.display_order)
-            .all()
-        )
-        avatar_url = images[0].image_url if images else None
-        
-        items.append({
+    return {"items": [
+        {
             "request_id": req.id,
             "from_user_id": req.from_user_id,
             "to_user_id": req.to_user_id,
-            "to_display_name": (profile.nickname if (profile and profile.nickname) else (to_user.display_name if to_user else f"User {req.to_user_id}")),
+            "to_display_name": nickname or display_name or f"User {req.to_user_id}",
 
             "to_avatar_url": avatar_url,
-            "identity": profile.identity if profile else None,
-            "prefecture": profile.prefecture if profile else None,
-            "age_band": profile.age_band if profile else None,
+            "identity": identity,
+            "prefecture": prefecture,
+            "age_band": age_band,
             "initial_message": req.initial_message,
             "status": req.status,
             "created_at": req.created_at.isoformat() if req.created_at else None,
             "responded_at": req.responded_at.isoformat() if req.responded_at else None,
-        })
-    
-    return {"items": items}
+        }
+        for req, display_name, nickname, identity, prefecture, age_band, avatar_url in rows
+    ]}
 
 
 @router.post("/chat_requests/{request_id}/accept")
@@ -1,43 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from fastapi import Body
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User, MediaAsset
+from app.models import User, MediaAsset, MediaDerivative
 from app.auth import get_current_active_user
-import os
+from app.storage import MEDIA_DIR, USE_S3, put_fileobj
+from app.images import THUMBNAIL_SIZE, generate_derivatives, nearest_size
+from app.jobs import enqueue
+import hashlib
+import logging
 import uuid
-from pathlib import Path
 import json
-import boto3
 from botocore.exceptions import ClientError
 
 router = APIRouter(prefix="/api/media", tags=["media"])
+logger = logging.getLogger(__name__)
 
-# S3設定
-S3_BUCKET = os.getenv("AWS_S3_BUCKET", "rainbow-community-media-prod")
-S3_REGION = os.getenv("AWS_REGION", "ap-northeast-1")
-USE_S3 = os.getenv("USE_S3", "true").lower() == "true"
-
-# S3クライアント初期化
-if USE_S3:
-    s3_client = boto3.client(
-        's3',
-        region_name=S3_REGION,
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-    )
-else:
-    s3_client = None
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 256 * 1024
 
-# ローカルストレージ（フォールバック）
-media_base = os.getenv("MEDIA_DIR")
-if not media_base:
-    media_base = "/data/media" if os.path.exists("/data") else "media"
-MEDIA_DIR = Path(media_base)
-MEDIA_DIR.mkdir(parents=True, exist_ok=True)
 
+# ハッシュ計算・S3 書き込み・DB 操作はすべてブロッキングなので、同期関数にしてスレッドプールで実行する
 @router.post("/upload")
-async def upload_image(
+def upload_image(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -47,47 +33,79 @@ async def upload_image(
     if not file.content_type or file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="Only JPEG, PNG, and WEBP images are allowed")
 
-    # Read content to determine size (UploadFile has no .size attribute)
-    content = await file.read()
-    max_bytes = 10 * 1024 * 1024  # 10MB
-    if len(content) > max_bytes:
+    # マルチパートの本体は Starlette が一時ファイルに退避済み。サイズが分かれば読む前に弾く
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
         raise HTTPException(status_code=400, detail="File too large")
 
+    # 固定サイズのチャンクで読みながらサイズ確認と sha256 計算（全体をメモリに載せない）
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=400, detail="File too large")
+        digest.update(chunk)
+    file.file.seek(0)
+
     file_extension = file.filename.split('.')[-1] if file.filename and '.' in file.filename else 'jpg'
     unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    
-    if USE_S3 and s3_client:
-        # S3にアップロード
-        try:
-            s3_key = f"media/{unique_filename}"
-            s3_client.put_object(
-                Bucket=S3_BUCKET,
-                Key=s3_key,
-                Body=content,
-                ContentType=file.content_type or "application/octet-stream"
-            )
-            # S3のURL
-            url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{s3_key}"
-        except ClientError as e:
-            raise HTTPException(status_code=500, detail=f"S3 upload failed: {str(e)}")
-    else:
-        # ローカルファイルシステムにフォールバック
-        file_path = MEDIA_DIR / unique_filename
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
-        url = f"/media/{unique_filename}"
+    content_type = file.content_type or "application/octet-stream"
+
+    try:
+        url = put_fileobj(file.file, f"media/{unique_filename}", content_type)
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"S3 upload failed: {str(e)}")
 
     media_asset = MediaAsset(
         user_id=current_user.id,
         url=url,
-        mime_type=file.content_type or "application/octet-stream",
-        size_bytes=len(content)
+        mime_type=content_type,
+        size_bytes=size,
+        sha256=digest.hexdigest(),
     )
     db.add(media_asset)
+    db.flush()
+    # サムネイル（WebP）はレスポンス後にジョブで生成する
+    enqueue(db, "media.generate_derivatives", {"media_id": media_asset.id})
     db.commit()
     db.refresh(media_asset)
     
-    return {"id": media_asset.id, "url": media_asset.url}
+    return {"id": media_asset.id, "url": media_asset.url, "sha256": media_asset.sha256}
+
+
+@router.get("/{media_id}/thumbnail")
+def get_thumbnail(
+    media_id: int,
+    size: int = Query(THUMBNAIL_SIZE, ge=1, le=4096),
+    db: Session = Depends(get_db)
+):
+    """Redirect to the WebP derivative closest to ``size``, generating it on first request.
+
+    Falls back to the original when no derivative can be produced.
+    """
+    size = nearest_size(size)
+    derivative = (
+        db.query(MediaDerivative)
+        .filter(MediaDerivative.media_asset_id == media_id, MediaDerivative.size == size)
+        .first()
+    )
+    if derivative is None:
+        asset = db.query(MediaAsset).filter(MediaAsset.id == media_id).first()
+        if not asset:
+            raise HTTPException(status_code=404, detail="Media not found")
+        try:
+            created = generate_derivatives(db, asset)
+        except Exception:
+            logger.exception("Derivative generation failed for media %s", media_id)
+            db.rollback()
+            created = []
+        derivative = next((d for d in created if d.size == size), None)
+        if derivative is None:
+            return RedirectResponse(url=asset.url, status_code=307)
+    return RedirectResponse(url=derivative.url, status_code=307)
 
 
 @router.get("/user/images")
@@ -145,19 +163,11 @@ def delete_media(
     if asset.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
     
-    # S3またはローカルから削除
-    if USE_S3 and s3_client and asset.url.startswith('https://'):
-        # S3から削除
-        try:
-            s3_key = asset.url.split(f"{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/")[1]
-            s3_client.delete_object(Bucket=S3_BUCKET, Key=s3_key)
-        except Exception as e:
-            print(f"S3 delete failed: {e}")
-    else:
-        # ローカルファイルから削除
-        file_path = MEDIA_DIR / asset.url.split('/')[-1]
-        if file_path.exists():
-            file_path.unlink()
+    # S3またはローカルのファイル削除（派生画像も）はレスポンス後にジョブで行う
+    derivatives = db.query(MediaDerivative).filter(MediaDerivative.media_asset_id == asset.id).all()
+    enqueue(db, "storage.delete_urls", {"urls": [asset.url] + [d.url for d in derivatives]})
+    for derivative in derivatives:
+        db.delete(derivative)
     
     db.delete(asset)
     db.commit()
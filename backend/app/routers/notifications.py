@@ -1,37 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
+from typing import List, Optional
+from app.database import get_async_db
 from app.models import User, Notification
 from app.schemas import Notification as NotificationSchema, NotificationUpdate
-from app.auth import get_current_active_user
+from app.auth import get_current_active_user_async
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, keyset_filter, next_cursor
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
 @router.get("/", response_model=List[NotificationSchema])
 async def read_notifications(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    notifications = db.query(Notification).filter(
-        Notification.user_id == current_user.id
-    ).order_by(desc(Notification.created_at)).offset(skip).limit(limit).all()
+    stmt = select(Notification).where(Notification.user_id == current_user.id)
+    if cursor:
+        values = decode_cursor(cursor, "notifications", 2)
+        stmt = stmt.where(
+            keyset_filter([Notification.created_at, Notification.id], values, dialect_name=db.get_bind().dialect.name)
+        )
+    stmt = stmt.order_by(desc(Notification.created_at), desc(Notification.id))
+    if not cursor:
+        stmt = stmt.offset(skip)
+    notifications = (await db.scalars(stmt.limit(limit))).all()
+    following = next_cursor(notifications, limit, "notifications", lambda n: [n.created_at, n.id])
+    if following:
+        response.headers[NEXT_CURSOR_HEADER] = following
     return notifications
 
 @router.put("/{notification_id}", response_model=NotificationSchema)
 async def update_notification(
     notification_id: int,
     notification_update: NotificationUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    notification = db.query(Notification).filter(
+    notification = await db.scalar(select(Notification).where(
         Notification.id == notification_id,
         Notification.user_id == current_user.id
-    ).first()
+    ))
     
     if notification is None:
         raise HTTPException(status_code=404, detail="Notification not found")
@@ -39,6 +52,6 @@ async def update_notification(
     for field, value in notification_update.dict(exclude_unset=True).items():
         setattr(notification, field, value)
     
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
     return notification
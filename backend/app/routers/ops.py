@@ -1,13 +1,25 @@
 from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User, Profile, MatchingProfile, MatchingProfileImage, Post, MediaAsset
-from sqlalchemy import text
+from app.database import get_db, pool_stats
+from app.models import User, Profile, MatchingProfile, MatchingProfileImage, Post, MediaAsset, TimelineEntry, MaterializedTimeline
+from sqlalchemy import or_, text
+from app.metrics import metrics
+from app.auth import clear_user_cache
+from app.matching_index import matching_index
 import os
 
 router = APIRouter(prefix="/api/ops", tags=["ops"])
 
 
+@router.get("/metrics")
+def read_metrics(x_admin_secret: str | None = Header(default=None, alias="X-Admin-Secret")):
+    """プロセス内メトリクス（パスワードハッシュ・DBプールの待ち時間など）"""
+    admin_secret = os.getenv("ADMIN_SECRET")
+    if not admin_secret or x_admin_secret != admin_secret:
+        raise HTTPException(status_code=401, detail="unauthorized")
+    return {"db_pool": pool_stats(), **metrics.snapshot()}
+
+
 @router.post("/run_migration")
 def run_migration(
     db: Session = Depends(get_db),
@@ -114,22 +126,33 @@ def cleanup_test_data(
             Profile.user_id.in_(user_ids_to_delete)
         ).delete(synchronize_session=False)
         
-        # 4. 投稿
+        # 4. タイムライン
+        db.query(TimelineEntry).filter(or_(
+            TimelineEntry.user_id.in_(user_ids_to_delete),
+            TimelineEntry.author_id.in_(user_ids_to_delete),
+        )).delete(synchronize_session=False)
+        db.query(MaterializedTimeline).filter(
+            MaterializedTimeline.user_id.in_(user_ids_to_delete)
+        ).delete(synchronize_session=False)
+        
+        # 5. 投稿
         deleted_posts = db.query(Post).filter(
             Post.user_id.in_(user_ids_to_delete)
         ).delete(synchronize_session=False)
         
-        # 5. メディアアセット
+        # 6. メディアアセット
         db.query(MediaAsset).filter(
             MediaAsset.user_id.in_(user_ids_to_delete)
         ).delete(synchronize_session=False)
         
-        # 6. ユーザー
+        # 7. ユーザー
         db.query(User).filter(
             User.id.in_(user_ids_to_delete)
         ).delete(synchronize_session=False)
         
         db.commit()
+        clear_user_cache()
+        matching_index.clear()
     
     # 残っているユーザーを取得
     remaining_users = db.query(User).all()
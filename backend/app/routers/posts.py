@@ -1,27 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 import logging
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import html
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import delete, desc, func, select
 from typing import List, Optional
 from datetime import datetime, timedelta
-from app.database import get_db
-from app.models import User, Post, PointEvent, Reaction, Tag, PostTag, MediaAsset, PostMedia, PostTourism, Comment
+from app.database import get_async_db
+from app.models import User, Post, PointEvent, Reaction, Tag, PostTag, MediaAsset, PostMedia, PostTourism, Comment, TimelineEntry
 from app.schemas import Post as PostSchema, PostCreate, PostUpdate
+from app.feed import hydrate_posts
+from app.comment_tree import REPLY_CURSOR_KIND, THREAD_CURSOR_KIND, comment_threads
+from app.jobs import enqueue
+from app.counters import adjust_post_counters
+from app.likes import add_post_like, current_like_count, like_states, remove_post_like
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, keyset_filter, next_cursor
+from app.timeline import STRATEGIES as TIMELINE_STRATEGIES, TIMELINE_CURSOR_KIND, VISIBLE_TO_FOLLOWERS, timeline_page
 import re
-from app.auth import get_current_active_user, get_current_premium_user
+from app.auth import get_current_active_user_async, get_current_premium_user_async, get_optional_user_async
 
 router = APIRouter(prefix="/api/posts", tags=["posts"], redirect_slashes=False)
 
 limiter = Limiter(key_func=get_remote_address)
 
 
+async def _load_post(db: AsyncSession, post_id: int) -> Post:
+    # レスポンスで参照する関連を先に読み込む（AsyncSession では遅延ロードできない）
+    return await db.scalar(
+        select(Post)
+        .options(selectinload(Post.tourism_details))
+        .where(Post.id == post_id)
+        .execution_options(populate_existing=True)
+    )
+
+
 @router.get("", response_model=List[PostSchema])
 @router.get("/", response_model=List[PostSchema])
 async def read_posts(
+    response: Response,
     page: int = 1,
     limit: int = 20,
     visibility: Optional[str] = None,
@@ -34,24 +53,25 @@ async def read_posts(
     sort: str = "newest",
     range: str = "all",
     tag: Optional[str] = None,
-    current_user: Optional[User] = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Optional[User] = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(Post).options(joinedload(Post.user))
+    query = select(Post).options(joinedload(Post.user))
     
     if visibility:
-        query = query.filter(Post.visibility == visibility)
+        query = query.where(Post.visibility == visibility)
     else:
-        query = query.filter(Post.visibility == "public")
+        query = query.where(Post.visibility == "public")
     
     if post_type:
-        query = query.filter(Post.post_type == post_type)
+        query = query.where(Post.post_type == post_type)
     
     if status:
-        query = query.filter(Post.status == status)
+        query = query.where(Post.status == status)
     
     if slug:
-        query = query.filter(Post.slug == slug)
+        query = query.where(Post.slug == slug)
     
     # Support category via name or category_id (mapped to hashtag)
     cat_value = category
@@ -59,134 +79,102 @@ async def read_posts(
         cat_value = category_id
     if cat_value:
         # Filter by category field directly instead of hashtag in body
-        query = query.filter(Post.category == cat_value)
+        query = query.where(Post.category == cat_value)
     
     if subcategory:
-        query = query.filter(Post.subcategory == subcategory)
+        query = query.where(Post.subcategory == subcategory)
     
     if range != "all":
         now = datetime.utcnow()
         if range == "24h":
-            query = query.filter(Post.created_at >= now - timedelta(hours=24))
+            query = query.where(Post.created_at >= now - timedelta(hours=24))
         elif range == "7d":
-            query = query.filter(Post.created_at >= now - timedelta(days=7))
+            query = query.where(Post.created_at >= now - timedelta(days=7))
         elif range == "30d":
-            query = query.filter(Post.created_at >= now - timedelta(days=30))
+            query = query.where(Post.created_at >= now - timedelta(days=30))
     
-    if sort == "newest":
-        query = query.order_by(desc(Post.created_at))
-    elif sort == "popular":
-        query = query.order_by(desc(Post.created_at))
+    if sort == "popular":
+        # 反応数と新しさを合成したスコア（app.counters.hot_score）
+        sort_columns = [Post.hot_score, Post.id]
     elif sort == "comments":
-        query = query.order_by(desc(Post.created_at))
+        sort_columns = [Post.comment_count, Post.created_at, Post.id]
     elif sort == "points":
-        query = query.order_by(desc(Post.created_at))
+        # 1いいね = 1カラット
+        sort_columns = [Post.like_count, Post.created_at, Post.id]
     else:
-        query = query.order_by(desc(Post.created_at))
+        sort = "newest"
+        sort_columns = [Post.created_at, Post.id]
+    cursor_kind = f"posts:{sort}"
+    
+    if cursor:
+        values = decode_cursor(cursor, cursor_kind, len(sort_columns))
+        query = query.where(keyset_filter(sort_columns, values, dialect_name=db.get_bind().dialect.name))
+    query = query.order_by(*[desc(column) for column in sort_columns])
     
     page = max(1, page)
     limit = max(1, min(100, limit))
-    offset = (page - 1) * limit
-    posts = query.offset(offset).limit(limit).all()
+    if not cursor:
+        query = query.offset((page - 1) * limit)
+    posts = (await db.scalars(query.limit(limit))).all()
     
-    result = []
-    for post in posts:
-        # カラット数（いいね数）を計算
-        try:
-            like_count = db.query(Reaction).filter(
-                Reaction.target_type == "post",
-                Reaction.target_id == post.id,
-                Reaction.reaction_type == "like"
-            ).count()
-        except Exception as e:
-            print(f"Error counting likes for post {post.id}: {e}")
-            like_count = 0
-        
-        is_liked = False
-        if current_user:
-            try:
-                is_liked = db.query(Reaction).filter(
-                    Reaction.user_id == current_user.id,
-                    Reaction.target_type == "post",
-                    Reaction.target_id == post.id,
-                    Reaction.reaction_type == "like"
-                ).first() is not None
-            except Exception as e:
-                print(f"Error checking like status for post {post.id}: {e}")
-                is_liked = False
-        
-        # コメント数を計算
-        try:
-            comment_count = db.query(Comment).filter(Comment.post_id == post.id).count()
-        except Exception as e:
-            print(f"Error counting comments for post {post.id}: {e}")
-            comment_count = 0
-        
-        post_dict = {
-            "id": post.id,
-            "user_id": post.user_id,
-            "user_display_name": post.user.display_name if getattr(post, "user", None) else None,
-            "title": post.title,
-            "body": post.body,
-            "visibility": post.visibility,
-            "youtube_url": post.youtube_url,
-            "media_id": post.media_id,
-            "media_url": None,
-            "media_urls": [],
-            "category": post.category,
-            "subcategory": post.subcategory,
-            "post_type": post.post_type,
-            "slug": post.slug,
-            "status": post.status,
-            "og_image_url": post.og_image_url,
-            "excerpt": post.excerpt,
-            "tourism_details": None,
-            "created_at": post.created_at,
-            "updated_at": post.updated_at,
-            "like_count": like_count,
-            "is_liked": is_liked,
-            "comment_count": comment_count
-        }
-        if post.media_id:
-            media = db.query(MediaAsset).filter(MediaAsset.id == post.media_id).first()
-            if media:
-                post_dict["media_url"] = media.url
-        
-        post_media_records = db.query(PostMedia).filter(PostMedia.post_id == post.id).order_by(PostMedia.order_index).all()
-        if post_media_records:
-            media_urls = []
-            for pm in post_media_records:
-                media = db.query(MediaAsset).filter(MediaAsset.id == pm.media_asset_id).first()
-                if media:
-                    media_urls.append(media.url)
-            post_dict["media_urls"] = media_urls
-        
-        if post.post_type == 'tourism':
-            tourism = db.query(PostTourism).filter(PostTourism.post_id == post.id).first()
-            if tourism:
-                post_dict["tourism_details"] = {
-                    "prefecture": tourism.prefecture,
-                    "event_datetime": tourism.event_datetime,
-                    "meet_place": tourism.meet_place,
-                    "meet_address": tourism.meet_address,
-                    "tour_content": tourism.tour_content,
-                    "fee": tourism.fee,
-                    "contact_phone": tourism.contact_phone,
-                    "contact_email": tourism.contact_email,
-                    "deadline": tourism.deadline,
-                    "attachment_pdf_url": tourism.attachment_pdf_url
-                }
-        
-        result.append(post_dict)
+    following = next_cursor(posts, limit, cursor_kind, lambda p: [getattr(p, c.key) for c in sort_columns])
+    if following:
+        response.headers[NEXT_CURSOR_HEADER] = following
     
-    return result
+    return await db.run_sync(hydrate_posts, posts, current_user.id if current_user else None)
+
+LIKE_STATE_MAX_IDS = 300
+
+# /{post_id} より先に登録する
+@router.get("/likes/state")
+async def read_like_states(
+    ids: str = Query(..., description="comma separated post ids"),
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Like state and like count of each post in ``ids`` for the current user.
+
+    Ids that do not exist are left out; the order of ``ids`` is kept.
+    """
+    try:
+        post_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma separated integers")
+    if len(post_ids) > LIKE_STATE_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"at most {LIKE_STATE_MAX_IDS} ids")
+    return {"items": await db.run_sync(like_states, current_user.id, post_ids)}
+
+@router.get("/timeline", response_model=List[PostSchema])
+async def read_timeline(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    strategy: Optional[str] = Query(None, description="auto, merge or fanout; defaults to TIMELINE_STRATEGY"),
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Posts from the users the current user follows, newest first (see ``app.timeline``).
+
+    Page with the ``X-Next-Cursor`` header; ``X-Timeline-Strategy`` says
+    whether the page was merged from the followees' posts or read from the
+    materialized timeline.
+    """
+    if strategy is not None and strategy not in TIMELINE_STRATEGIES:
+        raise HTTPException(status_code=422, detail=f"strategy must be one of {', '.join(TIMELINE_STRATEGIES)}")
+    after = decode_cursor(cursor, TIMELINE_CURSOR_KIND, 2) if cursor else None
+    used, keys, posts = await db.run_sync(timeline_page, current_user.id, limit, after, strategy)
+    following = next_cursor(keys, limit, TIMELINE_CURSOR_KIND, list)
+    if following:
+        response.headers[NEXT_CURSOR_HEADER] = following
+    response.headers["X-Timeline-Strategy"] = used
+    return posts
 
 @router.post("", response_model=PostSchema)
 @router.post("/", response_model=PostSchema)
 async def create_post(
     post: PostCreate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     post_data = post.dict(exclude={'media_ids', 'tourism_details'})
     
@@ -195,14 +183,14 @@ async def create_post(
         base_slug = re.sub(r'[-\s]+', '-', base_slug).strip('-')
         slug = base_slug
         counter = 1
-        while db.query(Post).filter(Post.slug == slug).first():
+        while await db.scalar(select(Post.id).where(Post.slug == slug)):
             slug = f"{base_slug}-{counter}"
             counter += 1
         post_data['slug'] = slug
     
     db_post = Post(**post_data, user_id=current_user.id)
     db.add(db_post)
-    db.flush()
+    await db.flush()
     
     if post.media_ids:
         for idx, media_id in enumerate(post.media_ids[:5]):
@@ -226,89 +214,47 @@ async def create_post(
         ref_id=db_post.id
     )
     db.add(point_event)
-    db.commit()
-    db.refresh(db_post)
-    return db_post
+    if db_post.status == "published" and db_post.visibility in VISIBLE_TO_FOLLOWERS:
+        enqueue(db.sync_session, "timeline.fan_out", {"post_id": db_post.id})
+    await db.commit()
+    return await _load_post(db, db_post.id)
 
 @router.get("/{post_id}", response_model=PostSchema)
-async def read_post(post_id: int, db: Session = Depends(get_db)):
-    post = db.query(Post).filter(Post.id == post_id).first()
+async def read_post(
+    post_id: int,
+    current_user: Optional[User] = Depends(get_optional_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    post = await db.scalar(select(Post).options(joinedload(Post.user)).where(Post.id == post_id))
     if post is None:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    post_dict = {
-        "id": post.id,
-        "user_id": post.user_id,
-        "title": post.title,
-        "body": post.body,
-        "visibility": post.visibility,
-        "youtube_url": post.youtube_url,
-        "media_id": post.media_id,
-        "media_url": None,
-        "media_urls": [],
-        "category": post.category,
-        "subcategory": post.subcategory,
-        "post_type": post.post_type,
-        "slug": post.slug,
-        "status": post.status,
-        "og_image_url": post.og_image_url,
-        "excerpt": post.excerpt,
-        "tourism_details": None,
-        "created_at": post.created_at,
-        "updated_at": post.updated_at
-    }
-    if post.media_id:
-        media = db.query(MediaAsset).filter(MediaAsset.id == post.media_id).first()
-        if media:
-            post_dict["media_url"] = media.url
-    
-    post_media_records = db.query(PostMedia).filter(PostMedia.post_id == post_id).order_by(PostMedia.order_index).all()
-    if post_media_records:
-        media_urls = []
-        for pm in post_media_records:
-            media = db.query(MediaAsset).filter(MediaAsset.id == pm.media_asset_id).first()
-            if media:
-                media_urls.append(media.url)
-        post_dict["media_urls"] = media_urls
-    
-    if post.post_type == 'tourism':
-        tourism = db.query(PostTourism).filter(PostTourism.post_id == post_id).first()
-        if tourism:
-            post_dict["tourism_details"] = {
-                "prefecture": tourism.prefecture,
-                "event_datetime": tourism.event_datetime,
-                "meet_place": tourism.meet_place,
-                "meet_address": tourism.meet_address,
-                "tour_content": tourism.tour_content,
-                "fee": tourism.fee,
-                "contact_phone": tourism.contact_phone,
-                "contact_email": tourism.contact_email,
-                "deadline": tourism.deadline,
-                "attachment_pdf_url": tourism.attachment_pdf_url
-            }
-    
-    return post_dict
+    return (await db.run_sync(hydrate_posts, [post], current_user.id if current_user else None))[0]
 
 @router.put("/{post_id}", response_model=PostSchema)
 async def update_post(
     post_id: int,
     post_update: PostUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).where(Post.id == post_id))
     if post is None:
         raise HTTPException(status_code=404, detail="Post not found")
     
     if post.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
+    was_visible = post.status == "published" and post.visibility in VISIBLE_TO_FOLLOWERS
     update_data = post_update.dict(exclude_unset=True, exclude={'media_ids', 'tourism_details'})
     for field, value in update_data.items():
         setattr(post, field, value)
+    # 下書きの公開・非公開からの変更はここでタイムラインに配る
+    if not was_visible and post.status == "published" and post.visibility in VISIBLE_TO_FOLLOWERS:
+        enqueue(db.sync_session, "timeline.fan_out", {"post_id": post_id})
     
     if post_update.media_ids is not None:
-        db.query(PostMedia).filter(PostMedia.post_id == post_id).delete(synchronize_session=False)
+        await db.execute(delete(PostMedia).where(PostMedia.post_id == post_id))
         for idx, media_id in enumerate(post_update.media_ids[:5]):
             post_media = PostMedia(
                 post_id=post_id,
@@ -318,7 +264,7 @@ async def update_post(
             db.add(post_media)
     
     if post_update.tourism_details is not None:
-        existing_tourism = db.query(PostTourism).filter(PostTourism.post_id == post_id).first()
+        existing_tourism = await db.scalar(select(PostTourism).where(PostTourism.post_id == post_id))
         if existing_tourism:
             tourism_data = post_update.tourism_details.dict(exclude_unset=True)
             for field, value in tourism_data.items():
@@ -328,19 +274,18 @@ async def update_post(
             db_tourism = PostTourism(post_id=post_id, **tourism_data)
             db.add(db_tourism)
     
-    db.commit()
-    db.refresh(post)
-    return post
+    await db.commit()
+    return await _load_post(db, post_id)
 
 @router.delete("/{post_id}")
 async def delete_post(
     post_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     logger = logging.getLogger("app.posts")
     try:
-        post = db.query(Post).filter(Post.id == post_id).first()
+        post = await db.scalar(select(Post).where(Post.id == post_id))
         if post is None:
             raise HTTPException(status_code=404, detail="Post not found")
         
@@ -348,210 +293,153 @@ async def delete_post(
             raise HTTPException(status_code=403, detail="Not enough permissions")
 
         # Delete dependent comments, tag mappings, reactions, point events, post_media, and post_tourism to avoid FK/consistency issues
-        from app.models import Comment, PostTag, Reaction, PointEvent
-        db.query(Comment).filter(Comment.post_id == post_id).delete(synchronize_session=False)
-        db.query(PostTag).filter(PostTag.post_id == post_id).delete(synchronize_session=False)
-        db.query(Reaction).filter(Reaction.target_type == "post", Reaction.target_id == post_id).delete(synchronize_session=False)
-        db.query(PointEvent).filter(PointEvent.ref_type == "post", PointEvent.ref_id == post_id).delete(synchronize_session=False)
-        db.query(PostMedia).filter(PostMedia.post_id == post_id).delete(synchronize_session=False)
-        db.query(PostTourism).filter(PostTourism.post_id == post_id).delete(synchronize_session=False)
+        await db.execute(delete(Comment).where(Comment.post_id == post_id))
+        await db.execute(delete(PostTag).where(PostTag.post_id == post_id))
+        await db.execute(delete(Reaction).where(Reaction.target_type == "post", Reaction.target_id == post_id))
+        await db.execute(delete(PointEvent).where(PointEvent.ref_type == "post", PointEvent.ref_id == post_id))
+        await db.execute(delete(PostMedia).where(PostMedia.post_id == post_id))
+        await db.execute(delete(PostTourism).where(PostTourism.post_id == post_id))
+        await db.execute(delete(TimelineEntry).where(TimelineEntry.post_id == post_id))
 
         # Remember media_id to potentially cleanup
         media_id = post.media_id
 
         # Delete the post row via bulk delete to avoid ORM relationship side-effects
-        db.query(Post).filter(Post.id == post_id).delete(synchronize_session=False)
-        db.commit()
-
-        # Cleanup orphaned media if no other posts reference it
+        await db.execute(delete(Post).where(Post.id == post_id))
+        # 参照されなくなったメディア（行・ファイル）の削除はレスポンス後にジョブで行う
         if media_id:
-            in_use = db.query(Post).filter(Post.media_id == media_id).count()
-            if in_use == 0:
-                media = db.query(MediaAsset).filter(MediaAsset.id == media_id).first()
-                if media:
-                    # attempt to remove file from disk
-                    import os
-                    from pathlib import Path
-                    base_dir = os.getenv("MEDIA_DIR") or ("/data/media" if os.path.exists("/data") else "media")
-                    try:
-                        url = media.url or ""
-                        rel = url.replace("/media/", "", 1)
-                        path = Path(base_dir) / rel
-                        if path.is_file():
-                            path.unlink()
-                    except Exception:
-                        pass
-                    db.delete(media)
-                    db.commit()
+            enqueue(db.sync_session, "media.cleanup_orphan", {"media_id": media_id})
+        await db.commit()
         return {"message": "Post deleted successfully"}
     except HTTPException:
         # ensure transaction state is clean
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
         logger.exception("Failed to delete post %s", post_id)
-        db.rollback()
+        await db.rollback()
         # Return error with message for quick diagnosis in prod
         raise HTTPException(status_code=500, detail=f"delete_failed: {type(e).__name__}: {e}")
 
+async def _likeable_post(db: AsyncSession, post_id: int, user: User) -> Post:
+    post = await db.scalar(select(Post).where(Post.id == post_id))
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if post.user_id == user.id:
+        raise HTTPException(status_code=400, detail="Cannot like your own post")
+    return post
+
 @router.post("/{post_id}/like")
 async def toggle_like_post(
     post_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    if post.user_id == current_user.id:
-        raise HTTPException(status_code=400, detail="Cannot like your own post")
-    
-    existing_reaction = db.query(Reaction).filter(
-        Reaction.user_id == current_user.id,
-        Reaction.target_type == "post",
-        Reaction.target_id == post_id,
-        Reaction.reaction_type == "like"
-    ).first()
-    
-    post_author = db.query(User).filter(User.id == post.user_id).first()
-    
-    if existing_reaction:
-        db.delete(existing_reaction)
-        
-        if post_author and post_author.carats > 0:
-            post_author.carats = post_author.carats - 1
-        
-        db.commit()
-        like_count = db.query(Reaction).filter(
-            Reaction.target_type == "post",
-            Reaction.target_id == post_id,
-            Reaction.reaction_type == "like"
-        ).count()
-        return {"liked": False, "like_count": like_count}
-    else:
-        new_reaction = Reaction(
-            user_id=current_user.id,
-            target_type="post",
-            target_id=post_id,
-            reaction_type="like"
-        )
-        db.add(new_reaction)
-        
-        if post_author:
-            post_author.carats = (post_author.carats or 0) + 1
-        
-        db.commit()
-        like_count = db.query(Reaction).filter(
-            Reaction.target_type == "post",
-            Reaction.target_id == post_id,
-            Reaction.reaction_type == "like"
-        ).count()
-        return {"liked": True, "like_count": like_count}
+    post = await _likeable_post(db, post_id, current_user)
+    # 削除できなければ追加する（同時の二重押しでも一意制約違反にならない）
+    liked = not await db.run_sync(remove_post_like, post_id, current_user.id, post.user_id)
+    if liked:
+        await db.run_sync(add_post_like, post_id, current_user.id, post.user_id)
+    await db.commit()
+    await db.refresh(post, ["like_count"])
+    return {"liked": liked, "like_count": current_like_count(post)}
 
 @router.put("/{post_id}/like")
 async def add_like_post(
     post_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Idempotent endpoint to add a like. Returns the same result even if called multiple times."""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    if post.user_id == current_user.id:
-        raise HTTPException(status_code=400, detail="Cannot like your own post")
-    
-    existing_reaction = db.query(Reaction).filter(
-        Reaction.user_id == current_user.id,
-        Reaction.target_type == "post",
-        Reaction.target_id == post_id,
-        Reaction.reaction_type == "like"
-    ).first()
-    
-    if not existing_reaction:
-        new_reaction = Reaction(
-            user_id=current_user.id,
-            target_type="post",
-            target_id=post_id,
-            reaction_type="like"
-        )
-        db.add(new_reaction)
-        
-        post_author = db.query(User).filter(User.id == post.user_id).first()
-        if post_author:
-            post_author.carats = (post_author.carats or 0) + 1
-        
-        db.commit()
-    
-    like_count = db.query(Reaction).filter(
-        Reaction.target_type == "post",
-        Reaction.target_id == post_id,
-        Reaction.reaction_type == "like"
-    ).count()
-    return {"liked": True, "like_count": like_count}
+    post = await _likeable_post(db, post_id, current_user)
+    if await db.run_sync(add_post_like, post_id, current_user.id, post.user_id):
+        await db.commit()
+        await db.refresh(post, ["like_count"])
+    return {"liked": True, "like_count": current_like_count(post)}
 
 @router.delete("/{post_id}/like")
 async def remove_like_post(
     post_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Idempotent endpoint to remove a like. Returns the same result even if called multiple times."""
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).where(Post.id == post_id))
     if post is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    
-    existing_reaction = db.query(Reaction).filter(
-        Reaction.user_id == current_user.id,
-        Reaction.target_type == "post",
-        Reaction.target_id == post_id,
-        Reaction.reaction_type == "like"
-    ).first()
-    
-    if existing_reaction:
-        db.delete(existing_reaction)
-        
-        post_author = db.query(User).filter(User.id == post.user_id).first()
-        if post_author and post_author.carats > 0:
-            post_author.carats = post_author.carats - 1
-        
-        db.commit()
-    
-    like_count = db.query(Reaction).filter(
-        Reaction.target_type == "post",
-        Reaction.target_id == post_id,
-        Reaction.reaction_type == "like"
-    ).count()
-    return {"liked": False, "like_count": like_count}
+    if await db.run_sync(remove_post_like, post_id, current_user.id, post.user_id):
+        await db.commit()
+        await db.refresh(post, ["like_count"])
+    return {"liked": False, "like_count": current_like_count(post)}
 
 @router.get("/{post_id}/comments")
 async def get_post_comments(
     post_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    from app.models import Comment
-    comments = db.query(Comment).filter(
-        Comment.post_id == post_id
-    ).order_by(Comment.created_at).offset(skip).limit(limit).all()
-    
-    result = []
-    for comment in comments:
-        user = db.query(User).filter(User.id == comment.user_id).first()
-        result.append({
+    query = select(Comment).options(joinedload(Comment.user)).where(Comment.post_id == post_id)
+    if cursor:
+        values = decode_cursor(cursor, "comments", 2)
+        query = query.where(
+            keyset_filter([Comment.created_at, Comment.id], values, descending=False, dialect_name=db.get_bind().dialect.name)
+        )
+    query = query.order_by(Comment.created_at, Comment.id)
+    if not cursor:
+        query = query.offset(skip)
+    comments = (await db.scalars(query.limit(limit))).all()
+    following = next_cursor(comments, limit, "comments", lambda c: [c.created_at, c.id])
+    if following:
+        response.headers[NEXT_CURSOR_HEADER] = following
+    
+    return [
+        {
             "id": comment.id,
             "body": comment.body,
             "created_at": comment.created_at,
             "user": {
-                "id": user.id,
-                "display_name": user.display_name
-            } if user else None
-        })
-    
-    return result
+                "id": comment.user.id,
+                "display_name": comment.user.display_name
+            } if comment.user else None
+        }
+        for comment in comments
+    ]
+
+@router.get("/{post_id}/comments/tree")
+async def get_post_comment_tree(
+    post_id: int,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    thread: Optional[int] = Query(None, description="return only this comment's thread"),
+    replies: int = Query(50, ge=0, le=500, description="replies per thread"),
+    replies_cursor: Optional[str] = Query(None, description="a thread's replies_cursor (with thread)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Top-level comments with their reply trees, in two queries.
+
+    Threads are paged with ``X-Next-Cursor``; a thread cut at ``replies``
+    carries a ``replies_cursor`` to pass back with ``thread=<its id>``.
+    """
+    after = decode_cursor(cursor, THREAD_CURSOR_KIND, 2) if cursor else None
+    replies_after = None
+    if replies_cursor:
+        if thread is None:
+            raise HTTPException(status_code=400, detail="replies_cursor requires thread")
+        thread_id, *replies_after = decode_cursor(replies_cursor, REPLY_CURSOR_KIND, 3)
+        if thread_id != thread:
+            raise HTTPException(status_code=400, detail="invalid_cursor")
+    threads = await db.run_sync(
+        comment_threads, post_id, limit, after, thread, replies, replies_after,
+    )
+    if thread is None:
+        following = next_cursor(threads, limit, THREAD_CURSOR_KIND, lambda t: [t["created_at"], t["id"]])
+        if following:
+            response.headers[NEXT_CURSOR_HEADER] = following
+    return threads
 
 @router.post("/{post_id}/comments")
 @limiter.limit("10/5minutes")
@@ -559,8 +447,8 @@ async def create_post_comment(
     request: Request,
     post_id: int,
     comment_data: dict,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     author_name = comment_data.get("authorName", "").strip()
     body = comment_data.get("body", "").strip()
@@ -572,19 +460,19 @@ async def create_post_comment(
     
     safe_body = html.escape(body)
     
-    post = db.query(Post).filter(Post.id == post_id, Post.visibility == "public").first()
+    post = await db.scalar(select(Post.id).where(Post.id == post_id, Post.visibility == "public"))
     if not post:
         raise HTTPException(status_code=404, detail="post_not_found")
     
-    from app.models import Comment
     new_comment = Comment(
         post_id=post_id,
         user_id=current_user.id,
         body=safe_body
     )
     db.add(new_comment)
-    db.commit()
-    db.refresh(new_comment)
+    await db.run_sync(adjust_post_counters, post_id, comments=1)
+    await db.commit()
+    await db.refresh(new_comment)
     
     return {
         "id": new_comment.id,
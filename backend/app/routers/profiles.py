@@ -1,18 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models import User, Profile
 from app.schemas import Profile as ProfileSchema, ProfileUpdate
-from app.auth import get_current_active_user
+from app.auth import get_current_active_user_async
 
 router = APIRouter(prefix="/api/profiles", tags=["profiles"])
 
 @router.get("/me", response_model=ProfileSchema)
 async def read_profile_me(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    profile = await db.scalar(select(Profile).where(Profile.user_id == current_user.id))
     if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
@@ -20,23 +21,23 @@ async def read_profile_me(
 @router.put("/me", response_model=ProfileSchema)
 async def update_profile_me(
     profile_update: ProfileUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    profile = await db.scalar(select(Profile).where(Profile.user_id == current_user.id))
     if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
     
     for field, value in profile_update.dict(exclude_unset=True).items():
         setattr(profile, field, value)
     
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
     return profile
 
 @router.get("/{handle}", response_model=ProfileSchema)
-async def read_profile_by_handle(handle: str, db: Session = Depends(get_db)):
-    profile = db.query(Profile).filter(Profile.handle == handle).first()
+async def read_profile_by_handle(handle: str, db: AsyncSession = Depends(get_async_db)):
+    profile = await db.scalar(select(Profile).where(Profile.handle == handle))
     if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
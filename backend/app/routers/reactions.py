@@ -1,47 +1,59 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models import User, Reaction, PointEvent
 from app.schemas import Reaction as ReactionSchema, ReactionCreate
-from app.auth import get_current_active_user
+from app.auth import get_current_active_user_async
+from app.counters import adjust_post_counters
+from app.likes import invalidate_liked_cache_on_commit
 
 router = APIRouter(prefix="/api/reactions", tags=["reactions"])
 
+def _is_post_like(reaction: Reaction) -> bool:
+    return reaction.target_type == "post" and reaction.reaction_type == "like"
+
 @router.post("/", response_model=ReactionSchema)
 async def create_reaction(
     reaction: ReactionCreate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     user_id = current_user.id
     
-    existing_reaction = db.query(Reaction).filter(
+    existing_reaction = await db.scalar(select(Reaction).where(
         Reaction.user_id == user_id,
         Reaction.target_type == reaction.target_type,
         Reaction.target_id == reaction.target_id,
         Reaction.reaction_type == reaction.reaction_type
-    ).first()
+    ))
     
     if existing_reaction:
         raise HTTPException(status_code=400, detail="Reaction already exists")
     
     db_reaction = Reaction(**reaction.dict(), user_id=user_id)
     db.add(db_reaction)
-    db.commit()
-    db.refresh(db_reaction)
+    if _is_post_like(db_reaction):
+        await db.run_sync(adjust_post_counters, db_reaction.target_id, likes=1)
+        await db.run_sync(invalidate_liked_cache_on_commit, user_id)
+    await db.commit()
+    await db.refresh(db_reaction)
     
     return db_reaction
 
 @router.delete("/{reaction_id}")
 async def delete_reaction(
     reaction_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    reaction = db.query(Reaction).filter(Reaction.id == reaction_id).first()
+    reaction = await db.scalar(select(Reaction).where(Reaction.id == reaction_id))
     if reaction is None:
         raise HTTPException(status_code=404, detail="Reaction not found")
     
-    db.delete(reaction)
-    db.commit()
+    await db.delete(reaction)
+    if _is_post_like(reaction):
+        await db.run_sync(adjust_post_counters, reaction.target_id, likes=-1)
+        await db.run_sync(invalidate_liked_cache_on_commit, reaction.user_id)
+    await db.commit()
     return {"message": "Reaction deleted successfully"}
@@ -142,10 +142,13 @@ class Post(PostBase):
     user_id: int
     media_url: Optional[str] = None
     media_urls: Optional[List[str]] = None
+    media_thumbnail_url: Optional[str] = None
+    media_thumbnail_urls: Optional[List[str]] = None
     tourism_details: Optional[PostTourismDetails] = None
     created_at: datetime
     updated_at: datetime
     like_count: Optional[int] = 0
+    is_liked: bool = False
     comment_count: Optional[int] = 0
     user_display_name: Optional[str] = None
     
@@ -0,0 +1,113 @@
+"""Media storage: S3 when ``USE_S3`` is enabled, ``MEDIA_DIR`` otherwise.
+
+All functions here are blocking (boto3 / file I/O); async handlers call them
+through ``run_in_threadpool``.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+# S3設定
+S3_BUCKET = os.getenv("AWS_S3_BUCKET", "rainbow-community-media-prod")
+S3_REGION = os.getenv("AWS_REGION", "ap-northeast-1")
+USE_S3 = os.getenv("USE_S3", "true").lower() == "true"
+
+# 8MB 以上はマルチパートで分割アップロード（パートは並列送信）
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+# S3クライアント初期化
+if USE_S3:
+    s3_client = boto3.client(
+        's3',
+        region_name=S3_REGION,
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
+    )
+else:
+    s3_client = None
+
+# ローカルストレージ（フォールバック）
+media_base = os.getenv("MEDIA_DIR")
+if not media_base:
+    media_base = "/data/media" if os.path.exists("/data") else "media"
+MEDIA_DIR = Path(media_base)
+MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+
+S3_URL_PREFIX = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/"
+
+
+def s3_enabled() -> bool:
+    return USE_S3 and s3_client is not None
+
+
+def put_fileobj(fileobj: BinaryIO, key: str, content_type: str) -> str:
+    """Store ``fileobj`` under ``key`` (e.g. ``media/<name>``) and return its public URL.
+
+    On S3 this streams with ``upload_fileobj``, switching to a multipart
+    upload for large files, so the body is never held in memory as a whole.
+    """
+    if s3_enabled():
+        s3_client.upload_fileobj(
+            fileobj,
+            S3_BUCKET,
+            key,
+            ExtraArgs={"ContentType": content_type},
+            Config=S3_TRANSFER_CONFIG,
+        )
+        return f"{S3_URL_PREFIX}{key}"
+    name = key.split("/", 1)[1] if key.startswith("media/") else key
+    path = MEDIA_DIR / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(fileobj, buffer, 1024 * 1024)
+    return f"/media/{name}"
+
+
+def key_for_url(url: str) -> Optional[str]:
+    if url.startswith(S3_URL_PREFIX):
+        return url[len(S3_URL_PREFIX):]
+    if url.startswith("/media/"):
+        return "media/" + url[len("/media/"):]
+    return None
+
+
+def delete_url(url: str) -> None:
+    """Remove the stored object behind a URL returned by ``put_fileobj``."""
+    if s3_enabled() and url.startswith("https://"):
+        key = key_for_url(url)
+        if key:
+            s3_client.delete_object(Bucket=S3_BUCKET, Key=key)
+        return
+    key = key_for_url(url)
+    file_path = MEDIA_DIR / (key.split("/", 1)[1] if key else url.split('/')[-1])
+    if file_path.is_file():
+        file_path.unlink()
+
+
+def open_url(url: str) -> Optional[BinaryIO]:
+    """Open a stored object for reading (rewound temp file), or None if it is missing."""
+    key = key_for_url(url)
+    if key is None:
+        return None
+    if s3_enabled() and url.startswith("https://"):
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        try:
+            s3_client.download_fileobj(S3_BUCKET, key, spool)
+        except Exception:
+            spool.close()
+            return None
+        spool.seek(0)
+        return spool
+    file_path = MEDIA_DIR / key.split("/", 1)[1]
+    if not file_path.is_file():
+        return None
+    return open(file_path, "rb")
@@ -0,0 +1,69 @@
+"""Background job handlers (see ``app.jobs``)."""
+import logging
+
+from app.images import generate_derivatives
+from app.jobs import enqueue, job
+from app.likes import settle_post_likes
+from app.models import MediaAsset, MediaDerivative, Post, PostMedia
+from app.storage import delete_url
+from app.timeline import add_followee, build_timeline, fan_out_post
+
+logger = logging.getLogger("app.tasks")
+
+
+@job("storage.delete_urls")
+def delete_stored_objects(db, payload):
+    for url in payload.get("urls", []):
+        delete_url(url)
+
+
+@job("likes.settle")
+def settle_likes(db, payload):
+    """Safety net for write-behind likes whose buffer was lost (see ``app.likes``)."""
+    settle_post_likes(db, payload.get("post_ids", []))
+
+
+@job("timeline.build")
+def build_user_timeline(db, payload):
+    build_timeline(db, payload["user_id"])
+
+
+@job("timeline.fan_out")
+def fan_out_timeline_post(db, payload):
+    """Copy a new post into its author's followers' materialized timelines (see ``app.timeline``)."""
+    fan_out_post(db, payload["post_id"])
+
+
+@job("timeline.follow")
+def backfill_followee(db, payload):
+    add_followee(db, payload["user_id"], payload["followee_id"])
+
+
+@job("media.generate_derivatives")
+def generate_media_derivatives(db, payload):
+    asset = db.query(MediaAsset).filter(MediaAsset.id == payload["media_id"]).first()
+    if asset:
+        generate_derivatives(db, asset)
+
+
+@job("media.cleanup_orphan")
+def cleanup_orphan_media(db, payload):
+    """Delete a media asset (rows and stored files) once no post references it."""
+    media_id = payload["media_id"]
+    in_use = (
+        db.query(Post.id).filter(Post.media_id == media_id).first()
+        or db.query(PostMedia.post_id).filter(PostMedia.media_asset_id == media_id).first()
+    )
+    if in_use:
+        return
+    asset = db.query(MediaAsset).filter(MediaAsset.id == media_id).first()
+    if not asset:
+        return
+    derivatives = db.query(MediaDerivative).filter(MediaDerivative.media_asset_id == media_id).all()
+    urls = [asset.url] + [d.url for d in derivatives]
+    for derivative in derivatives:
+        db.delete(derivative)
+    db.delete(asset)
+    # ファイル削除は行の削除と同じトランザクションで別ジョブにする
+    enqueue(db, "storage.delete_urls", {"urls": urls})
+    db.commit()
@@ -0,0 +1,216 @@
+"""Home timeline: posts from the people a user follows, newest first.
+
+Two ways to build a page, both keyed by the posts' ``(created_at, id)``:
+
+* ``merge`` (fan-out-on-read): every followee's recent posts form one
+  stream read off ``idx_posts_user_created`` (a ``LATERAL`` index scan per
+  followee on PostgreSQL, a ``row_number()`` window elsewhere), each capped
+  at the page size, and the streams are k-way merged with ``heapq.merge``.
+  Nothing is stored, but the work grows with the number of followees.
+* ``fanout`` (fan-out-on-write): a new post is copied into
+  ``timeline_entries`` for each follower that has a materialized timeline
+  (``timeline.fan_out`` job), so a page is one range scan of the reader's
+  own rows.
+
+``auto`` uses ``fanout`` for readers following at least
+``TIMELINE_FANOUT_MIN_FOLLOWEES`` users.  Their timeline is built by the
+``timeline.build`` job the first time it is needed (that request is still
+answered by ``merge``); it holds the newest ``TIMELINE_MAX_ENTRIES`` posts
+as of the build plus everything fanned out since.
+"""
+import heapq
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, exists, func, literal, select, true
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload
+
+from app.cache import TTLCache
+from app.feed import hydrate_posts
+from app.jobs import enqueue
+from app.metrics import metrics
+from app.models import Follow, MaterializedTimeline, Post, TimelineEntry
+from app.pagination import keyset_filter
+
+TIMELINE_CURSOR_KIND = "timeline"
+STRATEGIES = ("auto", "merge", "fanout")
+TIMELINE_STRATEGY = os.getenv("TIMELINE_STRATEGY", "auto")
+TIMELINE_FANOUT_MIN_FOLLOWEES = int(os.getenv("TIMELINE_FANOUT_MIN_FOLLOWEES", "1000"))
+TIMELINE_MAX_ENTRIES = int(os.getenv("TIMELINE_MAX_ENTRIES", "1000"))
+
+# フォロワーに見える投稿
+VISIBLE_TO_FOLLOWERS = ("public", "members", "followers")
+# 構築中にコミットされた投稿を拾い直す幅（アプリと DB の時計のずれも含む）
+_BUILD_OVERLAP = timedelta(minutes=5)
+
+TimelineKey = Tuple[Any, int]
+
+# 同じユーザーの構築ジョブを重ねて積まない
+_build_requested = TTLCache(maxsize=10000, ttl=300)
+
+
+def _insert_for(db: Session):
+    return postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+def _visible():
+    return (Post.status == "published", Post.visibility.in_(VISIBLE_TO_FOLLOWERS))
+
+
+def _followees(user_id: int):
+    return select(Follow.followee_user_id).where(
+        Follow.follower_user_id == user_id,
+        Follow.status == "accepted",
+    )
+
+
+# ----- 読み出し -----
+def merged_timeline(db: Session, user_id: int, limit: int, after: Optional[Sequence[Any]] = None) -> List[TimelineKey]:
+    """Keys of the ``limit`` newest visible posts of ``user_id``'s followees after ``after``."""
+    dialect_name = db.get_bind().dialect.name
+    order = (Post.created_at, Post.id)
+    recent = select(Post.user_id, Post.created_at, Post.id).where(*_visible())
+    if after is not None:
+        recent = recent.where(keyset_filter(order, after, dialect_name=dialect_name))
+
+    if dialect_name == "postgresql":
+        followees = _followees(user_id).subquery("followees")
+        recent = (
+            recent.where(Post.user_id == followees.c.followee_user_id)
+            .order_by(Post.created_at.desc(), Post.id.desc())
+            .limit(limit)
+            .lateral("recent")
+        )
+        query = select(recent.c.user_id, recent.c.created_at, recent.c.id).select_from(followees).join(recent, true())
+    else:
+        ranked = (
+            recent.add_columns(
+                func.row_number().over(
+                    partition_by=Post.user_id, order_by=(Post.created_at.desc(), Post.id.desc())
+                ).label("position")
+            )
+            .where(Post.user_id.in_(_followees(user_id)))
+            .subquery()
+        )
+        query = select(ranked.c.user_id, ranked.c.created_at, ranked.c.id).where(ranked.c.position <= limit)
+
+    streams = defaultdict(list)
+    for author_id, created_at, post_id in db.execute(query):
+        streams[author_id].append((created_at, post_id))
+    for stream in streams.values():
+        stream.sort(reverse=True)
+    return list(islice(heapq.merge(*streams.values(), reverse=True), limit))
+
+
+def materialized_timeline(db: Session, user_id: int, limit: int, after: Optional[Sequence[Any]] = None) -> List[TimelineKey]:
+    """Keys of the next ``limit`` rows of ``user_id``'s ``timeline_entries`` after ``after``."""
+    order = (TimelineEntry.created_at, TimelineEntry.post_id)
+    query = (
+        select(*order)
+        .join(Post, Post.id == TimelineEntry.post_id)
+        .where(TimelineEntry.user_id == user_id, *_visible())
+    )
+    if after is not None:
+        query = query.where(keyset_filter(order, after, dialect_name=db.get_bind().dialect.name))
+    rows = db.execute(query.order_by(*(column.desc() for column in order)).limit(limit))
+    return [(created_at, post_id) for created_at, post_id in rows]
+
+
+def choose_strategy(db: Session, user_id: int, requested: Optional[str] = None) -> str:
+    """``merge`` or ``fanout`` for this reader; queues a build when ``fanout`` is not ready yet."""
+    requested = requested or TIMELINE_STRATEGY
+    if requested == "merge":
+        return "merge"
+    followees, materialized = db.execute(
+        select(
+            select(func.count()).select_from(_followees(user_id).subquery()).scalar_subquery(),
+            exists().where(MaterializedTimeline.user_id == user_id),
+        )
+    ).one()
+    if requested == "auto" and followees < TIMELINE_FANOUT_MIN_FOLLOWEES:
+        return "merge"
+    if materialized:
+        return "fanout"
+    if _build_requested.get(user_id) is None:
+        _build_requested.set(user_id, True)
+        enqueue(db, "timeline.build", {"user_id": user_id})
+        db.commit()
+    return "merge"
+
+
+def timeline_page(db: Session, user_id: int, limit: int = 20, after: Optional[Sequence[Any]] = None,
+                  strategy: Optional[str] = None) -> Tuple[str, List[TimelineKey], List[dict]]:
+    """``(strategy used, page keys, hydrated posts)`` for ``user_id``'s timeline."""
+    used = choose_strategy(db, user_id, strategy)
+    with metrics.timer("timeline_page_seconds", strategy=used):
+        read = materialized_timeline if used == "fanout" else merged_timeline
+        keys = read(db, user_id, limit, after)
+    if not keys:
+        return used, keys, []
+    post_ids = [post_id for _, post_id in keys]
+    posts = {post.id: post for post in db.scalars(
+        select(Post).options(joinedload(Post.user)).where(Post.id.in_(post_ids))
+    )}
+    return used, keys, hydrate_posts(db, [posts[i] for i in post_ids if i in posts], user_id)
+
+
+# ----- ファンアウト -----
+def _copy_posts(db: Session, user_id: int, authors, since: Optional[datetime] = None) -> None:
+    posts = select(literal(user_id), Post.id, Post.user_id, Post.created_at).where(Post.user_id.in_(authors), *_visible())
+    if since is not None:
+        posts = posts.where(Post.created_at >= since)
+    posts = posts.order_by(Post.created_at.desc(), Post.id.desc()).limit(TIMELINE_MAX_ENTRIES)
+    db.execute(
+        _insert_for(db)(TimelineEntry)
+        .from_select(["user_id", "post_id", "author_id", "created_at"], posts)
+        .on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+    )
+
+
+def build_timeline(db: Session, user_id: int) -> None:
+    """(Re)build ``user_id``'s materialized timeline from the followees' newest posts."""
+    started = datetime.utcnow()
+    db.execute(delete(TimelineEntry).where(TimelineEntry.user_id == user_id))
+    _copy_posts(db, user_id, _followees(user_id))
+    db.merge(MaterializedTimeline(user_id=user_id, built_at=started))
+    db.commit()
+    # マーカーのコミット前に走ったファンアウトはこのユーザーを飛ばしているので拾い直す
+    _copy_posts(db, user_id, _followees(user_id), since=started - _BUILD_OVERLAP)
+    db.commit()
+    _build_requested.pop(user_id)
+
+
+def fan_out_post(db: Session, post_id: int) -> None:
+    """Copy a post into the materialized timelines of its author's followers."""
+    post = db.get(Post, post_id)
+    if post is None or post.status != "published" or post.visibility not in VISIBLE_TO_FOLLOWERS:
+        return
+    followers = (
+        select(Follow.follower_user_id, literal(post.id), literal(post.user_id), literal(post.created_at))
+        .join(MaterializedTimeline, MaterializedTimeline.user_id == Follow.follower_user_id)
+        .where(Follow.followee_user_id == post.user_id, Follow.status == "accepted")
+    )
+    db.execute(
+        _insert_for(db)(TimelineEntry)
+        .from_select(["user_id", "post_id", "author_id", "created_at"], followers)
+        .on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+    )
+    db.commit()
+
+
+def add_followee(db: Session, user_id: int, followee_id: int) -> None:
+    """Backfill a new followee's recent posts into ``user_id``'s materialized timeline, if any."""
+    if db.get(MaterializedTimeline, user_id) is None:
+        return
+    _copy_posts(db, user_id, [followee_id])
+    db.commit()
+
+
+def remove_followee(db: Session, user_id: int, followee_id: int) -> None:
+    """Drop an unfollowed user's posts from ``user_id``'s timeline (caller commits)."""
+    db.execute(delete(TimelineEntry).where(TimelineEntry.user_id == user_id, TimelineEntry.author_id == followee_id))
@@ -0,0 +1 @@
+"""Benchmark harness for the API hot paths (see bench/README.md)."""
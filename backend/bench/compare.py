@@ -0,0 +1,45 @@
+"""Compare two ``bench.run --out`` reports.
+
+    python -m bench.compare bench/results/before.json bench/results/after.json
+
+Prints each scenario's RPS and latency percentiles side by side with the
+relative change (negative latency / positive RPS change is an improvement).
+"""
+import json
+import sys
+from pathlib import Path
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before: dict, after: dict) -> str:
+    old = {s["scenario"]: s for s in before["scenarios"]}
+    lines = [f"{'scenario':<10}{'metric':<8}{'before':>12}{'after':>12}{'change':>10}"]
+    for new in after["scenarios"]:
+        prev = old.get(new["scenario"])
+        if prev is None:
+            continue
+        for metric in METRICS:
+            lines.append(
+                f"{new['scenario']:<10}{metric:<8}{prev[metric]:>12}{new[metric]:>12}{_change(prev[metric], new[metric]):>10}"
+            )
+        if prev["errors"] or new["errors"]:
+            lines.append(f"{new['scenario']:<10}{'errors':<8}{prev['errors']:>12}{new['errors']:>12}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    before, after = (json.loads(Path(p).read_text()) for p in sys.argv[1:])
+    print(compare(before, after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Run benchmark scenarios against a running API.
+
+    python -m bench.run feed likes --base-url http://127.0.0.1:8000 --concurrency 32 --duration 30
+
+Scenarios (``all`` runs every one in turn):
+
+* ``feed``   – GET /api/posts, following ``X-Next-Cursor`` for up to 5 pages
+* ``likes``  – POST /api/posts/{id}/like (toggle) on random posts
+* ``search`` – GET /api/matching/search with random filters
+* ``inbox``  – GET /api/matching/chats as a participant of a random chat
+* ``chat``   – WebSocket pairs per chat; one side sends, latency is until the
+  other side receives the message
+
+Tokens are minted locally with ``app.auth.create_access_token``, so
+``SECRET_KEY`` / ``ALGORITHM`` must match the server's.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from app.auth import create_access_token
+from app.pagination import NEXT_CURSOR_HEADER
+from bench.seed import AGE_BANDS, PREFECTURES
+from bench.stats import Recorder, format_table
+
+SCENARIOS = ("feed", "likes", "search", "inbox", "chat")
+
+
+class Context:
+    def __init__(self, args, manifest: dict) -> None:
+        self.args = args
+        self.manifest = manifest
+        self.rng = random.Random(args.seed)
+        self._tokens = {}
+        self.users = {u["id"]: u for u in manifest["users"]}
+
+    def token(self, user: dict) -> str:
+        if user["id"] not in self._tokens:
+            self._tokens[user["id"]] = create_access_token(
+                {"sub": user["email"], "uid": user["id"]}, timedelta(hours=12)
+            )
+        return self._tokens[user["id"]]
+
+    def random_user(self) -> dict:
+        return self.rng.choice(self.manifest["users"])
+
+    def headers(self, user: dict) -> dict:
+        return {"Authorization": f"Bearer {self.token(user)}"}
+
+
+async def timed(recorder: Recorder, request, expected=()) -> httpx.Response:
+    """Await ``request``; statuses < 400 and those in ``expected`` count as successes."""
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError as exc:
+        recorder.error(type(exc).__name__)
+        return None
+    elapsed = time.perf_counter() - started
+    if response.status_code >= 400 and response.status_code not in expected:
+        recorder.error(str(response.status_code))
+    else:
+        recorder.ok(elapsed)
+    return response
+
+
+async def feed_step(ctx: Context, client: httpx.AsyncClient, recorder: Recorder) -> None:
+    user = ctx.random_user()
+    params = {"limit": 20}
+    for _ in range(5):
+        response = await timed(recorder, client.get("/api/posts", params=params, headers=ctx.headers(user)))
+        cursor = response.headers.get(NEXT_CURSOR_HEADER) if response is not None else None
+        if not cursor:
+            return
+        params = {"limit": 20, "cursor": cursor}
+
+
+async def likes_step(ctx: Context, client: httpx.AsyncClient, recorder: Recorder) -> None:
+    post_id = ctx.rng.choice(ctx.manifest["post_ids"])
+    # 400 = 自分の投稿へのいいね（想定内）
+    await timed(recorder, client.post(f"/api/posts/{post_id}/like", headers=ctx.headers(ctx.random_user())), expected=(400,))
+
+
+async def search_step(ctx: Context, client: httpx.AsyncClient, recorder: Recorder) -> None:
+    params = {"size": 20}
+    if ctx.rng.random() < 0.7:
+        params["prefecture"] = ctx.rng.choice(PREFECTURES)
+    if ctx.rng.random() < 0.5:
+        params["age_band"] = ctx.rng.choice(AGE_BANDS)
+    await timed(recorder, client.get("/api/matching/search", params=params, headers=ctx.headers(ctx.random_user())))
+
+
+async def inbox_step(ctx: Context, client: httpx.AsyncClient, recorder: Recorder) -> None:
+    chat = ctx.rng.choice(ctx.manifest["chats"])
+    user = ctx.users[ctx.rng.choice((chat["user_a_id"], chat["user_b_id"]))]
+    await timed(recorder, client.get("/api/matching/chats", headers=ctx.headers(user)))
+
+
+STEPS = {"feed": feed_step, "likes": likes_step, "search": search_step, "inbox": inbox_step}
+
+
+async def run_http(ctx: Context, name: str) -> dict:
+    recorder = Recorder(name)
+    deadline = time.perf_counter() + ctx.args.duration
+    limits = httpx.Limits(max_connections=ctx.args.concurrency)
+    async with httpx.AsyncClient(base_url=ctx.args.base_url, timeout=30, limits=limits) as client:
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                await STEPS[name](ctx, client, recorder)
+
+        await asyncio.gather(*(worker() for _ in range(ctx.args.concurrency)))
+    recorder.stop()
+    return recorder.summary()
+
+
+async def run_chat(ctx: Context) -> dict:
+    import websockets
+
+    recorder = Recorder("chat")
+    chats = ctx.rng.sample(ctx.manifest["chats"], min(ctx.args.concurrency, len(ctx.manifest["chats"])))
+    ws_base = ctx.args.base_url.replace("http", "ws", 1) + "/api/matching/ws/matching/chat?"
+    deadline = time.perf_counter() + ctx.args.duration
+
+    def url(chat: dict, user_id: int) -> str:
+        return ws_base + urlencode({"chat_id": chat["chat_id"], "token": ctx.token(ctx.users[user_id])})
+
+    async def pair(chat: dict) -> None:
+        try:
+            async with websockets.connect(url(chat, chat["user_a_id"])) as sender, \
+                    websockets.connect(url(chat, chat["user_b_id"])) as receiver:
+                while time.perf_counter() < deadline:
+                    nonce = uuid.uuid4().hex
+                    started = time.perf_counter()
+                    await sender.send(json.dumps({"body": f"bench {nonce}"}))
+                    while True:
+                        message = json.loads(await asyncio.wait_for(receiver.recv(), timeout=10))
+                        if message.get("body") == f"bench {nonce}":
+                            recorder.ok(time.perf_counter() - started)
+                            break
+                    # 送信側に届く自分のエコーを捨てる
+                    while True:
+                        try:
+                            await asyncio.wait_for(sender.recv(), timeout=0.001)
+                        except asyncio.TimeoutError:
+                            break
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as exc:
+            recorder.error(type(exc).__name__)
+
+    await asyncio.gather(*(pair(chat) for chat in chats))
+    recorder.stop()
+    return recorder.summary()
+
+
+async def main_async(args) -> list:
+    manifest = json.loads(Path(args.manifest).read_text())
+    ctx = Context(args, manifest)
+    names = SCENARIOS if "all" in args.scenarios else args.scenarios
+    summaries = []
+    for name in names:
+        summary = await (run_chat(ctx) if name == "chat" else run_http(ctx, name))
+        print(format_table([summary]).splitlines()[-1], flush=True)
+        summaries.append(summary)
+    return summaries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="+", choices=SCENARIOS + ("all",))
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--manifest", default="bench/manifest.json")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients (chat: socket pairs)")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here (for bench.compare)")
+    args = parser.parse_args()
+
+    summaries = asyncio.run(main_async(args))
+    print()
+    print(format_table(summaries))
+    if args.out:
+        report = {
+            "started_at": datetime.utcnow().isoformat(),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "scenarios": summaries,
+        }
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
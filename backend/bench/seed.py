@@ -0,0 +1,213 @@
+"""Seed a benchmark database.
+
+    python -m bench.seed --database-url sqlite:///./bench.db --users 2000 --posts 20000 --manifest bench/manifest.json
+
+Inserts users (premium, with matching profiles and images), posts with
+reactions and comments, matches with chats and messages, then rebuilds the
+post counters.  Rows are tagged with ``--tag`` (emails look like
+``bench-<tag>-<n>@bench.invalid``) so several seeds can share a database.
+The manifest records the ids the scenarios need.
+
+The target database is always given with ``--database-url`` (``.env`` is
+never used), and anything other than SQLite or a database on localhost is
+refused unless ``--i-know`` is passed.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+from app.auth import get_password_hash
+from app.counters import reconcile_post_counters
+from app.database import Base
+from app.models import (
+    Chat, Comment, Hobby, Match, MatchingProfile, MatchingProfileHobby, MatchingProfileImage, Message, Post,
+    Reaction, User,
+)
+
+BENCH_PASSWORD = "bench-password"
+BATCH = 1000
+
+PREFECTURES = ["東京都", "大阪府", "神奈川県", "愛知県", "福岡県", "北海道", "京都府", "兵庫県"]
+AGE_BANDS = ["20代前半", "20代後半", "30代前半", "30代後半", "40代", "50代以上"]
+IDENTITIES = ["gay", "lesbian", "bisexual", "transgender", "queer", "other"]
+OCCUPATIONS = ["会社員", "学生", "自営業", "公務員", "フリーランス"]
+CATEGORIES = ["board", "art", "music", "shops", "tours", "comics", "news"]
+HOBBIES = ["映画", "音楽", "旅行", "料理", "読書", "スポーツ", "ゲーム", "アート"]
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+
+def bench_engine(database_url: str, i_know: bool = False):
+    """Engine for ``database_url``; exits unless it is SQLite or local (or ``i_know``)."""
+    url = make_url(database_url)
+    local = url.get_backend_name() == "sqlite" or url.host in LOCAL_HOSTS
+    if not local and not i_know:
+        sys.exit(f"Refusing to write benchmark data to {url.render_as_string(hide_password=True)}; "
+                 "use a SQLite or localhost database, or pass --i-know")
+    if url.get_backend_name() == "sqlite":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url)
+
+
+def _insert(db, model, rows, returning=None):
+    """Bulk insert ``rows`` in batches; returns the ``returning`` column values if given."""
+    ids = []
+    for start in range(0, len(rows), BATCH):
+        chunk = rows[start:start + BATCH]
+        if returning is None:
+            db.execute(insert(model), chunk)
+        else:
+            ids.extend(db.scalars(insert(model).returning(returning, sort_by_parameter_order=True), chunk))
+    return ids
+
+
+def seed(args) -> dict:
+    rng = random.Random(args.seed)
+    engine = bench_engine(args.database_url, args.i_know)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    try:
+        password_hash = get_password_hash(BENCH_PASSWORD)
+        user_ids = _insert(db, User, [
+            {
+                "email": f"bench-{args.tag}-{n}@bench.invalid",
+                "password_hash": password_hash,
+                "display_name": f"Bench {n}",
+                "membership_type": "premium",
+                "is_active": True,
+            }
+            for n in range(args.users)
+        ], returning=User.id)
+
+        _insert(db, MatchingProfile, [
+            {
+                "user_id": uid,
+                "nickname": f"bench{n}",
+                "prefecture": rng.choice(PREFECTURES),
+                "age_band": rng.choice(AGE_BANDS),
+                "identity": rng.choice(IDENTITIES),
+                "occupation": rng.choice(OCCUPATIONS),
+                "display_flag": True,
+            }
+            for n, uid in enumerate(user_ids)
+        ])
+        _insert(db, MatchingProfileImage, [
+            {"profile_id": uid, "image_url": f"/matching-media/bench/{uid}-{order}.jpg", "display_order": order}
+            for uid in user_ids
+            for order in range(rng.randint(0, args.images_per_profile))
+        ])
+        existing = {h.name: h.id for h in db.query(Hobby).filter(Hobby.name.in_(HOBBIES))}
+        missing = [{"name": name} for name in HOBBIES if name not in existing]
+        if missing:
+            _insert(db, Hobby, missing)
+            existing = {h.name: h.id for h in db.query(Hobby).filter(Hobby.name.in_(HOBBIES))}
+        _insert(db, MatchingProfileHobby, [
+            {"profile_id": uid, "hobby_id": hobby_id}
+            for uid in user_ids
+            for hobby_id in rng.sample(sorted(existing.values()), rng.randint(1, 3))
+        ])
+
+        post_ids = _insert(db, Post, [
+            {
+                "user_id": rng.choice(user_ids),
+                "title": f"Bench post {n}",
+                "body": f"Benchmark post body {n} " + "lorem ipsum " * rng.randint(5, 40),
+                "visibility": "public",
+                "category": rng.choice(CATEGORIES),
+                "created_at": now - timedelta(seconds=rng.randint(0, args.days * 86400)),
+            }
+            for n in range(args.posts)
+        ], returning=Post.id)
+
+        reactions, comments = [], []
+        for post_id in post_ids:
+            for uid in rng.sample(user_ids, min(len(user_ids), rng.randint(0, args.reactions_per_post * 2))):
+                reactions.append({"user_id": uid, "target_type": "post", "target_id": post_id, "reaction_type": "like"})
+            for n in range(rng.randint(0, args.comments_per_post * 2)):
+                comments.append({"post_id": post_id, "user_id": rng.choice(user_ids), "body": f"Bench comment {n}"})
+        _insert(db, Reaction, reactions)
+        _insert(db, Comment, comments)
+
+        pairs = set()
+        while len(pairs) < min(args.matches, len(user_ids) * (len(user_ids) - 1) // 2):
+            a, b = rng.sample(user_ids, 2)
+            pairs.add((min(a, b), max(a, b)))
+        pairs = sorted(pairs)
+        match_ids = _insert(db, Match, [{"user_a_id": a, "user_b_id": b, "active_flag": True} for a, b in pairs], returning=Match.id)
+        chat_ids = _insert(db, Chat, [{"match_id": mid} for mid in match_ids], returning=Chat.id)
+        messages = []
+        for chat_id, (a, b) in zip(chat_ids, pairs):
+            for n in range(rng.randint(0, args.messages_per_chat * 2)):
+                sent_at = now - timedelta(minutes=rng.randint(0, args.days * 1440))
+                messages.append({
+                    "chat_id": chat_id,
+                    "sender_id": rng.choice((a, b)),
+                    "body": f"Bench message {n}",
+                    "created_at": sent_at,
+                    "read_at": sent_at if rng.random() < 0.7 else None,
+                })
+        _insert(db, Message, messages)
+        db.commit()
+
+        reconcile_post_counters(db, post_ids)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        engine.dispose()
+
+    return {
+        "tag": args.tag,
+        "password": BENCH_PASSWORD,
+        "users": [{"id": uid, "email": f"bench-{args.tag}-{n}@bench.invalid"} for n, uid in enumerate(user_ids)],
+        "post_ids": post_ids,
+        "chats": [{"chat_id": cid, "user_a_id": a, "user_b_id": b} for cid, (a, b) in zip(chat_ids, pairs)],
+        "counts": {
+            "users": len(user_ids),
+            "posts": len(post_ids),
+            "reactions": len(reactions),
+            "comments": len(comments),
+            "matches": len(match_ids),
+            "messages": len(messages),
+        },
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="database to seed (.env is not used)")
+    parser.add_argument("--i-know", action="store_true", help="allow a database that is not SQLite or on localhost")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--reactions-per-post", type=int, default=5, help="average")
+    parser.add_argument("--comments-per-post", type=int, default=3, help="average")
+    parser.add_argument("--images-per-profile", type=int, default=3, help="maximum")
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--messages-per-chat", type=int, default=20, help="average")
+    parser.add_argument("--days", type=int, default=90, help="spread created_at over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tag", default=datetime.utcnow().strftime("%Y%m%d%H%M%S"))
+    parser.add_argument("--manifest", default="bench/manifest.json")
+    args = parser.parse_args()
+
+    manifest = seed(args)
+    Path(args.manifest).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.manifest).write_text(json.dumps(manifest))
+    print(f"✅ Seeded {manifest['counts']} in {manifest['seconds']}s -> {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Latency samples and run reports."""
+import math
+import time
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Collects per-operation latencies (seconds) and errors for one scenario."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def ok(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def stop(self) -> None:
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        ordered = sorted(self.latencies)
+        ms = lambda seconds: round(seconds * 1000, 2)
+        return {
+            "scenario": self.name,
+            "requests": len(ordered),
+            "errors": sum(self.errors.values()),
+            "error_kinds": self.errors,
+            "seconds": round(elapsed, 2),
+            "rps": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+            "p50_ms": ms(percentile(ordered, 50)),
+            "p95_ms": ms(percentile(ordered, 95)),
+            "p99_ms": ms(percentile(ordered, 99)),
+            "max_ms": ms(ordered[-1]) if ordered else 0.0,
+        }
+
+
+COLUMNS = ("requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+
+def format_table(summaries: List[dict]) -> str:
+    header = f"{'scenario':<10}" + "".join(f"{c:>10}" for c in COLUMNS)
+    lines = [header, "-" * len(header)]
+    for s in summaries:
+        lines.append(f"{s['scenario']:<10}" + "".join(f"{s[c]:>10}" for c in COLUMNS))
+    return "\n".join(lines)
@@ -0,0 +1,146 @@
+"""Compare the two home timeline strategies (see ``app.timeline``).
+
+    python -m bench.timeline --followees 10000 --posts-per-followee 3 --pages 5 --iterations 50
+
+Seeds one reader following ``--followees`` authors, each with a few posts,
+builds the reader's materialized timeline, then reads ``--pages`` pages of
+``--limit`` posts per iteration (following the cursor) with ``merge``
+(k-way merge of the followees' posts) and with ``fanout`` (the
+materialized ``timeline_entries``).  Runs in process, so it measures the
+database work and hydration without HTTP.  Each page is one sample; the
+report works with ``bench.compare``.
+
+The data goes into a temporary SQLite database unless ``--database-url``
+names another one (checked like ``bench.seed``: SQLite or localhost only,
+unless ``--i-know``).
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy.orm import sessionmaker
+
+from app.auth import get_password_hash
+from app.database import Base
+from app.models import Follow, Post, User
+from app.timeline import build_timeline, timeline_page
+from bench.seed import BENCH_PASSWORD, CATEGORIES, _insert, bench_engine
+from bench.stats import Recorder, format_table
+
+STRATEGIES = ("merge", "fanout")
+
+
+def seed(db, args) -> int:
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    password_hash = get_password_hash(BENCH_PASSWORD)
+    user_ids = _insert(db, User, [
+        {
+            "email": f"bench-{args.tag}-timeline-{n}@bench.invalid",
+            "password_hash": password_hash,
+            "display_name": f"Bench timeline {n}",
+            "membership_type": "premium",
+            "is_active": True,
+        }
+        for n in range(args.followees + 1)
+    ], returning=User.id)
+    reader_id, followee_ids = user_ids[0], user_ids[1:]
+    _insert(db, Follow, [
+        {"follower_user_id": reader_id, "followee_user_id": uid, "status": "accepted"}
+        for uid in followee_ids
+    ])
+    _insert(db, Post, [
+        {
+            "user_id": uid,
+            "body": f"bench timeline post {n}",
+            "visibility": "public",
+            "category": rng.choice(CATEGORIES),
+            "created_at": now - timedelta(seconds=rng.randint(0, args.days * 86400)),
+        }
+        for uid in followee_ids
+        for n in range(args.posts_per_followee)
+    ])
+    db.commit()
+    return reader_id
+
+
+def run(db, reader_id: int, strategy: str, args) -> Recorder:
+    recorder = Recorder(strategy)
+    for _ in range(args.iterations):
+        after = None
+        for _ in range(args.pages):
+            started = time.perf_counter()
+            used, keys, _ = timeline_page(db, reader_id, args.limit, after, strategy)
+            recorder.ok(time.perf_counter() - started)
+            if used != strategy:
+                recorder.error(f"served by {used}")
+            if len(keys) < args.limit:
+                break
+            after = list(keys[-1])
+        db.rollback()
+    recorder.stop()
+    return recorder
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="default: a temporary SQLite database")
+    parser.add_argument("--i-know", action="store_true", help="allow a database that is not SQLite or on localhost")
+    parser.add_argument("--followees", type=int, default=10000)
+    parser.add_argument("--posts-per-followee", type=int, default=3)
+    parser.add_argument("--days", type=int, default=30, help="spread created_at over this many days")
+    parser.add_argument("--limit", type=int, default=20, help="posts per page")
+    parser.add_argument("--pages", type=int, default=5, help="pages read per iteration")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tag", default=datetime.utcnow().strftime("%Y%m%d%H%M%S"))
+    parser.add_argument("--out", help="write the JSON report here (for bench.compare)")
+    args = parser.parse_args()
+
+    scratch = None
+    if args.database_url is None:
+        scratch = tempfile.TemporaryDirectory(prefix="bench-timeline-")
+        args.database_url = f"sqlite:///{Path(scratch.name) / 'timeline.db'}"
+    engine = bench_engine(args.database_url, args.i_know)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        started = time.perf_counter()
+        reader_id = seed(db, args)
+        print(f"✅ Seeded {args.followees} follows, {args.followees * args.posts_per_followee} posts "
+              f"in {time.perf_counter() - started:.1f}s")
+        started = time.perf_counter()
+        build_timeline(db, reader_id)
+        build_seconds = time.perf_counter() - started
+        print(f"✅ Built the materialized timeline in {build_seconds * 1000:.0f}ms")
+
+        summaries = [run(db, reader_id, strategy, args).summary() for strategy in STRATEGIES]
+    finally:
+        db.close()
+        engine.dispose()
+        if scratch is not None:
+            scratch.cleanup()
+    print(format_table(summaries))
+
+    if args.out:
+        report = {
+            "started_at": datetime.utcnow().isoformat(),
+            "followees": args.followees,
+            "posts_per_followee": args.posts_per_followee,
+            "limit": args.limit,
+            "build_ms": round(build_seconds * 1000, 1),
+            "scenarios": summaries,
+        }
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Rebuild posts.like_count / posts.comment_count from reactions and comments
+
+Usage:
+    python reconcile_post_counters.py            # all posts
+    python reconcile_post_counters.py 12 34 56   # only the given post ids
+
+The counters are normally maintained by the like/comment endpoints. Run this
+after manual data fixes (e.g. reset_carat_likes.py) or if they ever drift.
+
+Make sure DATABASE_URL environment variable is set or .env file exists.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.database import SessionLocal
+from app.counters import reconcile_post_counters
+
+
+def main():
+    post_ids = [int(arg) for arg in sys.argv[1:]] or None
+    db = SessionLocal()
+    try:
+        updated = reconcile_post_counters(db, post_ids)
+        print(f"✅ Reconciled counters for {updated} posts")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ ERROR: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
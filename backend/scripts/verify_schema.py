@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Schema Verification Script
-Compares RDS database schema with SQLAlchemy models
+Compares RDS database schema (tables, columns and indexes) with SQLAlchemy models
 """
 import os
 import sys
@@ -10,7 +10,7 @@ from pathlib import Path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
-from sqlalchemy import create_engine, inspect, MetaData
+from sqlalchemy import create_engine, inspect, text, MetaData
 from sqlalchemy.orm import sessionmaker
 from app.database import Base
 from app import models
@@ -83,6 +83,56 @@ def compare_schemas(rds_tables, model_tables):
     
     return issues
 
+def get_rds_indexes(engine):
+    """Column lists that are indexed in RDS, per table (indexes, unique constraints and primary keys)"""
+    inspector = inspect(engine)
+    indexed = {}
+    for table_name in inspector.get_table_names():
+        columns = [tuple(ix['column_names']) for ix in inspector.get_indexes(table_name)]
+        columns += [tuple(uc['column_names']) for uc in inspector.get_unique_constraints(table_name)]
+        pk = inspector.get_pk_constraint(table_name).get('constrained_columns')
+        if pk:
+            columns.append(tuple(pk))
+        indexed[table_name] = columns
+    return indexed
+
+def get_model_indexes():
+    """Indexes declared on the models: {table: {index name: columns}}"""
+    model_indexes = {}
+    for table_name, table in Base.metadata.tables.items():
+        model_indexes[table_name] = {
+            index.name: tuple(col.name for col in index.columns)
+            for index in table.indexes
+        }
+    return model_indexes
+
+def get_invalid_indexes(engine):
+    """Indexes left INVALID by a failed CREATE INDEX CONCURRENTLY (PostgreSQL only)"""
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT c.relname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid
+        """))
+        return [row[0] for row in rows]
+
+def compare_indexes(rds_indexes, model_indexes, invalid_indexes):
+    """Every model index must be covered by an RDS index with the same leading columns"""
+    issues = []
+    for table_name, indexes in sorted(model_indexes.items()):
+        if table_name not in rds_indexes:
+            continue
+        for name, columns in sorted(indexes.items()):
+            covered = any(existing[:len(columns)] == columns for existing in rds_indexes[table_name])
+            if not covered:
+                issues.append(f"❌ Table '{table_name}': Index missing in RDS: {name} ({', '.join(columns)})")
+    for name in invalid_indexes:
+        issues.append(f"❌ Index '{name}' is INVALID (failed concurrent build) - drop it and re-run the migration")
+    return issues
+
 def main():
     print("🔍 Schema Verification Script")
     print("=" * 60)
@@ -103,6 +153,9 @@ def main():
     print("\n🔍 Comparing schemas...")
     issues = compare_schemas(rds_tables, model_tables)
     
+    print("🔍 Comparing indexes...")
+    issues += compare_indexes(get_rds_indexes(engine), get_model_indexes(), get_invalid_indexes(engine))
+    
     print("\n" + "=" * 60)
     if not issues:
         print("✅ No schema mismatches found!")
@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.auth import get_current_active_user, get_current_active_user_async
+from app.database import Base, ThreadedAsyncSession, get_async_db, get_db
+from app.main import app
+from app.matching_index import matching_index
+
+
+@pytest.fixture(scope="module")
+def budget_db(tmp_path_factory):
+    """A private SQLite database wired into the app's ``get_db`` / ``get_async_db``.
+
+    Yields ``(engine, SessionLocal)``.  Tests that seed it set the current
+    user by overriding ``get_current_active_user`` (sync routes) and
+    ``get_current_active_user_async`` (async routes).
+    """
+    path = tmp_path_factory.mktemp("budget") / "budget.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    AsyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        db = ThreadedAsyncSession(AsyncSessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    matching_index.clear()
+    try:
+        yield engine, SessionLocal
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_async_db, None)
+        app.dependency_overrides.pop(get_current_active_user, None)
+        app.dependency_overrides.pop(get_current_active_user_async, None)
+        matching_index.clear()
+        engine.dispose()
+
+
+@pytest.fixture
+def count_queries(budget_db):
+    """``with count_queries() as statements:`` collects the SQL run on the budget DB."""
+    engine, _ = budget_db
+
+    @contextmanager
+    def counting():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+    return counting
@@ -0,0 +1,117 @@
+import asyncio
+
+from app.chat_pubsub import InMemoryChatBroker, PostgresChatBroker, QueuedSender, MAX_NOTIFY_PAYLOAD
+
+
+class FakeNotify:
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class FakeNotifyHub:
+    """In-memory stand-in for Postgres LISTEN/NOTIFY shared by several brokers."""
+
+    def __init__(self):
+        self.queues = []
+
+    async def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, hub):
+        self.hub = hub
+        self.queue = None
+
+    async def execute(self, sql, params=None):
+        if sql.startswith("LISTEN"):
+            self.queue = asyncio.Queue()
+            self.hub.queues.append(self.queue)
+        else:
+            for queue in self.hub.queues:
+                queue.put_nowait(params[1])
+
+    async def notifies(self):
+        while True:
+            yield FakeNotify(await self.queue.get())
+
+    async def close(self):
+        pass
+
+
+def _collector(received):
+    async def deliver(message):
+        received.append(message)
+    return deliver
+
+
+def test_in_memory_broker_delivers_to_chat_subscribers():
+    async def scenario():
+        broker = InMemoryChatBroker()
+        received, other = [], []
+        broker.subscribe(1, _collector(received))
+        broker.subscribe(2, _collector(other))
+        await broker.publish(1, {"id": 10, "body": "hi"})
+        return received, other
+
+    received, other = asyncio.run(scenario())
+    assert received == [{"id": 10, "body": "hi"}]
+    assert other == []
+
+
+def test_postgres_broker_fans_out_across_processes():
+    stored = {7: {"id": 7, "body": "x" * (MAX_NOTIFY_PAYLOAD + 1)}}
+
+    async def scenario():
+        hub = FakeNotifyHub()
+        worker_a = PostgresChatBroker("postgresql://", connect=hub.connect)
+        worker_b = PostgresChatBroker("postgresql://", connect=hub.connect, load_message=stored.get)
+        received_a, received_b = [], []
+        worker_a.subscribe(1, _collector(received_a))
+        worker_b.subscribe(1, _collector(received_b))
+        await worker_a.start()
+        await worker_b.start()
+        await asyncio.sleep(0)
+        await worker_a.publish(1, {"id": 5, "body": "hello"})
+        # 大きすぎるメッセージは ID のみ送られ、受信側で読み込まれる
+        await worker_b.publish(1, stored[7])
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+        await worker_a.stop()
+        await worker_b.stop()
+        return received_a, received_b
+
+    received_a, received_b = asyncio.run(scenario())
+    assert received_a == [{"id": 5, "body": "hello"}]
+    assert received_b == [{"id": 5, "body": "hello"}, stored[7]]
+
+
+def test_slow_consumer_is_dropped_without_blocking_the_room():
+    async def scenario():
+        broker = InMemoryChatBroker()
+        stalled = asyncio.Event()
+        fast_received, dropped = [], []
+
+        async def slow_send(message):
+            await stalled.wait()
+
+        async def on_drop():
+            dropped.append(True)
+
+        slow = QueuedSender(slow_send, on_drop=on_drop, maxsize=2, send_timeout=60)
+        fast = QueuedSender(_collector(fast_received), maxsize=10)
+        for sender in (slow, fast):
+            sender.start()
+            broker.subscribe(1, sender)
+        for i in range(5):
+            await broker.publish(1, {"id": i})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        await slow.close()
+        await fast.close()
+        return fast_received, dropped, broker._subscribers.get(1, set())
+
+    fast_received, dropped, remaining = asyncio.run(scenario())
+    assert [m["id"] for m in fast_received] == [0, 1, 2, 3, 4]
+    assert dropped == [True]
+    assert len(remaining) == 1
@@ -19,3 +19,12 @@ def test_docs():
     """Test docs endpoint is accessible"""
     response = client.get("/docs")
     assert response.status_code == 200
+
+def test_metrics():
+    """Test /metrics exposes per-route request metrics in Prometheus format"""
+    client.get("/healthz")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/healthz",status="200"}' in response.text
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
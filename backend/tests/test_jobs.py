@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import jobs
+from app.jobs import _claim, _finish, enqueue, job, run_one
+from app.models import BackgroundJob
+
+calls = []
+
+
+@job("test.record")
+def _record(db, payload):
+    calls.append(payload["n"])
+
+
+@job("test.fail")
+def _fail(db, payload):
+    raise RuntimeError("boom")
+
+
+@pytest.fixture
+def job_db(budget_db, monkeypatch):
+    _, SessionLocal = budget_db
+    # ハンドラ用のセッションもテスト用 DB に向ける
+    monkeypatch.setattr(jobs, "SessionLocal", SessionLocal)
+    db = SessionLocal()
+    db.query(BackgroundJob).delete()
+    db.commit()
+    calls.clear()
+    try:
+        yield SessionLocal, db
+    finally:
+        db.close()
+
+
+def _job(db, job_id):
+    db.expire_all()
+    return db.get(BackgroundJob, job_id)
+
+
+def test_claimed_job_runs_once(job_db):
+    _, db = job_db
+    row = enqueue(db, "test.record", {"n": 1})
+    db.commit()
+
+    assert run_one(db, "worker-a") is True
+    assert run_one(db, "worker-a") is False
+    assert calls == [1]
+    row = _job(db, row.id)
+    assert (row.status, row.attempts, row.locked_by, row.locked_until) == ("done", 1, None, None)
+
+
+def test_failures_back_off_then_fail(job_db):
+    _, db = job_db
+    row = enqueue(db, "test.fail", max_attempts=2)
+    db.commit()
+
+    before = datetime.utcnow()
+    assert run_one(db, "worker-a") is True
+    row = _job(db, row.id)
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert "boom" in row.last_error
+    assert row.run_after >= before + timedelta(seconds=2)
+    assert run_one(db, "worker-a") is False  # バックオフ中
+
+    row.run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert run_one(db, "worker-a") is True
+    row = _job(db, row.id)
+    assert (row.status, row.attempts) == ("failed", 2)
+    assert row.finished_at is not None
+
+
+def test_expired_claim_cannot_overwrite_the_new_owner(job_db):
+    SessionLocal, db = job_db
+    row = enqueue(db, "test.record", {"n": 2})
+    db.commit()
+
+    first = _claim(db, "worker-a")
+    assert first.locked_by == "worker-a"
+    # 可視性タイムアウト切れ: 別のワーカーが取り直す
+    other = SessionLocal()
+    try:
+        other.query(BackgroundJob).filter(BackgroundJob.id == row.id).update(
+            {BackgroundJob.locked_until: datetime.utcnow() - timedelta(seconds=1)}
+        )
+        other.commit()
+        second = _claim(other, "worker-b")
+        assert (second.locked_by, second.attempts) == ("worker-b", 2)
+
+        assert _finish(db, first, "late failure") is None
+        assert _job(other, row.id).status == "running"
+        assert _finish(other, second, None) == "done"
+    finally:
+        other.close()
+    row = _job(db, row.id)
+    assert (row.status, row.last_error) == ("done", None)
@@ -0,0 +1,175 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from app.auth import get_current_active_user, get_current_active_user_async
+from app.counters import hot_score
+from app.likes import LikeBuffer, adjust_carats, like_buffer, settle_post_likes
+from app.main import app
+from app.models import BackgroundJob, Post, Reaction, User
+
+
+@pytest.fixture(scope="module")
+def like_setup(budget_db):
+    _, SessionLocal = budget_db
+    db = SessionLocal()
+    author = User(email="author@example.com", password_hash="x", display_name="Author", carats=0)
+    fan = User(email="fan@example.com", password_hash="x", display_name="Fan")
+    db.add_all([author, fan])
+    db.flush()
+    post = Post(user_id=author.id, body="likeable")
+    db.add(post)
+    db.commit()
+    app.dependency_overrides[get_current_active_user] = lambda: fan
+    app.dependency_overrides[get_current_active_user_async] = lambda: fan
+    try:
+        yield {"db": db, "post_id": post.id, "author_id": author.id}
+    finally:
+        app.dependency_overrides.pop(get_current_active_user, None)
+        app.dependency_overrides.pop(get_current_active_user_async, None)
+        db.close()
+
+
+def _state(setup):
+    db = setup["db"]
+    db.expire_all()
+    likes = db.query(Reaction).filter(Reaction.target_id == setup["post_id"]).count()
+    return likes, db.get(Post, setup["post_id"]).like_count, db.get(User, setup["author_id"]).carats
+
+
+def test_like_writes_are_idempotent(like_setup):
+    client = TestClient(app)
+    url = f"/api/posts/{like_setup['post_id']}/like"
+
+    for _ in range(2):
+        assert client.put(url).json() == {"liked": True, "like_count": 1}
+    assert _state(like_setup) == (1, 1, 1)
+
+    assert client.post(url).json() == {"liked": False, "like_count": 0}
+    assert _state(like_setup) == (0, 0, 0)
+
+    for _ in range(2):
+        assert client.delete(url).json() == {"liked": False, "like_count": 0}
+    assert _state(like_setup) == (0, 0, 0)
+
+    assert client.post(url).json() == {"liked": True, "like_count": 1}
+    assert _state(like_setup) == (1, 1, 1)
+
+
+def test_carats_never_go_negative(like_setup):
+    client = TestClient(app)
+    client.put(f"/api/posts/{like_setup['post_id']}/like")
+    # カラットを使い切った後の取り消し
+    db = like_setup["db"]
+    db.query(User).filter(User.id == like_setup["author_id"]).update({User.carats: 0})
+    db.commit()
+    client.delete(f"/api/posts/{like_setup['post_id']}/like")
+    assert _state(like_setup) == (0, 0, 0)
+
+
+def test_aggregated_carat_decrement_clamps_to_zero(like_setup):
+    db = like_setup["db"]
+    author = db.get(User, like_setup["author_id"])
+    author.carats = 2
+    db.commit()
+    adjust_carats(db, like_setup["author_id"], -5)
+    db.commit()
+    db.expire_all()
+    assert db.get(User, like_setup["author_id"]).carats == 0
+
+
+def test_write_behind_buffers_until_flush(like_setup, monkeypatch):
+    monkeypatch.setattr(like_buffer, "enabled", True)
+    client = TestClient(app)
+    url = f"/api/posts/{like_setup['post_id']}/like"
+    before = _state(like_setup)
+    assert before[0] == 0
+
+    assert client.put(url).json() == {"liked": True, "like_count": before[1] + 1}
+    assert _state(like_setup) == (1, before[1], before[2])
+    db = like_setup["db"]
+    assert db.query(BackgroundJob).filter(BackgroundJob.kind == "likes.settle").count() == 1
+
+    like_buffer.flush(db)
+    assert like_buffer.pending(like_setup["post_id"]) == 0
+    assert _state(like_setup) == (1, before[1] + 1, before[2] + 1)
+
+
+def test_flush_applies_only_this_process_deltas(like_setup, monkeypatch):
+    monkeypatch.setattr(like_buffer, "enabled", True)
+    client = TestClient(app)
+    db = like_setup["db"]
+    client.delete(f"/api/posts/{like_setup['post_id']}/like")
+    like_buffer.flush(db)
+    likes, like_count, carats = _state(like_setup)
+    # 別プロセスのワーカーが記録した未反映の「いいね」
+    other = User(email="other-fan@example.com", password_hash="x", display_name="Other")
+    db.add(other)
+    db.flush()
+    db.add(Reaction(user_id=other.id, target_type="post", target_id=like_setup["post_id"], reaction_type="like"))
+    db.commit()
+    other_worker = LikeBuffer(enabled=True)
+    other_worker._pending[like_setup["post_id"]] = 1
+
+    assert client.put(f"/api/posts/{like_setup['post_id']}/like").json()["like_count"] == like_count + 1
+    like_buffer.flush(db)
+    assert _state(like_setup) == (likes + 2, like_count + 1, carats + 1)
+    other_worker.flush(db)
+    assert _state(like_setup) == (likes + 2, like_count + 2, carats + 2)
+
+    db.query(Reaction).filter(Reaction.user_id == other.id).delete()
+    db.commit()
+    settle_post_likes(db, [like_setup["post_id"]])
+
+
+def test_settle_repairs_a_lost_buffer(like_setup, monkeypatch):
+    monkeypatch.setattr(like_buffer, "enabled", True)
+    client = TestClient(app)
+    client.post(f"/api/posts/{like_setup['post_id']}/like")
+    likes, like_count, carats = _state(like_setup)
+    assert (likes, like_count) == (0, 1)
+
+    like_buffer._pending.clear()  # プロセスが落ちた想定
+    assert settle_post_likes(like_setup["db"], [like_setup["post_id"]]) == 1
+    assert _state(like_setup) == (0, 0, carats - 1)
+    assert settle_post_likes(like_setup["db"], [like_setup["post_id"]]) == 0
+
+
+def test_like_state_lookup(like_setup):
+    client = TestClient(app)
+    post_id = like_setup["post_id"]
+    client.put(f"/api/posts/{post_id}/like")
+
+    response = client.get(f"/api/posts/likes/state?ids={post_id},999999,{post_id}")
+    assert response.json() == {"items": [{"post_id": post_id, "liked": True, "like_count": 1}]}
+    assert client.get(f"/api/posts/{post_id}").json()["is_liked"] is False  # 匿名
+
+    client.delete(f"/api/posts/{post_id}/like")
+    assert client.get(f"/api/posts/likes/state?ids={post_id}").json()["items"][0]["liked"] is False
+    assert client.get("/api/posts/likes/state?ids=1,x").status_code == 422
+
+
+def test_inserted_posts_get_a_hot_score(like_setup):
+    db, author_id = like_setup["db"], like_setup["author_id"]
+    created = datetime(2026, 4, 1, 12, 0)
+    orm_post = Post(user_id=author_id, body="orm", created_at=created)
+    db.add(orm_post)
+    db.flush()
+    # bench.seed のような ORM 一括 INSERT でも既定値が行ごとに計算される
+    bulk_ids = db.scalars(
+        insert(Post).returning(Post.id, sort_by_parameter_order=True),
+        [
+            {"user_id": author_id, "body": "bulk", "created_at": created},
+            {"user_id": author_id, "body": "bulk liked", "created_at": created, "like_count": 100},
+        ],
+    ).all()
+    db.commit()
+    scores = dict(db.query(Post.id, Post.hot_score).filter(Post.id.in_([orm_post.id, *bulk_ids])))
+    try:
+        assert scores[orm_post.id] == scores[bulk_ids[0]] == hot_score(0, 0, created)
+        assert scores[bulk_ids[1]] == hot_score(100, 0, created)
+    finally:
+        db.query(Post).filter(Post.id.in_(scores)).delete(synchronize_session=False)
+        db.commit()
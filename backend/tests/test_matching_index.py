@@ -0,0 +1,54 @@
+import random
+
+from app.matching_index import FACETS, FacetIndex, select_bits
+
+
+def _index():
+    profiles = [
+        (1, "東京都", "20代後半", "会社員", None, None, "gay"),
+        (2, "東京都", "30代前半", "学生", None, None, "lesbian"),
+        (3, "大阪府", "20代後半", "会社員", None, None, "gay"),
+        (700, "東京都", "20代後半", None, None, None, "queer"),
+    ]
+    hobbies = [(1, "映画"), (2, "音楽"), (3, "映画"), (3, "旅行"), (700, "旅行"), (999, "映画")]
+    return FacetIndex.from_rows(profiles, hobbies)
+
+
+def _ids(bits):
+    return select_bits(bits, 0, bits.bit_count())
+
+
+def test_select_bits_matches_brute_force():
+    rng = random.Random(7)
+    ids = sorted(rng.sample(range(200_000), 5_000))
+    bits = sum(1 << i for i in ids)
+    for offset, limit in [(0, 20), (37, 50), (4_990, 50), (5_000, 10), (123, 0)]:
+        assert select_bits(bits, offset, limit) == ids[offset:offset + limit]
+
+
+def test_match_and_exclude():
+    index = _index()
+    assert _ids(index.match({"prefecture": "東京都"})) == [1, 2, 700]
+    assert _ids(index.match({"prefecture": "東京都", "age_band": "20代後半"}, exclude=1)) == [700]
+    assert _ids(index.match({}, ["映画", "音楽"])) == [1, 2, 3]
+    assert index.match({"prefecture": "沖縄県"}) == 0
+
+
+def test_add_and_remove_keep_postings_in_step():
+    index = _index()
+    index.add(2, {"prefecture": "大阪府", "age_band": "30代前半"}, ["映画"])
+    assert _ids(index.match({"prefecture": "東京都"})) == [1, 700]
+    assert _ids(index.match({"prefecture": "大阪府"}, ["映画"])) == [2, 3]
+    assert "音楽" not in index.postings["hobbies"]
+
+    index.remove(700)
+    assert _ids(index.match({}, ["旅行"])) == [3]
+    assert "queer" not in index.postings["identity"]
+
+
+def test_facet_counts_leave_out_their_own_filter():
+    counts = _index().facet_counts({"prefecture": "東京都", "identity": "gay"})
+    assert set(counts) == set(FACETS) | {"hobbies"}
+    assert counts["prefecture"] == {"東京都": 1, "大阪府": 1}
+    assert counts["identity"] == {"gay": 1, "lesbian": 1, "queer": 1}
+    assert counts["hobbies"] == {"映画": 1}
@@ -0,0 +1,98 @@
+import hashlib
+import io
+
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import storage
+from app.auth import get_current_active_user
+from app.images import DERIVATIVE_SIZES
+from app.main import app
+from app.models import BackgroundJob, MediaAsset, MediaDerivative, User
+from app.tasks import generate_media_derivatives
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    import boto3
+
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name=storage.S3_REGION)
+        client.create_bucket(
+            Bucket=storage.S3_BUCKET,
+            CreateBucketConfiguration={"LocationConstraint": storage.S3_REGION},
+        )
+        monkeypatch.setattr(storage, "USE_S3", True)
+        monkeypatch.setattr(storage, "s3_client", client)
+        yield client
+
+
+@pytest.fixture(scope="module")
+def client(budget_db):
+    _, SessionLocal = budget_db
+    db = SessionLocal()
+    user = User(email="uploader@example.com", password_hash="x", display_name="Uploader")
+    db.add(user)
+    db.commit()
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_current_active_user, None)
+        db.close()
+
+
+def test_upload_streams_to_s3_with_multipart(s3, client, monkeypatch):
+    from boto3.s3.transfer import TransferConfig
+
+    # 5MB（S3 の最小パートサイズ）でマルチパート経路を通す
+    monkeypatch.setattr(storage, "S3_TRANSFER_CONFIG", TransferConfig(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024))
+    body = b"\xff\xd8" + b"x" * (6 * 1024 * 1024)
+    response = client.post("/api/media/upload", files={"file": ("photo.jpg", io.BytesIO(body), "image/jpeg")})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sha256"] == hashlib.sha256(body).hexdigest()
+    key = storage.key_for_url(data["url"])
+    stored = s3.get_object(Bucket=storage.S3_BUCKET, Key=key)
+    assert stored["ContentLength"] == len(body)
+    assert stored["ContentType"] == "image/jpeg"
+
+
+def test_upload_rejects_oversized_file(s3, client):
+    body = b"x" * (10 * 1024 * 1024 + 1)
+    response = client.post("/api/media/upload", files={"file": ("big.jpg", io.BytesIO(body), "image/jpeg")})
+    assert response.status_code == 400
+    assert s3.list_objects_v2(Bucket=storage.S3_BUCKET).get("KeyCount", 0) == 0
+
+
+def test_upload_queues_webp_derivatives(s3, client, budget_db):
+    _, SessionLocal = budget_db
+    body = io.BytesIO()
+    Image.new("RGB", (1600, 1200), "red").save(body, format="PNG")
+    response = client.post("/api/media/upload", files={"file": ("photo.png", body.getvalue(), "image/png")})
+    assert response.status_code == 200
+    media_id = response.json()["id"]
+
+    db = SessionLocal()
+    try:
+        payloads = [
+            job.payload for job in db.query(BackgroundJob).filter(BackgroundJob.kind == "media.generate_derivatives")
+        ]
+        assert {"media_id": media_id} in payloads
+        generate_media_derivatives(db, {"media_id": media_id})
+
+        asset = db.get(MediaAsset, media_id)
+        assert (asset.width, asset.height) == (1600, 1200)
+        derivatives = db.query(MediaDerivative).filter(MediaDerivative.media_asset_id == media_id).all()
+        assert sorted((d.size, d.width, d.height) for d in derivatives) == [
+            (size, size, size * 3 // 4) for size in DERIVATIVE_SIZES
+        ]
+        for derivative in derivatives:
+            stored = s3.get_object(Bucket=storage.S3_BUCKET, Key=storage.key_for_url(derivative.url))
+            assert stored["ContentType"] == "image/webp"
+    finally:
+        db.close()
@@ -0,0 +1,167 @@
+"""SQL query budgets for the list endpoints.
+
+Each endpoint is called against a database seeded with enough rows that a
+per-row query would blow its budget many times over; the budget is the
+number of statements the endpoint needs regardless of how many rows it
+returns.  When one fails, the assertion message lists the statements.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import get_current_active_user, get_current_active_user_async
+from app.main import app
+from app.models import (
+    Chat, ChatRequest, Comment, Like, Match, MatchingProfile, MatchingProfileImage, MediaAsset,
+    Message, Post, PostMedia, Reaction, User,
+)
+
+USERS = 60
+POSTS = 120
+COMMENTS_ON_POST = 50
+THREADS = 30
+
+
+@pytest.fixture(scope="module")
+def seeded(budget_db):
+    _, SessionLocal = budget_db
+    db = SessionLocal()
+    users = [
+        User(email=f"budget{i}@example.com", password_hash="x", display_name=f"Budget {i}", membership_type="premium")
+        for i in range(USERS)
+    ]
+    db.add_all(users)
+    db.flush()
+    me, others = users[0], users[1:]
+    for user in users:
+        db.add(MatchingProfile(user_id=user.id, nickname=user.display_name, prefecture="東京都", age_band="30代", display_flag=True))
+    db.flush()
+    for user in users:
+        for order in range(2):
+            db.add(MatchingProfileImage(profile_id=user.id, image_url=f"/matching-media/{user.id}-{order}.jpg", display_order=order))
+
+    asset = MediaAsset(user_id=me.id, url="/media/budget.jpg", mime_type="image/jpeg")
+    db.add(asset)
+    db.flush()
+    posts = [Post(user_id=users[i % USERS].id, body=f"post {i}", media_id=asset.id) for i in range(POSTS)]
+    db.add_all(posts)
+    db.flush()
+    for i, post in enumerate(posts):
+        db.add(PostMedia(post_id=post.id, media_asset_id=asset.id, order_index=0))
+        db.add(Reaction(user_id=users[(i + 1) % USERS].id, target_type="post", target_id=post.id, reaction_type="like"))
+    for i in range(COMMENTS_ON_POST):
+        db.add(Comment(post_id=posts[0].id, user_id=others[i % len(others)].id, body=f"comment {i}"))
+    # posts[1]: THREADS 件のスレッド、それぞれ 3 件の返信と各返信への返信 1 件
+    for i in range(THREADS):
+        root = Comment(post_id=posts[1].id, user_id=others[i].id, body=f"thread {i}")
+        db.add(root)
+        db.flush()
+        for j in range(3):
+            reply = Comment(post_id=posts[1].id, user_id=others[j].id, parent_id=root.id, body=f"reply {i}.{j}")
+            db.add(reply)
+            db.flush()
+            db.add(Comment(post_id=posts[1].id, user_id=me.id, parent_id=reply.id, body=f"reply {i}.{j}.0"))
+
+    for other in others[:30]:
+        db.add(Like(from_user_id=me.id, to_user_id=other.id, status="active"))
+    for other in others[:20]:
+        match = Match(user_a_id=me.id, user_b_id=other.id)
+        db.add(match)
+        db.flush()
+        chat = Chat(match_id=match.id)
+        db.add(chat)
+        db.flush()
+        for n in range(5):
+            db.add(Message(chat_id=chat.id, sender_id=other.id if n % 2 else me.id, body=f"message {n}"))
+    for other in others[20:40]:
+        db.add(ChatRequest(from_user_id=other.id, to_user_id=me.id, status="pending", initial_message="hi"))
+    for other in others[40:]:
+        db.add(ChatRequest(from_user_id=me.id, to_user_id=other.id, status="pending", initial_message="hello"))
+    db.commit()
+
+    app.dependency_overrides[get_current_active_user] = lambda: me
+    app.dependency_overrides[get_current_active_user_async] = lambda: me
+    try:
+        yield {"me": me, "post_id": posts[0].id, "threaded_post_id": posts[1].id}
+    finally:
+        app.dependency_overrides.pop(get_current_active_user, None)
+        app.dependency_overrides.pop(get_current_active_user_async, None)
+        db.close()
+
+
+@pytest.fixture
+def client(seeded):
+    return TestClient(app)
+
+
+def assert_within_budget(statements, budget):
+    assert len(statements) <= budget, (
+        f"{len(statements)} queries (budget {budget}):\n" + "\n".join(statements)
+    )
+
+
+@pytest.mark.parametrize("path, budget, min_items", [
+    ("/api/posts?limit=50", 6, 50),
+    ("/api/matching/chats", 1, 20),
+    ("/api/matching/likes", 1, 30),
+    ("/api/matching/chat_requests/incoming", 1, 20),
+    ("/api/matching/chat_requests/outgoing", 1, 19),
+    ("/api/matching/search?size=50", 4, 50),
+    ("/api/posts/likes/state?ids=" + ",".join(str(i) for i in range(1, 101)), 2, 100),
+])
+def test_list_endpoint_query_budget(client, count_queries, path, budget, min_items):
+    with count_queries() as statements:
+        response = client.get(path)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    items = body if isinstance(body, list) else body["items"]
+    assert len(items) >= min_items
+    assert_within_budget(statements, budget)
+
+
+def test_post_comments_query_budget(client, count_queries, seeded):
+    with count_queries() as statements:
+        response = client.get(f"/api/posts/{seeded['post_id']}/comments")
+    assert response.status_code == 200
+    assert len(response.json()) == COMMENTS_ON_POST
+    assert all(comment["user"] for comment in response.json())
+    assert_within_budget(statements, 1)
+
+
+def test_comment_tree_query_budget(client, count_queries, seeded):
+    url = f"/api/posts/{seeded['threaded_post_id']}/comments/tree"
+    with count_queries() as statements:
+        response = client.get(url, params={"limit": THREADS, "replies": 4})
+    assert response.status_code == 200
+    threads = response.json()
+    assert len(threads) == THREADS
+    assert_within_budget(statements, 2)
+
+    first = threads[0]
+    assert first["reply_count"] == 6
+    assert [len(reply["replies"]) for reply in first["replies"]] == [1, 1]
+    rest = client.get(url, params={"thread": first["id"], "replies_cursor": first["replies_cursor"]}).json()[0]
+    assert rest["reply_count"] == 2 and rest["replies_cursor"] is None
+    shown = {r["id"] for r in first["replies"]} | {n["id"] for r in first["replies"] for n in r["replies"]}
+    assert shown.isdisjoint(r["id"] for r in rest["replies"])
+
+
+def _flatten(nodes):
+    for node in nodes:
+        yield node["id"]
+        yield from _flatten(node["replies"])
+
+
+def test_comment_tree_replies_cursor_walks_every_reply(client, seeded):
+    url = f"/api/posts/{seeded['threaded_post_id']}/comments/tree"
+    threads = client.get(url, params={"limit": 3, "replies": 0}).json()
+    assert [(t["reply_count"], t["replies"]) for t in threads] == [(6, [])] * 3
+
+    thread = threads[0]
+    seen, cursor = [], thread["replies_cursor"]
+    while cursor:
+        page = client.get(url, params={"thread": thread["id"], "replies": 2, "replies_cursor": cursor}).json()[0]
+        seen.extend(_flatten(page["replies"]))
+        cursor = page["replies_cursor"]
+    assert len(seen) == len(set(seen)) == 6
+    full = client.get(url, params={"thread": thread["id"]}).json()[0]
+    assert sorted(seen) == sorted(_flatten(full["replies"]))
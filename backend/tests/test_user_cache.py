@@ -0,0 +1,83 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import clear_user_cache, create_access_token, get_cached_user, user_token_claims
+from app.database import get_db
+from app.main import app
+from app.models import User
+
+
+@pytest.fixture
+def cached_user(budget_db):
+    _, SessionLocal = budget_db
+    clear_user_cache()
+    db = SessionLocal()
+    user = User(email="cached@example.com", password_hash="x", display_name="Before", is_active=True)
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+    try:
+        yield SessionLocal, user_id
+    finally:
+        db = SessionLocal()
+        db.query(User).filter(User.id == user_id).delete()
+        db.commit()
+        db.close()
+        clear_user_cache()
+
+
+def _lookup(SessionLocal, **key):
+    db = SessionLocal()
+    try:
+        user = get_cached_user(db, **key)
+        return None if user is None else (user.email, user.display_name, user.is_active)
+    finally:
+        db.close()
+
+
+def test_updates_are_not_served_from_the_cache(cached_user):
+    SessionLocal, user_id = cached_user
+    assert _lookup(SessionLocal, user_id=user_id) == ("cached@example.com", "Before", True)
+
+    db = SessionLocal()
+    user = db.get(User, user_id)
+    user.display_name = "After"
+    user.is_active = False
+    db.commit()
+    db.close()
+
+    assert _lookup(SessionLocal, user_id=user_id) == ("cached@example.com", "After", False)
+    assert _lookup(SessionLocal, email="cached@example.com") == ("cached@example.com", "After", False)
+
+
+def test_email_change_drops_the_old_email(cached_user):
+    SessionLocal, user_id = cached_user
+    assert _lookup(SessionLocal, email="cached@example.com") is not None
+
+    db = SessionLocal()
+    db.get(User, user_id).email = "renamed@example.com"
+    db.commit()
+    db.close()
+
+    assert _lookup(SessionLocal, email="cached@example.com") is None
+    assert _lookup(SessionLocal, user_id=user_id)[0] == "renamed@example.com"
+
+
+def test_async_routes_authenticate_on_the_request_session(cached_user, count_queries, monkeypatch):
+    SessionLocal, user_id = cached_user
+    db = SessionLocal()
+    token = create_access_token(user_token_claims(db.get(User, user_id)))
+    db.close()
+
+    def no_sync_session():
+        raise AssertionError("async route opened a sync session")
+        yield
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, no_sync_session)
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/users/me/stats", headers=headers).status_code == 200
+    with count_queries() as statements:
+        assert client.get("/api/users/me/stats", headers=headers).status_code == 200
+    assert not [s for s in statements if "FROM users" in s]